@@ -28,7 +28,7 @@ class AnnotationModel(object):
     def __init__(self):
         self.points = dict()
         self.areas = dict()
-        self.ga_records = dict()
+        self.ga_records = dict()  # Made when annotations are added
         self.point_id2ga_ids = defaultdict(set)
         self.area_id2ga_ids = defaultdict(set)
         self.colors = dict()
@@ -92,13 +92,27 @@ def generate_area_id(file_name, x, y, width, height, category_id):
     return pf_id
 
 
-def generate_grouped_annotation_id(file_name, x, y, level):
-    uri = \
-        "pathilico.org/v1/file/{}/groupedAnnotation/level/{}/x/{}/y/{}".format(
-            file_name, level, x, y
-        )
-    pf_id = uuid.uuid5(uuid.NAMESPACE_URL, uri).bytes
-    return pf_id
+def get_ga_record(annotation_model, ga_id):
+    """Record of the grouped annotation, an empty one is made on first use
+
+    :param AnnotationModel annotation_model:
+    :param int ga_id: given by `get_grouped_annotation_ids`
+    :return GroupedAnnotationRecord:
+    """
+    ga_record = annotation_model.ga_records.get(ga_id, None)
+    if ga_record is not None:
+        return ga_record
+    level, column, row, _ = Api.unpack_tile_key(ga_id)
+    t_w, t_h = annotation_model.tile_width, annotation_model.tile_height
+    empty_query = GroupedAnnotationImageQuery(
+        points=list(), polygons=list(), tile_size=(t_w, t_h)
+    )
+    ga_record = GroupedAnnotationRecord(
+        x=column * t_w, y=row * t_h, level=level, points=set(), areas=set(),
+        query=empty_query
+    )
+    annotation_model.ga_records[ga_id] = ga_record
+    return ga_record
 
 
 def convert_int_seq2bytes(int_seq):
@@ -271,14 +285,14 @@ def register_point_to_multi_gouped_annotations(
     """Update GroupedAnnotation's point data
 
     :param AnnotationModel annotation_model:
-    :param typing.List[byte] ga_ids: Ids of GroupedAnnotationRecord
+    :param typing.List[int] ga_ids: Ids of GroupedAnnotationRecord
     :param byte point_id:
     :param level_downsamples:
     :return:
     """
     ga_qs = list()
     for ga_id in ga_ids:
-        ga_record = annotation_model.ga_records[ga_id]
+        ga_record = get_ga_record(annotation_model, ga_id)
         ga_record.points.add(point_id)
         updated_ga_record = update_grouped_annotation_query(
             ga_record, annotation_model.points, annotation_model.areas,
@@ -299,14 +313,14 @@ def register_area_to_multi_gouped_annotations(
     """Update GroupedAnnotation's point data
 
     :param AnnotationModel annotation_model:
-    :param typing.List[byte] ga_ids: Ids of GroupedAnnotationRecord
+    :param typing.List[int] ga_ids: Ids of GroupedAnnotationRecord
     :param byte area_id:
     :param level_downsamples:
     :return:
     """
     ga_qs = list()
     for ga_id in ga_ids:
-        ga_record = annotation_model.ga_records[ga_id]
+        ga_record = get_ga_record(annotation_model, ga_id)
         ga_record.areas.add(area_id)
         updated_ga_record = update_grouped_annotation_query(
             ga_record, annotation_model.points, annotation_model.areas,
@@ -506,9 +520,7 @@ def add_point_annotation(model, x, y, category_id):
     model = Api.register_data(model, point_id, point_data, data_type="point")
     bounds = get_bounds_for_point(x, y, level_downsamples)
     model = Api.bind_id_on_districts(model, point_id, bounds, data_type="point")
-    ga_ids = Api.get_ids_on_districts(
-        model, bounds, data_type="grouped_annotation"
-    )
+    ga_ids = Api.get_grouped_annotation_ids(model, bounds)
     model.annotation, ga_ids, ga_queries = \
         register_point_to_multi_gouped_annotations(
             model.annotation, ga_ids=ga_ids, point_id=point_id,
@@ -531,9 +543,7 @@ def add_point_annotation_from_serialized_data(model, point_id, point_data):
         point_record.x, point_record.y, level_downsamples
     )
     model = Api.bind_id_on_districts(model, point_id, bounds, data_type="point")
-    ga_ids = Api.get_ids_on_districts(
-        model, bounds, data_type="grouped_annotation"
-    )
+    ga_ids = Api.get_grouped_annotation_ids(model, bounds)
     model.annotation, ga_ids, ga_queries = \
         register_point_to_multi_gouped_annotations(
             model.annotation, ga_ids=ga_ids, point_id=point_id,
@@ -562,9 +572,7 @@ def add_area_annotation(model, closed_vs, category_id):
         height=area_record.height, level_downsamples=level_downsamples
     )
     model = Api.bind_id_on_districts(model, area_id, bounds, data_type="area")
-    ga_ids = Api.get_ids_on_districts(
-        model, bounds, data_type="grouped_annotation"
-    )
+    ga_ids = Api.get_grouped_annotation_ids(model, bounds)
     model.annotation, ga_ids, ga_queries = \
         register_area_to_multi_gouped_annotations(
             model.annotation, ga_ids=ga_ids, area_id=area_id,
@@ -592,9 +600,7 @@ def add_area_annotation_from_serialized_data(model, area_id, area_data):
     model = Api.bind_id_on_districts(
         model, area_id, bounds, data_type="area"
     )
-    ga_ids = Api.get_ids_on_districts(
-        model, bounds, data_type="grouped_annotation"
-    )
+    ga_ids = Api.get_grouped_annotation_ids(model, bounds)
     model.annotation, ga_ids, ga_queries = \
         register_area_to_multi_gouped_annotations(
             model.annotation, ga_ids=ga_ids, area_id=area_id,
@@ -635,7 +641,7 @@ def get_annotation_info_and_grouped_images_for_display(model):
     bound = Api.get_bound_for_window(model)
     point_ids = Api.get_ids_on_districts(model, [bound], "point")
     area_ids = Api.get_ids_on_districts(model, [bound], "area")
-    ga_ids = Api.get_ids_on_districts(model, [bound], "grouped_annotation")
+    ga_ids = Api.get_grouped_annotation_ids(model, [bound])
     result_images = list()
     existing_point_id_list = [set()]
     existing_area_id_list = [set()]
@@ -677,35 +683,43 @@ def get_annotation_info_and_grouped_images_for_display(model):
 def fill_grouped_annotation_records(model):
     """This function should be called when pathology file is selected
 
+    Records are made when annotations are added on them, so this only
+    forgets the records of the previous file.
+
     :param pathfinder.app.model.Model model:
     :return pathilico.app.model.Model:
     """
-    t_w, t_h = model.annotation.tile_width, model.annotation.tile_height
+    annotation_model = model.annotation
+    annotation_model.ga_records = dict()
+    model.annotation = annotation_model
+    return model
+
+
+def get_grouped_annotation_ids(model, bounds):
+    """Ids of grouped annotation tiles overlapping the bounds
+
+    Computed from the tile grid of the slide, see `get_ga_record`.
+    """
+    annotation_model = model.annotation
+    tile_size = (annotation_model.tile_width, annotation_model.tile_height)
     widths, heights = Api.get_pathology_slide_widths_and_heights(model)
-    display_name = Api.get_display_name(model)
-    for level in range(len(widths)):
-        w, h = widths[level], heights[level]
-        num_hor = w // t_w + 1
-        num_ver = h // t_h + 1
-        for hor_i, ver_i in itertools.product(range(num_hor), range(num_ver)):
-            ga_id = generate_grouped_annotation_id(
-                display_name, x=hor_i, y=ver_i, level=level,
-            )
-            x = hor_i * t_w
-            y = ver_i * t_h
-            empty_query = GroupedAnnotationImageQuery(
-                points=list(), polygons=list(), tile_size=(t_w, t_h)
-            )
-            rec = GroupedAnnotationRecord(
-                x=x, y=y, level=level, points=set(), areas=set(),
-                query=empty_query
-            )
-            model.annotation.ga_records[ga_id] = rec
-            model = Api.bind_id_on_districts(
-                model, ga_id, [(x, y, x+t_w, y+t_h, level)],
-                data_type="grouped_annotation"
+    slide_index = Api.get_slide_index(model)
+    ga_ids, seen_ids = list(), set()
+    for bound in bounds:
+        level = bound[-1]
+        if not 0 <= level < len(widths):
+            continue
+        indices = Api.get_tile_indices_in_bound(
+            bound, tile_size, (widths[level], heights[level])
+        )
+        for column, row in indices:
+            ga_id = Api.pack_tile_key(
+                slide_index, "grouped_annotation", level, column, row
             )
-    return model
+            if ga_id not in seen_ids:
+                seen_ids.add(ga_id)
+                ga_ids.append(ga_id)
+    return ga_ids
 
 
 Api.register(AnnotationModel)
@@ -714,6 +728,7 @@ Api.register(add_point_annotation_from_serialized_data)
 Api.register(delete_point_annotations)
 Api.register(get_annotation_info_and_grouped_images_for_display)
 Api.register(fill_grouped_annotation_records)
+Api.register(get_grouped_annotation_ids)
 Api.register(add_area_annotation)
 Api.register(add_area_annotation_from_serialized_data)
 Api.register(delete_area_annotations)
@@ -218,9 +218,11 @@ def set_records_are_saved(model, added_ids, deleted_ids, data_type="point"):
     :param str data_type:
     :return:
     """
-    table = getattr(model.database, data_type)
+    database_model = model.database
+    table = getattr(database_model, data_type)
     table = update_saved_status(table, added_ids, deleted_ids)
-    setattr(model.database, data_type, table)
+    setattr(database_model, data_type, table)
+    model.database = database_model
     return model
 
 
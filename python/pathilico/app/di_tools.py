@@ -46,6 +46,10 @@ class NotDeclaredError(Exception):
     pass
 
 
+class NotInjectedError(Exception):
+    pass
+
+
 class RegisterDeclaredMethod(type):
 
     def __new__(meta, name, bases, attrs):
@@ -77,6 +81,20 @@ class InterfaceBase(object, metaclass=RegisterDeclaredMethod):
             msg = "{} is not declared in interface".format(name)
             raise NotDeclaredError(msg)
 
+    @classmethod
+    def freeze(cls):
+        """Bind injected functions to the class directly
+
+        Call after all implementations are registered, then `lazy_load`
+        is skipped on every call. Functions registered later are ignored.
+        """
+        missing = sorted(DECLARED_METHODS - set(INJECTED_METHODS))
+        if missing:
+            msg = "Not injected: {}".format(", ".join(missing))
+            raise NotInjectedError(msg)
+        for k in DECLARED_METHODS:
+            setattr(cls, k, staticmethod(INJECTED_METHODS[k]))
+
 
 def declare_method(func):
     """Used as decorator"""
@@ -43,17 +43,7 @@ def get_pathology_image_tiles2display(model):
     :param pathfinder.app.model.Model model:
     :return str:
     """
-    bound = Api.get_bound_for_window(model)
-    pathology_ids = Api.get_ids_on_districts(
-        model, [bound], data_type="pathology"
-    )
-    pathology_ids, images = Api.get_images(model, pathology_ids)
-    result = list()
-    for p_id, img in zip(pathology_ids, images):
-        p_record = model.pathology.tile_records[p_id]
-        x, y = p_record.x - model.position.x, p_record.y - model.position.y
-        result.append((x, y, img))
-    return result
+    return Api.get_pathology_tile_images_for_display(model)
 
 
 def get_annotation_images_and_info2display(model):
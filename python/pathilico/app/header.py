@@ -47,6 +47,14 @@ if typing.TYPE_CHECKING:
 
 class Interface(InterfaceBase):
 
+    # pathilico.app.version
+    @staticmethod
+    @declare_method
+    def get_submodel_versions(
+            model: 'Model', submodel_names: typing.Tuple[str, ...]
+    ) -> typing.Tuple[int, ...]:
+        raise NotImplementedError
+
     # pathilico.app.position
     @staticmethod
     @declare_method
@@ -83,6 +91,11 @@ class Interface(InterfaceBase):
     def get_bound_for_window(model: 'Model') -> 'Bound':
         raise NotImplementedError
 
+    @staticmethod
+    @declare_method
+    def get_prefetch_bounds(model: 'Model') -> typing.List['Bound']:
+        raise NotImplementedError
+
     @staticmethod
     @declare_method
     def get_level0_coordinates(model: 'Model', window_x: int, window_y: int
@@ -107,6 +120,11 @@ class Interface(InterfaceBase):
     def get_file_path(model: 'Model') -> str:
         raise NotImplementedError
 
+    @staticmethod
+    @declare_method
+    def get_file_mtime(model: 'Model') -> typing.Optional[int]:
+        raise NotImplementedError
+
     @staticmethod
     @declare_method
     def get_display_name(model: 'Model') -> str:
@@ -122,6 +140,23 @@ class Interface(InterfaceBase):
     def get_level_downsamples(model: 'Model') -> typing.Tuple[int]:
         raise NotImplementedError
 
+    @staticmethod
+    @declare_method
+    def get_slide_index(model: 'Model') -> int:
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def pack_tile_key(
+            slide_index: int, kind: str, level: int, column: int, row: int
+    ) -> int:
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def unpack_tile_key(key: int) -> typing.Tuple[int, int, int, int]:
+        raise NotImplementedError
+
     @staticmethod
     @declare_method
     def get_level0_pathology_slide_height(model: 'Model') -> int:
@@ -138,14 +173,38 @@ class Interface(InterfaceBase):
     def update_pathology(
             model: 'Model', file_path: str, file_name: str, level_count: int,
             level_dimensions: typing.List[typing.Tuple[int]],
-            level_downsamples: typing.List[typing.Union[int, float]]
+            level_downsamples: typing.List[typing.Union[int, float]],
+            mtime: typing.Optional[int] = None
+    ) -> 'Model':
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def get_pathology_tile_ids(
+            model: 'Model', bounds: typing.List['Bound']
+    ) -> typing.List['ObjectId']:
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def get_tile_indices_in_bound(
+            bound: 'Bound', tile_size: typing.Tuple[int, int],
+            level_size: typing.Tuple[int, int]
+    ) -> typing.List[typing.Tuple[int, int]]:
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def reserve_pathology_tile_queries(
+            model: 'Model', pathology_ids: typing.Iterable['ObjectId']
     ) -> 'Model':
         raise NotImplementedError
 
     @staticmethod
     @declare_method
     def get_pathology_tile_images_for_display(
-            model: 'Model') -> typing.List[typing.Tuple[int, int, 'ImageData']]:
+            model: 'Model'
+    ) -> typing.List[typing.Tuple[int, int, 'ImageData', float]]:
         raise NotImplementedError
 
     # pathilico.app.zone
@@ -208,15 +267,47 @@ class Interface(InterfaceBase):
     @staticmethod
     @declare_method
     def collect_queries_for_request(
-            model: 'Model', object_ids: typing.List['ObjectId']
+            model: 'Model', object_ids: typing.List['ObjectId'],
+            data_type: str = None
     ) -> typing.Tuple['Model', typing.List['ObjectId'], typing.List['Query']]:
         raise NotImplementedError
 
+    @staticmethod
+    @declare_method
+    def cancel_requests_except(
+            model: 'Model', object_ids: typing.Iterable['ObjectId']
+    ) -> typing.Tuple['Model', typing.Set['ObjectId']]:
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def get_prefetch_budget(model: 'Model', num_shown: int) -> int:
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def update_image_queue(
+            model: 'Model', data_type: str, depth: int,
+            dropped_ids: typing.Iterable['ObjectId']) -> 'Model':
+        raise NotImplementedError
+
+    @staticmethod
+    @declare_method
+    def get_queue_capacity(model: 'Model', data_type: str) -> int:
+        raise NotImplementedError
+
     @staticmethod
     @declare_method
     def delete_image(model: 'Model', object_id: 'ObjectId') -> 'Model':
         raise NotImplementedError
 
+    @staticmethod
+    @declare_method
+    def delete_images_except(
+            model: 'Model', is_kept: typing.Callable[['ObjectId'], bool]
+    ) -> 'Model':
+        raise NotImplementedError
+
     # pathilico.app.ux
     @staticmethod
     @declare_method
@@ -415,6 +506,13 @@ class Interface(InterfaceBase):
     def fill_grouped_annotation_records(model: 'Model') -> 'Model':
         raise NotImplementedError
 
+    @staticmethod
+    @declare_method
+    def get_grouped_annotation_ids(
+            model: 'Model', bounds: typing.List['Bound']
+    ) -> typing.List['ObjectId']:
+        raise NotImplementedError
+
     # pathilico.app.database
     @staticmethod
     @declare_method
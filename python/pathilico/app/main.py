@@ -19,6 +19,8 @@ from pathilico.app.model import init_model
 from pathilico.app.view import view
 from pathilico.app.update import update
 from pathilico.app.subscriptions import subscriptions
+from pathilico.app.header import Api
+import pathilico.app.port as port
 
 
 LOGGING_CONFIG = dict(
@@ -58,18 +60,29 @@ def load_dependencies():
     import pathilico.app.annotation as _
     import pathilico.app.data as _
     import pathilico.app.menu as _
+    import pathilico.app.version as _
+    Api.freeze()
 
 
-def main():
+def main(record_path=None, profile_latency=False, cache_dir=None,
+         tile_cache_max_bytes=None):
+    """
+    :param str cache_dir: directory of the persistent caches, e.g.
+        "~/DataForML/svs", None disables them
+    :param int tile_cache_max_bytes: limit of the tile cache
+    """
     configure_app_logging_settings()
     load_dependencies()
+    port.configure_cache(cache_dir, tile_cache_max_bytes)
     program(
         init=init_model,
         view=view,
         update=update,
         subscriptions=subscriptions,
         logger_config=LOGGING_CONFIG,
-        initial_window_size=WINDOW_SIZE
+        initial_window_size=WINDOW_SIZE,
+        record_path=record_path,
+        profile_latency=profile_latency
     )
 
 
@@ -22,8 +22,10 @@ class MenuModel(object):
 
 
 def update_explored_file_names_and_paths(model, names, paths):
-    model.menu.file_names = names
-    model.menu.file_paths = paths
+    menu_model = model.menu
+    menu_model.file_names = names
+    menu_model.file_paths = paths
+    model.menu = menu_model
     return model
 
 
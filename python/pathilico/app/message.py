@@ -20,7 +20,9 @@ class Msg(UnionMessage):
     PathologyRegionAcquired = Message(
         "location", "level", "size", "image", "pathology_id", "query"
     )
+    PathologyRegionsAcquired = Message("messages")  # Coalesced reads
     GroupedAnnotationImageAcquired = Message("query", "image", "ga_id")
+    ImageQueueChanged = Message("data_type", "depth", "dropped_keys")
     ExecGroupAnnotation = Message()
     RecordSaved = Message(
         "flag", "error_message", "added_ids", "deleted_ids", "data_type"
@@ -32,7 +34,7 @@ class Msg(UnionMessage):
     ExecLoadFromDatabase = Message()
     SlideInfoAcquired = Message(
         "level_count", "level_dimensions", "file_path", "file_name",
-        "level_downsamples"
+        "level_downsamples", "mtime"
     )
     Enlarge = Message("x", "y")
     Shrink = Message("x", "y")
@@ -17,8 +17,15 @@ from pathilico.app.message import Msg
 from pathilico.app.ports.file_explore import get_explore_file_commands
 
 
+SUBMODEL_NAMES = (
+    "position", "pathology", "zone", "resource", "ux", "user", "annotation",
+    "database", "menu"
+)
+
+
 class Model(object):
     def __init__(self):
+        self.versions = dict()  # submodel name: int
         self.position = Api.PositionModel()
         self.pathology = Api.PathologyModel()
         self.zone = Api.ZoneModel()
@@ -29,6 +36,12 @@ class Model(object):
         self.database = Api.DatabaseModel()
         self.menu = Api.MenuModel()
 
+    def __setattr__(self, key, value):
+        versions = self.__dict__.get("versions", None)
+        if versions is not None:
+            versions[key] = versions.get(key, 0) + 1
+        super().__setattr__(key, value)
+
 
 def init_model():
     model = Model()
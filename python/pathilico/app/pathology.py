@@ -13,12 +13,16 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 from collections import namedtuple
-import itertools
-import uuid
 
 from pathilico.app.header import Api
 
 
+# Runtime ids of tiles, they are not persisted
+TILE_KINDS = {"pathology": 0, "grouped_annotation": 1}
+TILE_LEVEL_BITS = 6
+TILE_INDEX_BITS = 24  # Column and row
+
+
 # Essence APIs
 class PathologyModel(object):
     def __init__(self, file_path="", tile_size=(1024, 1024), display_name=""):
@@ -29,7 +33,8 @@ class PathologyModel(object):
         self.heights = [0]
         self.downsamples = [1]
         self.tile_width, self.tile_height = tile_size
-        self.tile_records = dict()
+        self.slide_index = 0  # Counted up for each opened file
+        self.mtime = None  # Modified time when the file is opened
 
 
 PathologyTileImageRecord = namedtuple(
@@ -41,20 +46,36 @@ OpenSlideReadRegionQuery = namedtuple(
 
 
 # Private
-def generate_id(file_name, x, y, level):
-    """Generate unique byte from input values for pathology tile record
+def pack_tile_key(slide_index, kind, level, column, row):
+    """Pack the position of a tile into an int used as its id
 
-    :param str file_name:
-    :param int x:
-    :param int y:
+    :param int slide_index:
+    :param str kind: key of TILE_KINDS
     :param int level:
-    :return byte:
+    :param int column:
+    :param int row:
+    :return int:
     """
-    uri = "pathilico.org/v1/file/{}/pathology/level/{}/x/{}/y/{}".format(
-        file_name, level, x, y
-    )
-    pf_id = uuid.uuid5(uuid.NAMESPACE_URL, uri).bytes
-    return pf_id
+    key = (slide_index << 1) | TILE_KINDS[kind]
+    key = (key << TILE_LEVEL_BITS) | level
+    key = (key << TILE_INDEX_BITS) | column
+    return (key << TILE_INDEX_BITS) | row
+
+
+def unpack_tile_key(key):
+    """Inverse of `pack_tile_key`
+
+    :param int key:
+    :return (int, int, int, int): level, column, row and slide_index
+    """
+    index_mask = (1 << TILE_INDEX_BITS) - 1
+    row = key & index_mask
+    key >>= TILE_INDEX_BITS
+    column = key & index_mask
+    key >>= TILE_INDEX_BITS
+    level = key & ((1 << TILE_LEVEL_BITS) - 1)
+    slide_index = key >> (TILE_LEVEL_BITS + 1)
+    return level, column, row, slide_index
 
 
 def get_openslide_query(
@@ -79,7 +100,7 @@ def get_openslide_query(
 
 def set_pathology_info(
         pathology_model, file_path, file_name, level_count, level_dimensions,
-        level_downsamples):
+        level_downsamples, mtime=None):
     """Setter for PathologyModel's attributes
 
     :param PathologyModel pathology_model:
@@ -88,53 +109,143 @@ def set_pathology_info(
     :param level_count:
     :param level_dimensions:
     :param level_downsamples:
+    :param mtime: modified time of the file, readers are keyed by it
     :return PathologyModel:
     """
     pathology_model.file_path = file_path
+    pathology_model.mtime = mtime
     pathology_model.display_name = file_name
     pathology_model.num_levels = level_count
     pathology_model.widths = [i[0] for i in level_dimensions]
     pathology_model.heights = [i[1] for i in level_dimensions]
     pathology_model.downsamples = [int(l) for l in level_downsamples]
+    # Ids of tiles of the previous file are not reused
+    pathology_model.slide_index += 1
     return pathology_model
 
 
-def fill_pathology_tile_records(model):
-    """This function should be called when pathology file is selected
+def get_tile_indices_in_bound(bound, tile_size, level_size):
+    """(column, row) of tiles overlapping the bound in row-major order
+
+    The grid has `size // tile_size + 1` tiles in each direction.
 
-    :param pathfinder.app.model.Model model:
-    :return pathilico.app.model.Model:
+    :param bound: (left, bottom, right, top, level)
+    :param (int, int) tile_size:
+    :param (int, int) level_size: width and height of the level
+    :return List[(int, int)]:
     """
-    t_w, t_h = model.pathology.tile_width, model.pathology.tile_height
-    for level in range(model.pathology.num_levels):
-        w, h = model.pathology.widths[level], model.pathology.heights[level]
-        num_hor = w // t_w + 1
-        num_ver = h // t_h + 1
-        for hor_i, ver_i in itertools.product(range(num_hor), range(num_ver)):
-            pathology_id = generate_id(
-                model.pathology.display_name, x=hor_i, y=ver_i, level=level,
-            )
-            x = hor_i * t_w
-            y = ver_i * t_h
-            os_location, os_level, os_size = get_openslide_query(
-                x=x, y=y, level=level, tile_width=t_w, tile_height=t_h,
-                level_heights=model.pathology.heights,
-                level_downsamples=model.pathology.downsamples
-            )
-            openslide_query = OpenSlideReadRegionQuery(
-                location=os_location, level=os_level, size=os_size
-            )
-            rec = PathologyTileImageRecord(
-                x=x, y=y, level=level, openslide_query=openslide_query
-            )
-            model.pathology.tile_records[pathology_id] = rec
-            model = Api.bind_id_on_districts(
-                model, pathology_id, [(x, y, x+t_w, y+t_h, level)], "pathology"
-            )
-            model = Api.reserve_image_query(
-                model, object_id=pathology_id, query=openslide_query
-            )
-    return model
+    left, bottom, right, top, _ = bound
+    t_w, t_h = tile_size
+    num_hor = level_size[0] // t_w + 1
+    num_ver = level_size[1] // t_h + 1
+    columns = range(
+        max(0, int(left // t_w)), min(num_hor, int((right - 1) // t_w) + 1)
+    )
+    rows = range(
+        max(0, int(bottom // t_h)), min(num_ver, int((top - 1) // t_h) + 1)
+    )
+    return [(c, r) for r in rows for c in columns]
+
+
+def get_tile_ids_in_bound(pathology_model, bound):
+    """Ids of tiles overlapping the bound, computed from the tile grid
+
+    Tiles are not stored, so the cost depends only on the size of bound.
+
+    :param PathologyModel pathology_model:
+    :param bound: (left, bottom, right, top, level)
+    :return List[int]: in row-major order
+    """
+    level = bound[-1]
+    if not 0 <= level < pathology_model.num_levels:
+        return list()
+    indices = get_tile_indices_in_bound(
+        bound, (pathology_model.tile_width, pathology_model.tile_height),
+        (pathology_model.widths[level], pathology_model.heights[level])
+    )
+    return [
+        pack_tile_key(pathology_model.slide_index, "pathology", level, c, r)
+        for c, r in indices
+    ]
+
+
+def get_tile_record(pathology_model, pathology_id):
+    """Compute the record of a tile given by `get_tile_ids_in_bound`
+
+    :param PathologyModel pathology_model:
+    :param int pathology_id:
+    :return PathologyTileImageRecord:
+    """
+    level, column, row, _ = unpack_tile_key(pathology_id)
+    t_w, t_h = pathology_model.tile_width, pathology_model.tile_height
+    x, y = column * t_w, row * t_h
+    os_location, os_level, os_size = get_openslide_query(
+        x=x, y=y, level=level, tile_width=t_w, tile_height=t_h,
+        level_heights=pathology_model.heights,
+        level_downsamples=pathology_model.downsamples
+    )
+    openslide_query = OpenSlideReadRegionQuery(
+        location=os_location, level=os_level, size=os_size
+    )
+    return PathologyTileImageRecord(
+        x=x, y=y, level=level, openslide_query=openslide_query
+    )
+
+
+def select_placeholder_tiles(missing_tiles, coarser_tiles, tile_size):
+    """Pick tiles of coarser levels which cover missing tiles
+
+    :param Iter[(int, int)] missing_tiles: (x, y) of missing tiles
+    :param coarser_tiles: list of (x, y, image, scale) in the coordinates
+        of the level of missing tiles, finer levels come first
+    :param (int, int) tile_size:
+    :return: list of (x, y, image, scale), coarser levels come first
+    """
+    t_w, t_h = tile_size
+    missing = set(missing_tiles)
+    result = list()
+    for x, y, img, scale in coarser_tiles:
+        if not missing:
+            break
+        covered = {
+            (m_x, m_y) for m_x, m_y in missing
+            if x <= m_x < x + t_w * scale and y <= m_y < y + t_h * scale
+        }
+        if covered:
+            missing -= covered
+            result.append((x, y, img, scale))
+    return result[::-1]
+
+
+def get_placeholder_images(model, missing_ids, bound):
+    """Upscaled images of cached coarser tiles over missing tiles
+
+    :return: list of (x, y, image, scale), x and y on the window
+    """
+    left, bottom, right, top, level = bound
+    downsamples = model.pathology.downsamples
+    coarser_tiles = list()
+    for c_level in range(level + 1, model.pathology.num_levels):
+        scale = downsamples[c_level] / downsamples[level]
+        c_bound = (
+            int(left // scale), int(bottom // scale),
+            int(-(-right // scale)), int(-(-top // scale)), c_level
+        )
+        c_ids = get_tile_ids_in_bound(model.pathology, c_bound)
+        for p_id, img in zip(*Api.get_images(model, c_ids)):
+            rec = get_tile_record(model.pathology, p_id)
+            coarser_tiles.append((rec.x * scale, rec.y * scale, img, scale))
+    missing_tiles = [
+        get_tile_record(model.pathology, i)[:2] for i in missing_ids
+    ]
+    tiles = select_placeholder_tiles(
+        missing_tiles, coarser_tiles,
+        (model.pathology.tile_width, model.pathology.tile_height)
+    )
+    return [
+        (x - model.position.x, y - model.position.y, img, scale)
+        for x, y, img, scale in tiles
+    ]
 
 
 # Public functions (Actual implementations for Api)
@@ -142,6 +253,10 @@ def get_file_path(model):
     return model.pathology.file_path
 
 
+def get_file_mtime(model):
+    return model.pathology.mtime
+
+
 def get_display_name(model):
     return model.pathology.display_name
 
@@ -150,6 +265,10 @@ def get_level_downsamples(model):
     return model.pathology.downsamples
 
 
+def get_slide_index(model):
+    return model.pathology.slide_index
+
+
 def get_level0_pathology_slide_height(model):
     return model.pathology.heights[0]
 
@@ -166,36 +285,67 @@ def get_num_levels(model):
 
 def update_pathology(
         model, file_path, file_name, level_count, level_dimensions,
-        level_downsamples):
+        level_downsamples, mtime=None):
     model.pathology = set_pathology_info(
         model.pathology, file_path, file_name, level_count, level_dimensions,
-        level_downsamples
+        level_downsamples, mtime
+    )
+    # Tiles of previous files are never shown again
+    slide_index = model.pathology.slide_index
+    model = Api.delete_images_except(
+        model, lambda i: unpack_tile_key(i)[3] == slide_index
     )
-    model = fill_pathology_tile_records(model)
     model = Api.fill_grouped_annotation_records(model)
     return model
 
 
+def get_pathology_tile_ids(model, bounds):
+    pathology_ids, seen_ids = list(), set()
+    for bound in bounds:
+        for p_id in get_tile_ids_in_bound(model.pathology, bound):
+            if p_id not in seen_ids:
+                seen_ids.add(p_id)
+                pathology_ids.append(p_id)
+    return pathology_ids
+
+
+def reserve_pathology_tile_queries(model, pathology_ids):
+    """Reserve read_region queries of tiles before requesting them"""
+    for p_id in pathology_ids:
+        query = get_tile_record(model.pathology, p_id).openslide_query
+        model = Api.reserve_image_query(model, object_id=p_id, query=query)
+    return model
+
+
 def get_pathology_tile_images_for_display(model):
     bound = Api.get_bound_for_window(model)
-    pathology_ids = Api.get_ids_on_districts(
-        model, [bound], data_type="pathology"
-    )
-    pathology_ids, images = Api.get_images(model, pathology_ids)
+    pathology_ids = get_tile_ids_in_bound(model.pathology, bound)
+    shown_ids, images = Api.get_images(model, pathology_ids)
     result = list()
-    for p_id, img in zip(pathology_ids, images):
-        p_record = model.pathology.tile_records[p_id]
+    for p_id, img in zip(shown_ids, images):
+        p_record = get_tile_record(model.pathology, p_id)
         x, y = p_record.x - model.position.x, p_record.y - model.position.y
-        result.append((x, y, img))
+        result.append((x, y, img, 1))
+    missing_ids = set(pathology_ids) - set(shown_ids)
+    if missing_ids:
+        # Shown until the tiles of the level arrive, no extra reads
+        result = get_placeholder_images(model, missing_ids, bound) + result
     return result
 
 
 Api.register(PathologyModel)
 Api.register(get_file_path)
+Api.register(get_file_mtime)
 Api.register(get_display_name)
 Api.register(get_level_downsamples)
 Api.register(get_num_levels)
 Api.register(get_level0_pathology_slide_height)
 Api.register(get_pathology_slide_widths_and_heights)
 Api.register(update_pathology)
+Api.register(get_pathology_tile_ids)
+Api.register(get_tile_indices_in_bound)
+Api.register(get_slide_index)
+Api.register(pack_tile_key)
+Api.register(unpack_tile_key)
+Api.register(reserve_pathology_tile_queries)
 Api.register(get_pathology_tile_images_for_display)
@@ -13,6 +13,7 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 import os
+import functools
 from logging import getLogger
 
 import openslide
@@ -20,138 +21,353 @@ from PIL import ImageDraw, Image
 
 import pathilico.pygletelm.effect as effect
 import pathilico.app.popup as popup
+import pathilico.app.ports.tile_cache as tile_cache
+import pathilico.app.ports.region_block as region_block
+import pathilico.app.ports.slide_index as slide_index
+
+
+# Name of pools in effect.WORKER_POOLS, sizes are configurable by program()
+PATHOLOGY_READER_POOL_NAME = "pathology_reader"
+GROUP_ANNOTATION_POOL_NAME = "group_annotation"
+SLIDE_INFO_POOL_NAME = "slide_info"
+SLIDE_INFO_POOL_SIZE = 1
+PATHOLOGY_READER_POOL_SIZE = min(8, max(2, effect.CPU_COUNT))
+# Each process holds its own OpenSlide handle, decoding does not hold
+# the GIL of the render loop. False reads tiles on threads instead.
+PATHOLOGY_READER_PROCESSES = True
+GROUP_ANNOTATION_POOL_SIZE = effect.CPU_COUNT
+# Waiting requests of the same object are merged, the oldest are dropped
+IMAGE_QUEUE_SIZE = 256
+IMAGE_QUEUE_POLICY = "merge"
+# Decoded tiles and slide metadata are kept across sessions in this
+# directory, set by configure_cache. None disables both of them, nothing
+# is written then.
+CACHE_DIR = None
+PATHOLOGY_TILE_CACHE_MAX_BYTES = tile_cache.TILE_CACHE_MAX_BYTES
+# Adjacent tiles are read by one read_region up to this size (pixels)
+PATHOLOGY_BLOCK_MAX_SIZE = region_block.BLOCK_MAX_SIZE
+# Readers of recently viewed slides are kept open to switch files quickly
+PATHOLOGY_MAX_OPEN_SLIDES = 2
+
+
+def configure_cache(cache_dir=None, tile_cache_max_bytes=None):
+    """Enable the tile cache and the slide index, see CACHE_DIR
+
+    The directory is made by the first worker which opens the cache.
+
+    :param str cache_dir: "~" is expanded, None disables the cache
+    :param int tile_cache_max_bytes: limit of the total size of tiles
+    """
+    global CACHE_DIR, PATHOLOGY_TILE_CACHE_MAX_BYTES
+    CACHE_DIR = os.path.expanduser(cache_dir) if cache_dir else None
+    if tile_cache_max_bytes is not None:
+        PATHOLOGY_TILE_CACHE_MAX_BYTES = tile_cache_max_bytes
+
 
+def get_cache_path(file_name):
+    """Path of the file in CACHE_DIR, None if the cache is disabled"""
+    if CACHE_DIR is None:
+        return None
+    return os.path.join(CACHE_DIR, file_name)
 
-class GetSlideInfo(effect.InstantCommandBase):
+
+class GetSlideInfo(effect.PooledCommandBase):
+    pool_name = SLIDE_INFO_POOL_NAME
 
     def __init__(self, file_path, msg, msg_kwargs=None, logger=None):
+        """Slide info is read on a worker, files may be on slow storage"""
         self.msg_constructor = msg
         self.msg_kwargs = msg_kwargs or dict()
         self.file_path = file_path
         self.logger = logger or getLogger("pfapp.Pathology")
-        super().__init__()
 
-    def get_message(self):
-        if not os.path.isfile(self.file_path):
-            self.logger.warn("File {} not found".format(
-                self.file_path
-            ))
-            return False, "File not found"
+    def get_worker_factory(self):
+        return functools.partial(
+            SlideInfoWorker,
+            index_path=get_cache_path(slide_index.SLIDE_INDEX_FILE_NAME),
+            logger=self.logger
+        )
+
+    def get_pool_options(self):
+        return dict(default_size=SLIDE_INFO_POOL_SIZE)
+
+    def get_request(self):
+        return self.file_path
+
+    def __str__(self):
+        return "GetSlideInfo: {}".format(self.file_path)
+
+    def get_message_from_response(self, is_succeeded, response):
+        if not is_succeeded:
+            return False, None
+        self.logger.debug("Slide info is acquired")
+        msg = self.msg_constructor(
+            file_path=self.file_path,
+            file_name=os.path.basename(self.file_path),
+            **response, **self.msg_kwargs
+        )
+        return True, msg
+
+
+class SlideInfoWorker(object):
+
+    def __init__(self, index_path=None, logger=None):
+        """Read slide info from slide index, or from the slide on miss"""
+        self.logger = logger or getLogger("pfapp.Pathology")
+        self.index = None
+        if index_path:
+            try:
+                self.index = slide_index.SlideIndex(
+                    index_path, logger=self.logger
+                )
+            except Exception as e:
+                self.logger.warn("Slide index is disabled, {}".format(e))
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+
+    def read_slide_info(self, file_path):
+        s = openslide.OpenSlide(file_path)
         try:
-            s = openslide.OpenSlide(self.file_path)
-            file_name = os.path.basename(self.file_path)
-            msg = self.msg_constructor(
-                file_path=self.file_path, file_name=file_name,
-                level_count=s.level_count, level_dimensions=s.level_dimensions,
-                level_downsamples=s.level_downsamples,
-                **self.msg_kwargs
+            return dict(
+                level_count=s.level_count,
+                level_dimensions=tuple(s.level_dimensions),
+                level_downsamples=tuple(s.level_downsamples)
             )
+        finally:
             s.close()
-            self.logger.debug("Slide info is acquired")
-            return True, msg
+
+    def get_response(self, file_path):
+        try:
+            stamp = slide_index.get_file_stamp(file_path)
+        except OSError:
+            self.logger.warn("File {} not found".format(file_path))
+            return False, "File not found"
+        try:
+            info = None
+            if self.index is not None:
+                info = self.index.get(file_path, stamp)
+            if info is None:
+                info = self.read_slide_info(file_path)
+                if self.index is not None:
+                    self.index.put(file_path, stamp, info)
+            # Readers are keyed by it, so the file is not stat per tile
+            return True, dict(info, mtime=stamp[1])
         except Exception as e:
             self.logger.error(e)
-            return False, e
-
+            return False, str(e)
 
-PATHOLOGY_READER_POOL = list()
-PATHOLOGY_READER_LOAD = list()
-PATHOLOGY_READER_FILE_PATH = [""]
-GROUP_ANNOTATION_WORKER_POOL = list()
 
-
-class ReadRegionFromPathologySlide(effect.CommandWithThreadWorkerBase):
+class ReadRegionFromPathologySlide(effect.PooledCommandBase):
+    pool_name = PATHOLOGY_READER_POOL_NAME
 
     def __init__(
             self, file_path, location, level, size, msg, msg_kwargs=None,
-            num_workers=4, logger=None):
+            num_workers=PATHOLOGY_READER_POOL_SIZE, logger=None, mtime=None):
+        """Read a region of the slide on the reader pool
+
+        :param mtime: modified time of the file given by GetSlideInfo,
+            the file is opened again when it changes
+        """
         self.logger = logger or getLogger("pfapp.Pathology")
-        if not PATHOLOGY_READER_FILE_PATH[0] == file_path:
-            PATHOLOGY_READER_FILE_PATH[0] = file_path
-            PATHOLOGY_READER_POOL.clear()
-            PATHOLOGY_READER_LOAD.clear()
-        if len(PATHOLOGY_READER_POOL) < num_workers:
-            for i in range(num_workers - len(PATHOLOGY_READER_POOL)):
-                worker = OpenSlideWorker(
-                    file_path=file_path, logger=self.logger
-                )
-                thread = effect.BidirectionalStreamingThread(
-                    worker=worker, auto_start=True, daemon=True
-                )
-                PATHOLOGY_READER_LOAD.append(0)
-                PATHOLOGY_READER_POOL.append(thread)
         self.msg_constructor = msg
         self.msg_kwargs = msg_kwargs or dict()
         self.file_path = file_path
+        self.mtime = mtime
         self.location = location
         self.level = level
         self.size = size
-        self.thread_id = 0
-        self._is_finished = False
+        self.num_workers = num_workers
+
+    def get_worker_factory(self):
+        return functools.partial(
+            OpenSlideWorker, file_path=self.file_path, logger=self.logger,
+            cache_path=get_cache_path(tile_cache.TILE_CACHE_FILE_NAME),
+            cache_max_bytes=PATHOLOGY_TILE_CACHE_MAX_BYTES
+        )
 
-    def is_done(self):
-        return self._is_finished
+    def get_worker_key(self):
+        # Readers are opened per file, modified files are opened again
+        return self.file_path, self.mtime
 
-    def start(self):
-        req = (
-            self.msg_constructor, self.msg_kwargs, self.location, self.level,
-            self.size
+    def get_pool_options(self):
+        return dict(
+            default_size=self.num_workers, prioritized=True,
+            processes=PATHOLOGY_READER_PROCESSES,
+            queue_size=IMAGE_QUEUE_SIZE, queue_policy=IMAGE_QUEUE_POLICY,
+            max_keys=PATHOLOGY_MAX_OPEN_SLIDES
         )
-        self.thread_id = [
-            i for i, v in enumerate(PATHOLOGY_READER_LOAD)
-            if v == min(PATHOLOGY_READER_LOAD)
-        ][0]
-        thread = PATHOLOGY_READER_POOL[self.thread_id]
-        thread.add_request(req)
+
+    def get_request(self):
+        # Only picklable data, messages are built on main thread
+        return self.location, self.level, self.size
+
+    def get_cancel_key(self):
+        return self.msg_kwargs.get("pathology_id", None)
 
     def __str__(self):
         return "ReadRegion: {}".format(self.location)
 
-    def done(self):
-        pass
+    def get_message_from_response(self, is_succeeded, response):
+        if not is_succeeded:
+            return False, None
+        self.logger.debug("Worker's response collected {}".format(response))
+        message = self.msg_constructor(
+            location=self.location, level=self.level, size=self.size,
+            image=response, **self.msg_kwargs
+        )
+        return True, message
+
 
-    def get_message(self):
-        thread = PATHOLOGY_READER_POOL[self.thread_id]
-        flag, res = thread.get_response()
-        if flag:
-            self.logger.debug("Worker's response collected {}".format(res))
-            msg_constructor, msg_kwargs, location, level, size, img = res
-            message = msg_constructor(
-                location=location, level=level, size=size, image=img,
-                **msg_kwargs
-            )
-            return True, message
-        else:
+class ReadBlockFromPathologySlide(ReadRegionFromPathologySlide):
+
+    def __init__(
+            self, file_path, location, level, size, tile_size, tiles,
+            msg, msg_kwargs_list, batch_msg,
+            num_workers=PATHOLOGY_READER_POOL_SIZE, logger=None, mtime=None):
+        """Read adjacent tiles by one read_region
+
+        The tile images are passed as batch_msg(messages=[msg(...), ...]).
+
+        :param tile_size: size of each tile
+        :param tiles: tuple of (location of tile, (x, y) offset in block)
+        :param msg_kwargs_list: msg_kwargs of each tile
+        """
+        super().__init__(
+            file_path, location, level, size, msg, num_workers=num_workers,
+            logger=logger, mtime=mtime
+        )
+        self.tile_size = tile_size
+        self.tiles = tiles
+        self.msg_kwargs_list = msg_kwargs_list
+        self.batch_msg = batch_msg
+
+    def get_request(self):
+        return self.location, self.level, self.size, self.tile_size, \
+            self.tiles
+
+    def get_cancel_key(self):
+        # Cancelled when all the tiles are cancelled
+        return tuple([kw.get("pathology_id", None)
+                      for kw in self.msg_kwargs_list])
+
+    def __str__(self):
+        return "ReadBlock: {} x {}".format(self.location, len(self.tiles))
+
+    def get_message_from_response(self, is_succeeded, response):
+        if not is_succeeded:
             return False, None
+        messages = [
+            self.msg_constructor(
+                location=location, level=self.level, size=self.tile_size,
+                image=img, **msg_kwargs
+            ) for (location, _), img, msg_kwargs
+            in zip(self.tiles, response, self.msg_kwargs_list)
+        ]
+        return True, self.batch_msg(messages=messages)
 
 
 class OpenSlideWorker(object):
 
-    def __init__(self, file_path, logger=None):
-        self.slide = openslide.OpenSlide(file_path)
+    def __init__(
+            self, file_path, logger=None, cache_path=None,
+            cache_max_bytes=tile_cache.TILE_CACHE_MAX_BYTES):
+        """Read tiles from tile cache, or from the slide on cache miss
+
+        The slide is opened on the first cache miss.
+        """
         self.logger = logger or getLogger("pfapp.Pathology")
+        self.file_path = file_path
+        self.slide = None
+        self.cache, self.fingerprint = None, None
+        if cache_path:
+            try:
+                self.fingerprint = tile_cache.get_slide_fingerprint(file_path)
+                self.cache = tile_cache.TileCache(
+                    cache_path, cache_max_bytes, logger=self.logger
+                )
+            except Exception as e:
+                self.logger.warn("Tile cache is disabled, {}".format(e))
+
+    def close(self):
+        if self.slide is not None:
+            self.slide.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def read_region(self, location, level, size):
+        img = self.get_cached_tile(location, level, size)
+        if img is not None:
+            return img
+        img = self.read_slide(location, level, size)
+        self.put_cached_tile(location, level, img)
+        return img
+
+    def read_block(self, location, level, size, tile_size, tiles):
+        """Read tiles by one read_region unless all of them are cached
+
+        :return: tuple of tile images in the order of tiles
+        """
+        images = [
+            self.get_cached_tile(tile_location, level, tile_size)
+            for tile_location, _ in tiles
+        ]
+        if all([img is not None for img in images]):
+            return tuple(images)
+        block = self.read_slide(location, level, size)
+        images = region_block.split_block_image(
+            block, [offset for _, offset in tiles], tile_size
+        )
+        for (tile_location, _), img in zip(tiles, images):
+            self.put_cached_tile(tile_location, level, img)
+        return images
+
+    def read_slide(self, location, level, size):
+        if self.slide is None:
+            self.slide = openslide.OpenSlide(self.file_path)
+        return self.slide.read_region(location, level, size)
+
+    def get_cached_tile(self, location, level, size):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(self.fingerprint, level, location, size)
+        except Exception as e:
+            self.logger.warn("Failed to read tile cache, {}".format(e))
+            return None
+
+    def put_cached_tile(self, location, level, img):
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(self.fingerprint, level, location, img)
+        except Exception as e:
+            self.logger.warn("Failed to write tile cache, {}".format(e))
 
     def get_response(self, request):
-        msg_constructor, msg_kwargs, location, level, size = request
+        location, level, size = request[:3]
         self.logger.debug("Start reading slide {}, {}".format(location, level))
         try:
-            img = self.slide.read_region(location, level, size)
-            res = msg_constructor, msg_kwargs, location, level, size, img
+            if len(request) > 3:
+                img = self.read_block(*request)
+            else:
+                img = self.read_region(location, level, size)
             self.logger.debug(
                 "Tile image is read {}, {}".format(location, level)
             )
-            return True, res
+            return True, img
         except Exception as e:
             self.logger.warn(
                 "OpenSlideWorker is failed to read {}, {}, {}".format(
                     location, level, e
                 ))
-            return False, e
+            return False, str(e)
 
 
 def get_slide_info(file_path, msg, msg_kwargs=None):
     cmd = GetSlideInfo(file_path, msg, msg_kwargs)
-    return effect.EffectObject(instants=[cmd])
+    return effect.EffectObject(effects=[cmd])
 
 
 def read_region(file_path, location, level, size, msg, msg_kwargs=None):
@@ -161,18 +377,91 @@ def read_region(file_path, location, level, size, msg, msg_kwargs=None):
     return effect.EffectObject(effects=[cmd])
 
 
-def generate_openslide_read_region_commands(queries):
+def get_read_region_priority(request, level, center, level_downsamples):
+    """Level difference, then squared distance from center (level 0 cs)"""
+    location, r_level, size = request[:3]  # Also blocks of tiles
+    scale = level_downsamples[r_level] if r_level < len(level_downsamples) \
+        else 1
+    dx = location[0] + size[0] * scale / 2 - center[0]
+    dy = location[1] + size[1] * scale / 2 - center[1]
+    return abs(r_level - level), dx * dx + dy * dy
+
+
+def prioritize_read_regions(level, center, level_downsamples):
+    """Read tiles of the level and near the center (OpenSlide cs) first"""
+    func = functools.partial(
+        get_read_region_priority, level=level, center=center,
+        level_downsamples=tuple(level_downsamples)
+    )
+    return effect.set_pool_priority(PATHOLOGY_READER_POOL_NAME, func)
+
+
+def cancel_image_requests(object_ids):
+    """Cancel reading regions and grouping annotations of object_ids
+
+    Requests are matched by `pathology_id` and `ga_id` of msg_kwargs
     """
+    return effect.Commands(
+        effect.cancel_pooled_requests(PATHOLOGY_READER_POOL_NAME, object_ids),
+        effect.cancel_pooled_requests(GROUP_ANNOTATION_POOL_NAME, object_ids)
+    )
+
+
+def watch_image_queues(msg, sec=0.1):
+    """Report depths of image queues as msg(data_type, depth, dropped_keys)
+
+    data_type is "pathology" or "grouped_annotation", dropped_keys are
+    object ids whose requests are dropped by the bounded queue.
+    """
+    return effect.Subscriptions(
+        effect.watch_pool_queue(
+            PATHOLOGY_READER_POOL_NAME, msg, dict(data_type="pathology"), sec
+        ),
+        effect.watch_pool_queue(
+            GROUP_ANNOTATION_POOL_NAME, msg,
+            dict(data_type="grouped_annotation"), sec
+        )
+    )
+
+
+def generate_openslide_read_region_commands(
+        queries, level_downsamples=None, batch_msg=None,
+        max_size=PATHOLOGY_BLOCK_MAX_SIZE, mtime=None):
+    """
+
+    Adjacent tiles are coalesced when level_downsamples and batch_msg
+    are given, see ReadBlockFromPathologySlide.
 
-    :param queries:
     :param Iter[file_path, location, level, size, msg, msg_kwargs] queries:
+    :param level_downsamples:
+    :param batch_msg:
+    :param (int, int) max_size: limit of coalesced read_region
+    :param mtime: modified time of the file, see Api.get_file_mtime
     :return:
     """
-    cmds = list()
-    for f_path, loc, lev, size, msg, msg_kwargs in queries:
-        cmd = ReadRegionFromPathologySlide(
-            f_path, loc, lev, size, msg, msg_kwargs
+    queries = list(queries)
+    if level_downsamples is None or batch_msg is None:
+        blocks = [
+            (q[1], q[2], q[3], ((i, (0, 0)), )) for i, q in enumerate(queries)
+        ]
+    else:
+        blocks = region_block.coalesce_regions(
+            [q[1:4] for q in queries], level_downsamples, max_size
         )
+    cmds = list()
+    for loc, lev, size, tiles in blocks:
+        f_path, _, _, tile_size, msg, msg_kwargs = queries[tiles[0][0]]
+        if len(tiles) == 1:
+            cmd = ReadRegionFromPathologySlide(
+                f_path, loc, lev, size, msg, msg_kwargs, mtime=mtime
+            )
+        else:
+            cmd = ReadBlockFromPathologySlide(
+                f_path, loc, lev, size, tile_size,
+                tuple([(queries[i][1], offset) for i, offset in tiles]),
+                msg, [queries[i][5] for i, _ in tiles], batch_msg,
+                mtime=mtime
+            )
         cmds.append(cmd)
     return effect.EffectObject(effects=cmds)
 
@@ -258,20 +547,19 @@ class GroupedAnnotationImageWorker(object):
         self.logger = logger or getLogger("pfapp.GroupAnnotation")
 
     def get_response(self, request):
-        msg_constructor, msg_kwargs, points, polygons, tile_shape = request
+        """Runs on a child process, request and response are picklable"""
+        points, polygons, tile_shape = request
         try:
             img = create_grouped_annotation_image(points, polygons, tile_shape)
-            response = msg_constructor, msg_kwargs, img
-            self.logger.debug("Grouped image, {}, {}, {}".format(msg_kwargs, img, type(img)))
-            return True, response
+            self.logger.debug("Grouped image, {}, {}".format(img, type(img)))
+            return True, img
         except Exception as e:
-            self.logger.warning(
-                "Failed to group image, {}, {}".format(msg_kwargs, e)
-            )
-            return False, e
+            self.logger.warning("Failed to group image, {}".format(e))
+            return False, str(e)
 
 
-class GroupAnnotationAsImage(effect.CommandWithThreadWorkerBase):
+class GroupAnnotationAsImage(effect.PooledCommandBase):
+    pool_name = GROUP_ANNOTATION_POOL_NAME
 
     def __init__(
             self, msg, points=tuple(), polygons=tuple(),
@@ -281,40 +569,29 @@ class GroupAnnotationAsImage(effect.CommandWithThreadWorkerBase):
         self.points, self.polygons = points, polygons
         self.tile_shape = tile_shape
         self.msg_kwargs = msg_kwargs or dict()
-        if len(GROUP_ANNOTATION_WORKER_POOL) == 0:
-            worker = GroupedAnnotationImageWorker()
-            thread = effect.BidirectionalStreamingThread(
-                worker=worker, auto_start=True, daemon=True
-            )
-            GROUP_ANNOTATION_WORKER_POOL.append(thread)
-
-    def is_done(self):
-        return False
 
-    def done(self):
-        pass
+    def get_worker_factory(self):
+        return GroupedAnnotationImageWorker
 
-    def start(self):
-        request = (
-            self.msg_constructor, self.msg_kwargs, self.points, self.polygons,
-            self.tile_shape
+    def get_pool_options(self):
+        # PIL drawing holds GIL, rasterize on processes to use every core
+        return dict(
+            default_size=GROUP_ANNOTATION_POOL_SIZE, processes=True,
+            queue_size=IMAGE_QUEUE_SIZE, queue_policy=IMAGE_QUEUE_POLICY
         )
-        thread = GROUP_ANNOTATION_WORKER_POOL[0]
-        thread.add_request(request)
 
-    def get_message(self):
-        if len(GROUP_ANNOTATION_WORKER_POOL) == 1:
-            thread = GROUP_ANNOTATION_WORKER_POOL[0]
-            flag, res = thread.get_response()
-            if flag:
-                self.logger.debug("Got res from gro-anno worker {}".format(res))
-                msg_constructor, msg_kwargs, img = res
-                message = msg_constructor(image=img, **msg_kwargs)
-                return True, message
-            else:
-                return False, None
-        else:
+    def get_request(self):
+        return self.points, self.polygons, self.tile_shape
+
+    def get_cancel_key(self):
+        return self.msg_kwargs.get("ga_id", None)
+
+    def get_message_from_response(self, is_succeeded, response):
+        if not is_succeeded:
             return False, None
+        self.logger.debug("Got res from gro-anno worker {}".format(response))
+        message = self.msg_constructor(image=response, **self.msg_kwargs)
+        return True, message
 
 
 # [(msg, msg_kwargs, points, polygons, tile_shape)]
@@ -335,23 +612,9 @@ if __name__ == "__main__":
     s_path = os.path.expanduser("~/DataForML/svs/aiba.svs")
     assert os.path.isfile(s_path)
 
-    class MockMessage(object):
-        def __init__(self, *args, **kwargs):
-            self.args, self.kwargs = args, kwargs
-
-        def __str___(self):
-            return "{} + {}".format(self.args, self.kwargs)
-
-    get_si = GetSlideInfo(file_path=s_path, msg=MockMessage)
-    f, m = get_si.get_message()
-    print(m.kwargs)
-    read_reg = ReadRegionFromPathologySlide(
-        file_path=s_path, location=(5000, 5000), size=(800, 800), level=0,
-        msg=MockMessage
+    f, info = SlideInfoWorker().get_response(s_path)
+    print(info)
+    f, img = OpenSlideWorker(s_path).get_response(
+        ((5000, 5000), 0, (800, 800))
     )
-    read_reg.start()
-    while True:
-        f, m = read_reg.get_message()
-        if f:
-            break
-    m.kwargs["image"].show()
+    img.show()
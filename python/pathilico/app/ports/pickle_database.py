@@ -158,22 +158,19 @@ class PickleDatabaseWorker(object):
             return False, "Undefined {}".format(request[0])
 
 
-PICKLE_DATABASE_WORKER = list()
+# Single thread keeps writes to a file in order
+PICKLE_DATABASE_POOL_NAME = "pickle_database"
 
 
-class SaveOrLoadFromPickleDatabase(effect.CommandWithThreadWorkerBase):
+class SaveOrLoadFromPickleDatabase(effect.PooledCommandBase):
+    pool_name = PICKLE_DATABASE_POOL_NAME
+
     def __init__(
             self, file_path, table_name, msg,
             table_header=None, table_type=None,
             add_ids=tuple(), add_records=tuple(), delete_ids=tuple(),
             msg_kwargs=None, logger=None, op_type="save"):
         self.logger = logger or getLogger("pfapp.PickleDatabase")
-        if len(PICKLE_DATABASE_WORKER) == 0:
-            worker = PickleDatabaseWorker()
-            thread = effect.BidirectionalStreamingThread(
-                worker=worker, auto_start=True, daemon=True
-            )
-            PICKLE_DATABASE_WORKER.append(thread)
         msg_kwargs = msg_kwargs or dict()
         if op_type == "save":
             request = (
@@ -189,15 +186,11 @@ class SaveOrLoadFromPickleDatabase(effect.CommandWithThreadWorkerBase):
             )
         self.request = request
 
-    def is_done(self):
-        return False
-
-    def done(self):
-        pass
+    def get_worker_factory(self):
+        return PickleDatabaseWorker
 
-    def start(self):
-        thread = PICKLE_DATABASE_WORKER[0]
-        thread.add_request(self.request)
+    def get_request(self):
+        return self.request
 
     def _construct_msg_from_save_response(self, res):
         is_succ, error_msg, msg, msg_kwargs = res[1:]
@@ -214,18 +207,15 @@ class SaveOrLoadFromPickleDatabase(effect.CommandWithThreadWorkerBase):
         )
         return message
 
-    def get_message(self):
-        if len(PICKLE_DATABASE_WORKER) == 1:
-            thread = PICKLE_DATABASE_WORKER[0]
-            flag, res = thread.get_response()
-            if flag:
-                self.logger.debug("Got res from PickleDB worker {}".format(res))
-                if res[0] == "save":
-                    message = self._construct_msg_from_save_response(res)
-                    return True, message
-                elif res[0] == "load":
-                    message = self._construct_msg_from_load_response(res)
-                    return True, message
+    def get_message_from_response(self, is_succeeded, res):
+        if is_succeeded:
+            self.logger.debug("Got res from PickleDB worker {}".format(res))
+            if res[0] == "save":
+                message = self._construct_msg_from_save_response(res)
+                return True, message
+            elif res[0] == "load":
+                message = self._construct_msg_from_load_response(res)
+                return True, message
         return False, None
 
 
@@ -0,0 +1,91 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Coalescing of adjacent tile reads into one read_region
+
+Tiles of the same level and size which form a rectangle are read at once,
+so overlapping JPEG tiles of the slide are decoded only once, and the
+result is split into the tiles on the worker.
+"""
+
+
+BLOCK_MAX_SIZE = (2048, 2048)  # Pixels of a coalesced read_region
+
+
+def get_grid_position(location, level, size, level_downsamples):
+    """Return (group key, column, row) of a read_region query
+
+    Tiles of the same group key are on the same grid, adjacent tiles
+    differ by one in column or row.
+    """
+    scale = level_downsamples[level] if level < len(level_downsamples) \
+        else 1
+    step_x, step_y = int(size[0] * scale), int(size[1] * scale)
+    x, y = int(location[0]), int(location[1])
+    key = (level, tuple(size), x % step_x, y % step_y)
+    return key, x // step_x, y // step_y
+
+
+def coalesce_regions(regions, level_downsamples, max_size=BLOCK_MAX_SIZE):
+    """Group read_region queries into rectangular blocks of tiles
+
+    :param Iter[location, level, size] regions:
+    :param level_downsamples:
+    :param (int, int) max_size: upper limit of width and height of a block
+    :return: list of (location, level, size, tiles), tiles are tuple of
+        (index of regions, (x, y) offset in the block) in row-major order
+    """
+    groups = dict()  # key: {(column, row): index}
+    blocks = list()
+    for i, (location, level, size) in enumerate(regions):
+        key, col, row = get_grid_position(
+            location, level, size, level_downsamples
+        )
+        cells = groups.setdefault(key, dict())
+        if (col, row) in cells:
+            # Same region is read again on its own
+            blocks.append((location, level, size, ((i, (0, 0)), )))
+        else:
+            cells[(col, row)] = i
+    for (level, size, _, _), cells in groups.items():
+        max_cols = max(1, max_size[0] // size[0])
+        max_rows = max(1, max_size[1] // size[1])
+        for col, row in sorted(cells.keys(), key=lambda c: (c[1], c[0])):
+            if (col, row) not in cells:
+                continue  # Already in a block
+            w = 1
+            while w < max_cols and (col + w, row) in cells:
+                w += 1
+            h = 1
+            while h < max_rows and all(
+                    [(col + c, row + h) in cells for c in range(w)]):
+                h += 1
+            tiles = tuple([
+                (cells.pop((col + c, row + r)), (c * size[0], r * size[1]))
+                for r in range(h) for c in range(w)
+            ])
+            location = regions[tiles[0][0]][0]
+            blocks.append(
+                (location, level, (w * size[0], h * size[1]), tiles)
+            )
+    blocks.sort(key=lambda b: b[3][0][0])  # Keep the order of regions
+    return blocks
+
+
+def split_block_image(image, offsets, tile_size):
+    """Crop tile images of offsets from the image of a block"""
+    t_w, t_h = tile_size
+    return tuple([
+        image.crop((x, y, x + t_w, y + t_h)) for x, y in offsets
+    ])
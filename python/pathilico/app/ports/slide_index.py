@@ -0,0 +1,102 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Persistent index of slide metadata on SQLite
+
+Slides are keyed by the path, size and modified time of the file, so
+opening a known slide does not touch the slide with OpenSlide again.
+"""
+import os
+import json
+import time
+import sqlite3
+from logging import getLogger
+
+
+SLIDE_INDEX_FILE_NAME = "pathilico_slides.sqlite3"  # In the cache directory
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS slides (
+    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+    info TEXT, accessed_at REAL
+)
+"""
+
+
+def get_file_stamp(file_path):
+    """(size, mtime_ns) of the file, contents are not read"""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SlideIndex(object):
+
+    def __init__(self, file_path, logger=None):
+        """Connection to the index file, made for each worker
+
+        The directory of the file is made here, so nothing is written
+        unless the index is enabled.
+
+        :param str file_path:
+        """
+        self.logger = logger or getLogger("pfapp.Pathology")
+        dir_path = os.path.dirname(file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        self.connection = sqlite3.connect(
+            file_path, timeout=5.0, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(CREATE_TABLE_SQL)
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, path, stamp):
+        """Indexed info of the slide or None if the file is changed
+
+        :param tuple stamp: (size, mtime_ns) by `get_file_stamp`
+        :rtype: dict|None
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, info FROM slides WHERE path=?", (path, )
+        ).fetchone()
+        if row is None or tuple(row[:2]) != tuple(stamp):
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE slides SET accessed_at=? WHERE path=?",
+                (time.time(), path)
+            )
+        return decode_info(row[2])
+
+    def put(self, path, stamp, info):
+        """Store the info, the old one of the path is replaced"""
+        size, mtime_ns = stamp
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO slides VALUES (?,?,?,?,?)",
+                (path, size, mtime_ns, json.dumps(info), time.time())
+            )
+
+
+def decode_info(text):
+    """Tuples of OpenSlide's attributes are restored from JSON lists"""
+    info = json.loads(text)
+    for k in ("level_dimensions", "level_downsamples"):
+        if k in info:
+            info[k] = tuple([
+                tuple(v) if isinstance(v, list) else v for v in info[k]
+            ])
+    return info
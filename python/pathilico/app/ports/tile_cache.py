@@ -0,0 +1,190 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Persistent cache of decoded pathology tiles on SQLite
+
+Tiles are keyed by the fingerprint of the slide file and
+(level, x, y) of OpenSlide's read_region, and evicted by LRU order
+when the total size of cached tiles exceeds the limit.
+The total size is kept in the meta table, so writes do not scan tiles.
+"""
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+from logging import getLogger
+
+from PIL import Image
+
+
+TILE_CACHE_FILE_NAME = "pathilico_tiles.sqlite3"  # In the cache directory
+TILE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+EVICTION_BATCH_SIZE = 16
+# Access times of hit tiles are written together, or with the next put
+ACCESS_BATCH_SIZE = 64
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS tiles (
+    fingerprint TEXT, level INTEGER, x INTEGER, y INTEGER,
+    width INTEGER, height INTEGER, mode TEXT, data BLOB,
+    num_bytes INTEGER, accessed_at REAL,
+    PRIMARY KEY (fingerprint, level, x, y)
+)
+"""
+CREATE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS tiles_accessed_at ON tiles (accessed_at)
+"""
+CREATE_META_SQL = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)
+"""
+# Caches made before the meta table are summed once
+INIT_TOTAL_BYTES_SQL = """
+INSERT OR IGNORE INTO meta
+SELECT 'total_bytes', COALESCE(SUM(num_bytes), 0) FROM tiles
+"""
+
+
+def get_slide_fingerprint(file_path):
+    """Identify the slide by its name, size and modified time
+
+    Contents are not read, since slides may be on network storage.
+    """
+    stat = os.stat(file_path)
+    key = "{}:{}:{}".format(
+        os.path.basename(file_path), stat.st_size, stat.st_mtime_ns
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class TileCache(object):
+
+    def __init__(
+            self, file_path, max_bytes=TILE_CACHE_MAX_BYTES, logger=None):
+        """Connection to the cache file, made for each worker
+
+        The connection may be made on other thread than the worker's one,
+        but it is used by one thread at a time. The directory of the file
+        is made here, so nothing is written unless the cache is enabled.
+
+        :param str file_path:
+        :param int max_bytes: limit of the total size of compressed tiles
+        """
+        self.logger = logger or getLogger("pfapp.Pathology")
+        self.max_bytes = max_bytes
+        self.accessed = dict()  # (fingerprint, level, x, y): time
+        dir_path = os.path.dirname(file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        # Writers take the lock first, then read the total in transaction
+        self.connection = sqlite3.connect(
+            file_path, timeout=5.0, check_same_thread=False,
+            isolation_level="IMMEDIATE"
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(CREATE_TABLE_SQL)
+            self.connection.execute(CREATE_INDEX_SQL)
+            self.connection.execute(CREATE_META_SQL)
+            self.connection.execute(INIT_TOTAL_BYTES_SQL)
+
+    def close(self):
+        if self.accessed:
+            with self.connection:
+                self.flush_accessed()
+        self.connection.close()
+
+    def get(self, fingerprint, level, location, size):
+        """Cached tile image or None
+
+        :rtype: PIL.Image.Image|None
+        """
+        x, y = location
+        row = self.connection.execute(
+            "SELECT width, height, mode, data FROM tiles "
+            "WHERE fingerprint=? AND level=? AND x=? AND y=?",
+            (fingerprint, level, x, y)
+        ).fetchone()
+        if row is None:
+            return None
+        width, height, mode, data = row
+        if (width, height) != tuple(size):
+            return None
+        self.accessed[(fingerprint, level, x, y)] = time.time()
+        if len(self.accessed) >= ACCESS_BATCH_SIZE:
+            with self.connection:
+                self.flush_accessed()
+        return Image.frombytes(mode, (width, height), zlib.decompress(data))
+
+    def flush_accessed(self):
+        """Write access times of hit tiles, called in a transaction"""
+        self.connection.executemany(
+            "UPDATE tiles SET accessed_at=? "
+            "WHERE fingerprint=? AND level=? AND x=? AND y=?",
+            [(t, *k) for k, t in self.accessed.items()]
+        )
+        self.accessed.clear()
+
+    def put(self, fingerprint, level, location, image):
+        """Store the tile, then evict least recently used ones over limit"""
+        x, y = location
+        # Fast level, tiles of slides have large blank area
+        data = zlib.compress(image.tobytes(), 1)
+        with self.connection:
+            # Size of the replaced tile is found by the primary key
+            self.connection.execute(
+                "UPDATE meta SET value = value + ? - COALESCE(("
+                "SELECT num_bytes FROM tiles "
+                "WHERE fingerprint=? AND level=? AND x=? AND y=?), 0) "
+                "WHERE key='total_bytes'",
+                (len(data), fingerprint, level, x, y)
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (
+                    fingerprint, level, x, y, image.size[0], image.size[1],
+                    image.mode, data, len(data), time.time()
+                )
+            )
+            self.flush_accessed()
+            self.evict()
+
+    def get_total_bytes(self):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key='total_bytes'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def evict(self):
+        """Delete least recently used tiles, called in a transaction"""
+        total = self.get_total_bytes()
+        while total > self.max_bytes:
+            rows = self.connection.execute(
+                "SELECT rowid, num_bytes FROM tiles "
+                "ORDER BY accessed_at LIMIT ?", (EVICTION_BATCH_SIZE, )
+            ).fetchall()
+            if not rows:  # Resync the total which went out of tiles
+                total = 0
+            row_ids = list()
+            for row_id, num_bytes in rows:
+                if total <= self.max_bytes:
+                    break
+                row_ids.append((row_id, ))
+                total -= num_bytes
+            self.connection.executemany(
+                "DELETE FROM tiles WHERE rowid=?", row_ids
+            )
+            self.connection.execute(
+                "UPDATE meta SET value=? WHERE key='total_bytes'", (total, )
+            )
+            self.logger.debug("Evict {} tiles from cache".format(len(row_ids)))
@@ -17,10 +17,18 @@
 from pathilico.app.header import Api
 
 
+PAN_SMOOTHING = 0.5  # Weight of the latest move in the pan velocity
+
+
 # Essence APIs
 class PositionModel(object):
     def __init__(self):
         self.x, self.y, self.level = 0, 0, 0
+        self.pan_dx, self.pan_dy = 0., 0.  # Smoothed move per message
+        self.zoom_direction = 0  # Level delta of the last rescale
+        self.focus_x, self.focus_y = None, None  # Window point of rescale
+        self.prefetch_margin = 256  # Ring around the window to read ahead
+        self.prefetch_lookahead = 8  # Messages of the pan to read ahead
 
 
 def move(position_model, dx=0, dy=0):
@@ -33,6 +41,17 @@ def move(position_model, dx=0, dy=0):
     """
     position_model.x -= dx
     position_model.y -= dy
+    a = PAN_SMOOTHING
+    position_model.pan_dx = (1 - a) * position_model.pan_dx - a * dx
+    position_model.pan_dy = (1 - a) * position_model.pan_dy - a * dy
+    position_model.focus_x, position_model.focus_y = None, None
+    return position_model
+
+
+def set_zoom_focus(position_model, point_x, point_y, level_delta):
+    position_model.zoom_direction = level_delta
+    position_model.focus_x, position_model.focus_y = point_x, point_y
+    position_model.pan_dx, position_model.pan_dy = 0., 0.
     return position_model
 
 
@@ -63,6 +82,7 @@ def enlarge(position_model, point_x, point_y, level_downsamples):
     position_model.x = new_x
     position_model.y = new_y
     position_model.level -= 1
+    position_model = set_zoom_focus(position_model, point_x, point_y, -1)
     return position_model
 
 
@@ -84,9 +104,49 @@ def shrink(position_model, point_x, point_y, level_downsamples):
     position_model.x = new_x
     position_model.y = new_y
     position_model.level += 1
+    position_model = set_zoom_focus(position_model, point_x, point_y, 1)
     return position_model
 
 
+def get_prefetch_bounds_around(
+        position_model, window_width, window_height, level_downsamples):
+    """Bounds likely to be shown next, the most likely first
+
+    1. The window moved ahead by recent pan velocity
+    2. The window with `prefetch_margin`
+    3. The window after rescaling at the focus, to the last zoom direction
+    4. The same but to the opposite direction
+
+    :param PositionModel position_model:
+    :param int window_width:
+    :param int window_height:
+    :param level_downsamples:
+    :return List[tuple]: (left, bottom, right, top, level)
+    """
+    p = position_model
+    w, h = window_width, window_height
+    lead_x = int(p.x + p.pan_dx * p.prefetch_lookahead)
+    lead_y = int(p.y + p.pan_dy * p.prefetch_lookahead)
+    m = p.prefetch_margin
+    bounds = [
+        (lead_x, lead_y, lead_x + w, lead_y + h, p.level),
+        (p.x - m, p.y - m, p.x + w + m, p.y + h + m, p.level)
+    ]
+    focus_x = w // 2 if p.focus_x is None else p.focus_x
+    focus_y = h // 2 if p.focus_y is None else p.focus_y
+    level_deltas = (1, -1) if p.zoom_direction > 0 else (-1, 1)
+    for d in level_deltas:
+        level = p.level + d
+        if not 0 <= level < len(level_downsamples):
+            continue
+        x, y = rescale(
+            p.x, p.y, focus_x, focus_y, level_downsamples[p.level],
+            level_downsamples[level]
+        )
+        bounds.append((x, y, x + w, y + h, level))
+    return bounds
+
+
 # Actual implementations for Api
 def _move(model, dx=0, dy=0):
     model.position = move(model.position, dx=dx, dy=dy)
@@ -143,6 +203,16 @@ def get_bound_for_window(model):
     return b
 
 
+def get_prefetch_bounds(model):
+    win_w, win_h = Api.get_window_width_and_height(model)
+    level_downsamples = Api.get_level_downsamples(model)
+    num_levels = Api.get_num_levels(model)
+    bounds = get_prefetch_bounds_around(
+        model.position, win_w, win_h, level_downsamples[:num_levels]
+    )
+    return bounds
+
+
 def get_level0_coordinates(model, window_x, window_y):
     gl_x = model.position.x + window_x
     gl_y = model.position.y + window_y
@@ -179,5 +249,6 @@ Api.register(is_shrinkable)
 Api.register_as(_enlarge, "enlarge")
 Api.register_as(_shrink, "shrink")
 Api.register(get_bound_for_window)
+Api.register(get_prefetch_bounds)
 Api.register(get_level0_coordinates)
 Api.register(get_window_coordinates)
@@ -23,6 +23,9 @@ class ResourceModel(object):
         self.images = LruDict(self.num_max_images)
         self.requesting = set()
         self.queries = dict()
+        self.max_queue_depth = 64
+        self.max_prefetch_images = 32
+        self.queue_depths = dict()  # data_type: images in worker's queue
 
 
 def add_reservation(resource_model, object_id, query, update=True):
@@ -103,11 +106,64 @@ def delete(resource_model, object_id):
     return resource_model
 
 
-def request_queries(resource_model, object_ids):
+def delete_except(resource_model, is_kept):
+    """Delete queries and images of ids which are not kept
+
+    :param ResourceModel resource_model:
+    :param is_kept: is_kept(object_id) returns bool
+    :return ResourceModel:
+    """
+    # Images are added only for reserved queries
+    stale_ids = [i for i in resource_model.queries if not is_kept(i)]
+    for object_id in stale_ids:
+        resource_model = delete(resource_model, object_id)
+    return resource_model
+
+
+def cancel_requests(resource_model, object_ids):
+    """Forget requesting state, the images will be requested again
+
+    :param ResourceModel resource_model:
+    :param object_ids:
+    :return ResourceModel:
+    """
+    resource_model.requesting = resource_model.requesting - set(object_ids)
+    return resource_model
+
+
+def update_queue_depth(resource_model, data_type, depth):
+    resource_model.queue_depths[data_type] = depth
+    return resource_model
+
+
+def get_request_capacity(resource_model, data_type):
+    """Number of requests which can be issued without exceeding the limit
+
+    :param ResourceModel resource_model:
+    :param str data_type:
+    :return int:
+    """
+    depth = resource_model.queue_depths.get(data_type, 0)
+    return max(0, resource_model.max_queue_depth - depth)
+
+
+def get_prefetch_capacity(resource_model, num_shown):
+    """Number of images to read ahead without evicting shown images
+
+    :param ResourceModel resource_model:
+    :param int num_shown: number of images on the window
+    :return int:
+    """
+    room = resource_model.num_max_images - num_shown
+    return max(0, min(resource_model.max_prefetch_images, room))
+
+
+def request_queries(resource_model, object_ids, limit=None):
     """Collect queries corresponding to given object_ids
 
     :param ResourceModel resource_model:
     :param object_ids:
+    :param int limit: max number of queries if given
     :return ResourceModel, List[int|byte], queries:
     """
     object_ids = [
@@ -118,6 +174,8 @@ def request_queries(resource_model, object_ids):
                 and i not in resource_model.images
         )
     ]
+    if limit is not None:
+        object_ids = object_ids[:limit]
     queries = [resource_model.queries[i] for i in object_ids]
     resource_model.requesting = resource_model.requesting | set(object_ids)
     return resource_model, object_ids, queries
@@ -134,18 +192,55 @@ def _add_image(model, object_id, query, image):
     return model
 
 
-def collect_queries_for_request(model, object_ids):
+def collect_queries_for_request(model, object_ids, data_type=None):
+    if data_type is None:
+        model.resource, object_ids, queries = request_queries(
+            model.resource, object_ids
+        )
+        return model, object_ids, queries
+    capacity = get_request_capacity(model.resource, data_type)
     model.resource, object_ids, queries = request_queries(
-        model.resource, object_ids
+        model.resource, object_ids, limit=capacity
     )
+    # Counted until the worker reports its queue depth
+    depth = model.resource.queue_depths.get(data_type, 0) + len(object_ids)
+    model.resource = update_queue_depth(model.resource, data_type, depth)
     return model, object_ids, queries
 
 
+def get_prefetch_budget(model, num_shown):
+    return get_prefetch_capacity(model.resource, num_shown)
+
+
+def update_image_queue(model, data_type, depth, dropped_ids):
+    # Depths are not shown, the version of resource is kept for views
+    update_queue_depth(model.resource, data_type, depth)
+    if dropped_ids:
+        model.resource = cancel_requests(model.resource, dropped_ids)
+    return model
+
+
+def get_queue_capacity(model, data_type):
+    return get_request_capacity(model.resource, data_type)
+
+
+def cancel_requests_except(model, object_ids):
+    stale_ids = model.resource.requesting - set(object_ids)
+    if stale_ids:
+        model.resource = cancel_requests(model.resource, stale_ids)
+    return model, stale_ids
+
+
 def delete_image(model, object_id):
     model.resource = delete(model.resource, object_id)
     return model
 
 
+def delete_images_except(model, is_kept):
+    model.resource = delete_except(model.resource, is_kept)
+    return model
+
+
 def get_images(model, object_ids):
     obj_ids, imgs = get_stored_images(model.resource, object_ids)
     return obj_ids, imgs
@@ -155,7 +250,12 @@ Api.register(ResourceModel)
 Api.register(reserve_image_query)
 Api.register_as(_add_image, "add_image")
 Api.register(collect_queries_for_request)
+Api.register(cancel_requests_except)
+Api.register(update_image_queue)
+Api.register(get_queue_capacity)
+Api.register(get_prefetch_budget)
 Api.register(delete_image)
+Api.register(delete_images_except)
 Api.register(get_images)
 
 
@@ -15,9 +15,13 @@
 from pathilico.pygletelm.effect import Subscriptions, notify_every
 from pathilico.app.message import Msg
 from pathilico.app.header import Api
+import pathilico.app.port as port
 
 
 def subscriptions(model):
+    image_queues = port.watch_image_queues(Msg.ImageQueueChanged)
     if Api.is_app_mode(model, "annotation") and Api.is_autosave_enabled(model):
-        return Subscriptions(notify_every(Msg.ExecSaveToDatabase, sec=5))
-    return Subscriptions()
+        return Subscriptions(
+            image_queues, notify_every(Msg.ExecSaveToDatabase, sec=5)
+        )
+    return Subscriptions(image_queues)
@@ -20,15 +20,18 @@ import pathilico.app.updates.update_annotation as update_annotation
 import pathilico.app.updates.update_database as update_database
 
 
+# Message identity: update function, each message is handled by one module
+UPDATE_FUNCTIONS = {
+    **update_database.UPDATE_FUNCTIONS,
+    **update_annotation.UPDATE_FUNCTIONS,
+    **update_ux.UPDATE_FUNCTIONS,
+    **update_data.UPDATE_FUNCTIONS,
+    **update_position.UPDATE_FUNCTIONS
+}
+
+
 def update(msg, model):
-    if msg in update_position.TARGET_MESSAGES:
-        return update_position.update(msg, model)
-    elif msg in update_data.TARGET_MESSAGES:
-        return update_data.update(msg, model)
-    elif msg in update_ux.TARGET_MESSAGES:
-        return update_ux.update(msg, model)
-    elif msg in update_annotation.TARGET_MESSAGES:
-        return update_annotation.update(msg, model)
-    elif msg in update_database.TARGET_MESSAGES:
-        return update_database.update(msg, model)
-    return model, Commands()
+    func = UPDATE_FUNCTIONS.get(getattr(msg, "identity", None), None)
+    if func is None:
+        return model, Commands()
+    return func(msg, model)
@@ -19,18 +19,11 @@ from pathilico.app.updates.update_position \
     import get_grouped_annotation_image_queries
 
 
-TARGET_MESSAGES = (
-    Msg.AddPoint, Msg.DeleteDragEndAt, Msg.DrawLineDragEndAt,
-    Msg.ExecGroupAnnotation
-)
-
-
 def update(msg, model):
-    if msg == Msg.AddPoint:
-        return add_point(msg, model)
-    elif msg == Msg.DeleteDragEndAt:
-        return delete_annotation(msg, model)
-    return model, Commands()
+    func = UPDATE_FUNCTIONS.get(getattr(msg, "identity", None), None)
+    if func is None:
+        return model, Commands()
+    return func(msg, model)
 
 
 def add_point(msg, model):
@@ -58,3 +51,9 @@ def delete_annotation(msg, model):
     model = Api.delete_area_annotations(model, area_ids)
     cmds = get_grouped_annotation_image_queries(model)
     return model, cmds
+
+
+UPDATE_FUNCTIONS = {
+    Msg.AddPoint.identity: add_point,
+    Msg.DeleteDragEndAt.identity: delete_annotation
+}
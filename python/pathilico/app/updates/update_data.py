@@ -15,29 +15,15 @@
 from pathilico.pygletelm.effect import Commands
 from pathilico.app.message import Msg
 from pathilico.app.header import Api
-import pathilico.app.port as async
+import pathilico.app.port as async_
 import pathilico.app.ports.pickle_database as database
 
 
-TARGET_MESSAGES = (
-    Msg.FileSelected,
-    Msg.SlideInfoAcquired,
-    Msg.PathologyRegionAcquired,
-    Msg.GroupedAnnotationImageAcquired
-)
-
-
 def update(msg, model):
-    if msg == Msg.SlideInfoAcquired:
-        return update_pathology_info(msg, model)
-    elif msg == Msg.PathologyRegionAcquired:
-        return update_pathology_tile_image(msg, model)
-    elif msg == Msg.FileSelected:
-        return file_selected(msg, model)
-    elif msg == Msg.GroupedAnnotationImageAcquired:
-        return update_grouped_annotation_image(msg, model)
-    else:
+    func = UPDATE_FUNCTIONS.get(getattr(msg, "identity", None), None)
+    if func is None:
         return model, Commands()
+    return func(msg, model)
 
 
 def get_load_cmds(model):
@@ -57,7 +43,7 @@ def file_selected(msg, model):
     if not msg.path:
         return model, Commands()
     cmds = Commands(
-        async.get_slide_info(msg=Msg.SlideInfoAcquired, file_path=msg.path),
+        async_.get_slide_info(msg=Msg.SlideInfoAcquired, file_path=msg.path),
     )
     return model, cmds
 
@@ -66,12 +52,11 @@ def update_pathology_info(msg, model):
     model = Api.update_pathology(
         model, file_path=msg.file_path, file_name=msg.file_name,
         level_count=msg.level_count, level_dimensions=msg.level_dimensions,
-        level_downsamples=msg.level_downsamples
+        level_downsamples=msg.level_downsamples, mtime=msg.mtime
     )
     bound = Api.get_bound_for_window(model)
-    pathology_ids2show = Api.get_ids_on_districts(
-        model, bounds=[bound], data_type="pathology"
-    )
+    pathology_ids2show = Api.get_pathology_tile_ids(model, bounds=[bound])
+    model = Api.reserve_pathology_tile_queries(model, pathology_ids2show)
     model, pathology_ids, pathology_queries = Api.collect_queries_for_request(
         model, pathology_ids2show
     )
@@ -82,7 +67,10 @@ def update_pathology_info(msg, model):
             (f_p, q.location, q.level, q.size, m, dict(pathology_id=i, query=q))
             for q, i in zip(pathology_queries, pathology_ids)
         ]
-        cmds = async.generate_openslide_read_region_commands(qs)
+        cmds = async_.generate_openslide_read_region_commands(
+            qs, Api.get_level_downsamples(model),
+            Msg.PathologyRegionsAcquired, mtime=Api.get_file_mtime(model)
+        )
         model = Api.update_app_mode(model, "annotation")
         if Api.is_app_mode(model, "annotation"):
             model, load_cmds = get_load_cmds(model)
@@ -99,8 +87,24 @@ def update_pathology_tile_image(msg, model):
     return model, Commands()
 
 
+def update_pathology_tile_images(msg, model):
+    for m in msg.messages:
+        model, _ = update_pathology_tile_image(m, model)
+    return model, Commands()
+
+
 def update_grouped_annotation_image(msg, model):
     model = Api.add_image(
         model, object_id=msg.ga_id, query=msg.query, image=msg.image
     )
     return model, Commands()
+
+
+UPDATE_FUNCTIONS = {
+    Msg.SlideInfoAcquired.identity: update_pathology_info,
+    Msg.PathologyRegionAcquired.identity: update_pathology_tile_image,
+    Msg.PathologyRegionsAcquired.identity: update_pathology_tile_images,
+    Msg.FileSelected.identity: file_selected,
+    Msg.GroupedAnnotationImageAcquired.identity:
+        update_grouped_annotation_image
+}
@@ -19,22 +19,11 @@ import pathilico.app.ports.pickle_database as database
 from pathilico.app.updates.update_position import get_image_queries
 
 
-TARGET_MESSAGES = (
-    Msg.ExecSaveToDatabase, Msg.ExecLoadFromDatabase,
-    Msg.RecordSaved, Msg.RecordLoaded
-)
-
-
 def update(msg, model):
-    if msg == Msg.ExecSaveToDatabase:
-        return exec_save(msg, model)
-    elif msg == Msg.ExecLoadFromDatabase:
-        return exec_load(msg, model)
-    elif msg == Msg.RecordSaved:
-        return update_saved_record_status(msg, model)
-    elif msg == Msg.RecordLoaded:
-        return load_records(msg, model)
-    return model, NO_COMMANDS
+    func = UPDATE_FUNCTIONS.get(getattr(msg, "identity", None), None)
+    if func is None:
+        return model, NO_COMMANDS
+    return func(msg, model)
 
 
 def exec_save(msg, model):
@@ -102,3 +91,11 @@ def load_records(msg, model):
         return model, NO_COMMANDS
     cmds = get_image_queries(model)
     return model, cmds
+
+
+UPDATE_FUNCTIONS = {
+    Msg.ExecSaveToDatabase.identity: exec_save,
+    Msg.ExecLoadFromDatabase.identity: exec_load,
+    Msg.RecordSaved.identity: update_saved_record_status,
+    Msg.RecordLoaded.identity: load_records
+}
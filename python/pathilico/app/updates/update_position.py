@@ -15,10 +15,7 @@
 from pathilico.pygletelm.effect import Commands, NO_COMMANDS
 from pathilico.app.message import Msg
 from pathilico.app.header import Api
-import pathilico.app.port as async
-
-
-TARGET_MESSAGES = (Msg.Move, Msg.Shrink, Msg.Enlarge, Msg.Rescale)
+import pathilico.app.port as async_
 
 
 # APIs for update
@@ -29,16 +26,10 @@ def update(msg, model):
     :param pathfinder.app.model.Model model:
     :return:
     """
-    if msg == Msg.Move:
-        return move(msg, model)
-    elif msg == Msg.Shrink:
-        return shrink(msg, model)
-    elif msg == Msg.Enlarge:
-        return enlarge(msg, model)
-    elif msg == Msg.Rescale:
-        return rescale(msg, model)
-    else:
+    func = UPDATE_FUNCTIONS.get(getattr(msg, "identity", None), None)
+    if func is None:
         return model, Commands()
+    return func(msg, model)
 
 
 def move(msg, model):
@@ -80,20 +71,69 @@ def enlarge(msg, model):
 
 
 def get_image_queries(model):
+    bound = Api.get_bound_for_window(model)
+    pathology_ids2show = Api.get_pathology_tile_ids(model, bounds=[bound])
+    ga_ids2show = Api.get_grouped_annotation_ids(model, bounds=[bound])
+    prefetch_ids = get_prefetch_ids(model, pathology_ids2show)
     cmds = Commands(
-        get_openslide_queries(model),
-        get_grouped_annotation_image_queries(model)
+        cancel_stale_queries(
+            model, [*pathology_ids2show, *prefetch_ids, *ga_ids2show]
+        ),
+        prioritize_openslide_queries(model, bound),
+        # Shown tiles come first to be kept within the request capacity
+        get_openslide_queries(model, [*pathology_ids2show, *prefetch_ids]),
+        get_grouped_annotation_image_queries(model, ga_ids2show)
     )
     return cmds
 
 
-def get_openslide_queries(model):
-    bound = Api.get_bound_for_window(model)
-    pathology_ids2show = Api.get_ids_on_districts(
-        model, bounds=[bound], data_type="pathology"
+def get_prefetch_ids(model, pathology_ids2show):
+    """Tiles likely to be shown next, within the budget of images
+
+    They are read after shown tiles, since the reader prioritizes tiles
+    of the current level near the center of the window.
+    """
+    budget = Api.get_prefetch_budget(model, len(pathology_ids2show))
+    prefetch_ids = list()
+    seen_ids = set(pathology_ids2show)
+    for b in Api.get_prefetch_bounds(model):
+        ids = Api.get_pathology_tile_ids(model, bounds=[b])
+        for i in ids:
+            if len(prefetch_ids) >= budget:
+                return prefetch_ids
+            if i not in seen_ids:
+                seen_ids.add(i)
+                prefetch_ids.append(i)
+    return prefetch_ids
+
+
+def cancel_stale_queries(model, ids2show):
+    """Cancel requests for images which went out of the window"""
+    model, stale_ids = Api.cancel_requests_except(model, ids2show)
+    if stale_ids:
+        return async_.cancel_image_requests(stale_ids)
+    return Commands()
+
+
+def prioritize_openslide_queries(model, bound):
+    """Reorder waiting tile reads around the center of the window"""
+    left, bottom, right, top, level = bound
+    x, y = Api.get_level0_coordinates(
+        model, (right - left) / 2, (top - bottom) / 2
+    )
+    slide_y = Api.get_level0_pathology_slide_height(model) - y
+    return async_.prioritize_read_regions(
+        level, (x, slide_y), Api.get_level_downsamples(model)
     )
+
+
+def get_openslide_queries(model, pathology_ids2show=None):
+    if pathology_ids2show is None:
+        bound = Api.get_bound_for_window(model)
+        pathology_ids2show = Api.get_pathology_tile_ids(model, bounds=[bound])
+    model = Api.reserve_pathology_tile_queries(model, pathology_ids2show)
     model, pathology_ids, pathology_queries = Api.collect_queries_for_request(
-        model, pathology_ids2show
+        model, pathology_ids2show, data_type="pathology"
     )
     if pathology_queries:
         f_p = Api.get_file_path(model)
@@ -102,19 +142,21 @@ def get_openslide_queries(model):
             (f_p, q.location, q.level, q.size, m, dict(pathology_id=i, query=q))
             for q, i in zip(pathology_queries, pathology_ids)
         ]
-        cmds = async.generate_openslide_read_region_commands(qs)
+        cmds = async_.generate_openslide_read_region_commands(
+            qs, Api.get_level_downsamples(model),
+            Msg.PathologyRegionsAcquired, mtime=Api.get_file_mtime(model)
+        )
     else:
         cmds = Commands()
     return cmds
 
 
-def get_grouped_annotation_image_queries(model):
-    bound = Api.get_bound_for_window(model)
-    ga_ids2show = Api.get_ids_on_districts(
-        model, bounds=[bound], data_type="grouped_annotation"
-    )
+def get_grouped_annotation_image_queries(model, ga_ids2show=None):
+    if ga_ids2show is None:
+        bound = Api.get_bound_for_window(model)
+        ga_ids2show = Api.get_grouped_annotation_ids(model, bounds=[bound])
     model, ga_ids, ga_queries = Api.collect_queries_for_request(
-        model, ga_ids2show
+        model, ga_ids2show, data_type="grouped_annotation"
     )
     if ga_queries:
         m = Msg.GroupedAnnotationImageAcquired
@@ -122,7 +164,33 @@ def get_grouped_annotation_image_queries(model):
             (m, dict(ga_id=i, query=q), *q)
             for q, i in zip(ga_queries, ga_ids)
         ]
-        cmds = async.group_multi_annotation_image(qs)
+        cmds = async_.group_multi_annotation_image(qs)
     else:
         cmds = Commands()
     return cmds
+
+
+def update_image_queue(msg, model):
+    """Issue requests held back while the queue of workers was full
+
+    Requests are held back only when the capacity is used up, so queries
+    are made again only if the capacity grows from 0 or requests are
+    dropped by workers.
+    """
+    was_full = Api.get_queue_capacity(model, msg.data_type) == 0
+    model = Api.update_image_queue(
+        model, msg.data_type, msg.depth, msg.dropped_keys
+    )
+    is_full = Api.get_queue_capacity(model, msg.data_type) == 0
+    if msg.dropped_keys or (was_full and not is_full):
+        return model, get_image_queries(model)
+    return model, NO_COMMANDS
+
+
+UPDATE_FUNCTIONS = {
+    Msg.ImageQueueChanged.identity: update_image_queue,
+    Msg.Move.identity: move,
+    Msg.Shrink.identity: shrink,
+    Msg.Enlarge.identity: enlarge,
+    Msg.Rescale.identity: rescale
+}
@@ -20,39 +20,11 @@ from pathilico.app.updates.update_position import get_image_queries
 from pathilico.app.header import Api
 
 
-TARGET_MESSAGES = (
-    Msg.WindowResized, Msg.DeleteDragStartAt, Msg.DeleteDragAt,
-    Msg.DrawLineDragStartAt, Msg.DrawLineDragAt, Msg.DrawLineDragEndAt,
-    Msg.ChangeMode, Msg.ChangeAnnotationMode, Msg.UpdateViewModel,
-    Msg.AnnotationTypeSelected, Msg.WsiFileListAcquired
-)
-
-
 def update(msg, model):
-    if msg == Msg.WindowResized:
-        return update_window_size(msg, model)
-    elif msg == Msg.DeleteDragStartAt:
-        return start_delete_drag(msg, model)
-    elif msg == Msg.DeleteDragAt:
-        return update_delete_drag(msg, model)
-    elif msg == Msg.DrawLineDragStartAt:
-        return start_line_drawing(msg, model)
-    elif msg == Msg.DrawLineDragAt:
-        return update_line_drawing(msg, model)
-    elif msg == Msg.DrawLineDragEndAt:
-        return finish_line_drawing(msg, model)
-    elif msg == Msg.ChangeMode:
-        return change_mode(msg, model)
-    elif msg == Msg.ChangeAnnotationMode:
-        return change_annotation_mode(msg, model)
-    elif msg == Msg.UpdateViewModel:
-        return update_view_model(msg, model)
-    elif msg == Msg.AnnotationTypeSelected:
-        return update_selected_annotation_type(msg, model)
-    elif msg == Msg.WsiFileListAcquired:
-        return update_wsi_file_list(msg, model)
-    else:
+    func = UPDATE_FUNCTIONS.get(getattr(msg, "identity", None), None)
+    if func is None:
         return model, NO_COMMANDS
+    return func(msg, model)
 
 
 def update_window_size(msg, model):
@@ -126,3 +98,18 @@ def update_wsi_file_list(msg, model):
         model, msg.file_names, msg.file_paths
     )
     return model, NO_COMMANDS
+
+
+UPDATE_FUNCTIONS = {
+    Msg.WindowResized.identity: update_window_size,
+    Msg.DeleteDragStartAt.identity: start_delete_drag,
+    Msg.DeleteDragAt.identity: update_delete_drag,
+    Msg.DrawLineDragStartAt.identity: start_line_drawing,
+    Msg.DrawLineDragAt.identity: update_line_drawing,
+    Msg.DrawLineDragEndAt.identity: finish_line_drawing,
+    Msg.ChangeMode.identity: change_mode,
+    Msg.ChangeAnnotationMode.identity: change_annotation_mode,
+    Msg.UpdateViewModel.identity: update_view_model,
+    Msg.AnnotationTypeSelected.identity: update_selected_annotation_type,
+    Msg.WsiFileListAcquired.identity: update_wsi_file_list
+}
@@ -79,7 +79,9 @@ def is_app_mode(model, app_mode):
 def update_app_mode(model, app_mode):
     app_mode_index = APP_MODES.get(app_mode, -1)
     if app_mode_index is not -1:
-        model.user.app_mode = app_mode_index
+        user_model = model.user
+        user_model.app_mode = app_mode_index
+        model.user = user_model
     return model
 
 
@@ -91,16 +93,20 @@ def is_annotation_mode(model, annotation_mode):
 def update_annotation_mode(model, annotation_mode):
     mode_index = ANNOTATION_MODES.get(annotation_mode, -1)
     if mode_index is not -1:
-        model.user.annotation_util.current_annotation_mode = mode_index
+        user_model = model.user
+        user_model.annotation_util.current_annotation_mode = mode_index
+        model.user = user_model
     return model
 
 
 def update_selected_annotation_category_id(model, category_id):
-    a_util = model.user.annotation_util
+    user_model = model.user
+    a_util = user_model.annotation_util
     if category_id in a_util.annotation_types:
         a_util.selected_annotation_index = a_util.annotation_types.index(
             category_id
         )
+        model.user = user_model
     return model
 
 
@@ -133,8 +139,10 @@ def get_view_model_values(model, keys):
 
 
 def update_view_model_values(model, keys, values):
+    user_model = model.user
     for k, v in zip(keys, values):
-        setattr(model.user.view_model, k, v)
+        setattr(user_model.view_model, k, v)
+    model.user = user_model
     return model
 
 
@@ -35,6 +35,11 @@ def update_window_size(ux_model, width, height):
     return ux_model
 
 
+def add_line_drawing_point(ux_model, x, y):
+    ux_model.draw_line_tmp_points.extend([x, y])
+    return ux_model
+
+
 # Actual implementations for Api
 def get_window_width_and_height(model):
     w = model.ux.window_width
@@ -53,21 +58,27 @@ def get_delete_drag_start_coordinates(model):
 
 
 def start_delete_drag(model, x, y):
-    model.ux.delete_drag_start_at = (x, y)
-    model.ux.is_delete_dragging = True
+    ux_model = model.ux
+    ux_model.delete_drag_start_at = (x, y)
+    ux_model.is_delete_dragging = True
+    model.ux = ux_model
     return model
 
 
 def update_delete_drag(model, x, y):
     if model.ux.is_delete_dragging:
-        model.ux.delete_drag_at = (x, y)
+        ux_model = model.ux
+        ux_model.delete_drag_at = (x, y)
+        model.ux = ux_model
     return model
 
 
 def finish_delete_drag(model):
-    model.ux.delete_drag_start_at = (-1, -1)
-    model.ux.delete_drag_at = (-1, -1)
-    model.ux.is_delete_dragging = False
+    ux_model = model.ux
+    ux_model.delete_drag_start_at = (-1, -1)
+    ux_model.delete_drag_at = (-1, -1)
+    ux_model.is_delete_dragging = False
+    model.ux = ux_model
     return model
 
 
@@ -91,8 +102,10 @@ def get_delete_drag_bound(model):
 
 
 def start_line_drawing(model, x, y):
-    model.ux.draw_line_tmp_points = [x, y]
-    model.ux.is_draw_line_dragging = True
+    ux_model = model.ux
+    ux_model.draw_line_tmp_points = [x, y]
+    ux_model.is_draw_line_dragging = True
+    model.ux = ux_model
     return model
 
 
@@ -100,7 +113,7 @@ def update_line_drawing(model, x, y, dx, dy):
     if model.ux.is_draw_line_dragging is False:
         return model, False, tuple()
     if len(model.ux.draw_line_tmp_points) < 2*3:
-        model.ux.draw_line_tmp_points.extend([x, y])
+        model.ux = add_line_drawing_point(model.ux, x, y)
         return model, False, tuple()
     is_closed, closed_vs = geometry.get_closed_curve_points(
         x, y, dx, dy, model.ux.draw_line_tmp_points, dim_points=1
@@ -109,13 +122,15 @@ def update_line_drawing(model, x, y, dx, dy):
         model = finish_line_drawing(model)
         return model, True, closed_vs
     else:
-        model.ux.draw_line_tmp_points.extend([x, y])
+        model.ux = add_line_drawing_point(model.ux, x, y)
         return model, False, tuple()
 
 
 def finish_line_drawing(model):
-    model.ux.draw_line_tmp_points = list()
-    model.ux.is_draw_line_dragging = False
+    ux_model = model.ux
+    ux_model.draw_line_tmp_points = list()
+    ux_model.is_draw_line_dragging = False
+    model.ux = ux_model
     return model
 
 
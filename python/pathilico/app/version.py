@@ -0,0 +1,61 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""This module provides version counters of submodels
+
+`Model` bumps the counter of a submodel whenever the submodel is assigned,
+so the Api functions which follow `model.xxx = func(model.xxx, ...)` are
+tracked automatically.
+"""
+import functools
+
+from pathilico.app.header import Api
+
+
+# Private
+def get_version(model, submodel_name):
+    return model.versions.get(submodel_name, 0)
+
+
+def memoize_by_versions(*submodel_names):
+    """Used as decorator, reuse the last result while submodels are unchanged
+
+    The decorated function must take only `model` and must not read
+    anything other than the given submodels.
+
+    :param str submodel_names:
+    """
+    def decorator(func):
+        last = [None, None]  # key, result
+
+        @functools.wraps(func)
+        def wrapper(model):
+            if getattr(model, "versions", None) is None:
+                return func(model)
+            key = (id(model), Api.get_submodel_versions(model, submodel_names))
+            if last[0] == key:
+                return last[1]
+            result = func(model)
+            last[0], last[1] = key, result
+            return result
+        return wrapper
+    return decorator
+
+
+# Actual implementations for Api
+def get_submodel_versions(model, submodel_names):
+    return tuple([get_version(model, n) for n in submodel_names])
+
+
+Api.register(get_submodel_versions)
@@ -13,11 +13,14 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 from pathilico.app.header import Api
+from pathilico.app.model import SUBMODEL_NAMES
+from pathilico.app.version import memoize_by_versions
 from pathilico.app.views.welcome_screen import welcome_screen
 from pathilico.app.views.pathlogy_view import pathology_view
 from pathilico.app.views.file_select_view import file_select_view
 
 
+@memoize_by_versions(*SUBMODEL_NAMES)
 def view(model):
     if Api.is_app_mode(model, "annotation"):
         return pathology_view(model)
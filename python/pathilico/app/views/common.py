@@ -78,6 +78,7 @@ class Images(object):
 
 class AppLayers(window_api.LayerList):
     Bottom = window_api.Layer()
+    PathologyPlaceholder = window_api.Layer()
     PathologyImage = window_api.Layer()
     AnnotationPoint = window_api.Layer()
     AnnotationPolygon = window_api.Layer()
@@ -18,6 +18,7 @@ from pathilico.app.views.common import AppLayers
 from pathilico.app.views.navigation import navigation_view
 from pathilico.app.views.annotation_view import annotation_view
 from pathilico.app.header import Api
+from pathilico.app.version import memoize_by_versions
 
 
 def pathology_view(model):
@@ -30,11 +31,15 @@ def pathology_view(model):
     return window_api.View(*vs)
 
 
+@memoize_by_versions("position", "pathology", "zone", "resource", "ux")
 def pathology_images(model):
     imgs = list()
-    for x, y, img in Api.get_pathology_tile_images_for_display(model):
+    for x, y, img, scale in Api.get_pathology_tile_images_for_display(model):
+        # Upscaled tiles of coarser levels are covered by arriving tiles
+        layer = AppLayers.PathologyImage if scale == 1 \
+            else AppLayers.PathologyPlaceholder
         i = window_api.simple_image(
-            x=x, y=y, image=img, layer=AppLayers.PathologyImage
+            x=x, y=y, image=img, scale=scale, layer=layer
         )
         imgs.append(i)
     return window_api.View(*imgs)
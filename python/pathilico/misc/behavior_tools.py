@@ -16,7 +16,7 @@ from logging import getLogger, StreamHandler, DEBUG, INFO, Formatter
 
 import functools
 import pathilico.pygletelm.effect as effect
-from pathilico.pygletelm.backend import program
+from pathilico.pygletelm.backend import program, read_message_log
 
 from pathilico.app.model import init_model
 from pathilico.app.update import update
@@ -62,8 +62,9 @@ STR2SUB = {
 
 class ScheduledBehavior(object):
 
-    def __init__(self, subs=None):
+    def __init__(self, subs=None, schedules=tuple()):
         self.subscriptions = subs or effect.Subscriptions()
+        self.schedules = list(schedules)
 
     def add_schedules(self, *subs):
         self.subscriptions = effect.Subscriptions(self.subscriptions, *subs)
@@ -80,7 +81,63 @@ class ScheduledBehavior(object):
             s = func(msg, msg_kwargs, *spec[1:])
             subs.append(s)
         subs = effect.Subscriptions(*subs)
-        return cls(subs)
+        return cls(subs, schedules)
+
+    @classmethod
+    def from_message_log(cls, log_path, skip_messages=tuple()):
+        """Make the instance from the log of `MessageRecorder`
+
+        Result messages of effects are scheduled as recorded, with blank
+        images of the recorded size in place of tile and annotation images.
+        Pass them (e.g. `Msg.PathologyRegionsAcquired`) as `skip_messages`
+        when the effects are executed again.
+        """
+        schedules = list()
+        for elapsed, msg in read_message_log(log_path, blank_images=True):
+            if msg in skip_messages:
+                continue
+            msg_kwargs = {k: getattr(msg, k) for k in msg.__slots__}
+            schedules.append((("once", elapsed), msg.__class__, msg_kwargs))
+        return cls.from_schedules(schedules)
+
+    def get_timeline(self):
+        """List of (sec, msg, msg_kwargs) sorted by time
+
+        Endless `every` schedules (until == 0) are not included.
+        """
+        timeline = list()
+        for spec, msg, msg_kwargs in self.schedules:
+            msg_kwargs = msg_kwargs or dict()
+            if spec[0] == "once":
+                sec = spec[1] if len(spec) > 1 else 1
+                timeline.append((sec, msg, msg_kwargs))
+            elif spec[0] == "every":
+                params = tuple(spec[1:4])  # sec, wait, until
+                sec, wait, until = params + (1, 0, 0)[len(params):]
+                if until <= 0 or sec <= 0:
+                    continue
+                t = wait
+                while t <= until:
+                    timeline.append((t, msg, msg_kwargs))
+                    t += sec
+        timeline.sort(key=lambda x: x[0])
+        return timeline
+
+    def replay(self, init, update, view=None):
+        """Feed scheduled messages to `update` and `view` at full speed
+
+        No window is used and returned commands are not executed. Results
+        of the effects are fed from the schedules instead, e.g. the tile
+        images recorded by `from_message_log`.
+
+        :return: the model after the last message
+        """
+        model, _ = init()
+        for _, msg, msg_kwargs in self.get_timeline():
+            model, _ = update(msg(**msg_kwargs), model)
+            if view is not None:
+                view(model)
+        return model
 
 
 def wrap_subscriptions_with_message_dispatcher(behaviors):
@@ -16,11 +16,21 @@ from logging \
     import getLogger, StreamHandler, DEBUG, INFO, ERROR, NullHandler, Formatter
 import datetime
 import platform
+import atexit
+import pickle
+import gzip
+import time
+import queue
+import threading
 
 import pyglet
+from PIL import Image
 
 import pathilico.pygletelm.effect as effect
 import pathilico.pygletelm.window as window
+from pathilico.pygletelm.metrics import MessageLatencyStats
+from pathilico.pygletelm.message \
+    import serialize_message, deserialize_message, MessageBase
 
 
 def configure_log_settings(
@@ -108,6 +118,8 @@ class StateProxy(object):
         self.view_handlers = FunctionRegistry()
         self.cmd_handlers = FunctionRegistry()
         self.sub_handlers = FunctionRegistry()
+        self.msg_handlers = FunctionRegistry()
+        self.latency_stats = None  # MessageLatencyStats
 
     @property
     def model(self):
@@ -144,11 +156,175 @@ class StateProxy(object):
         self.logger.debug(
             "StateProxy's push_message is called with {}".format(message)
         )
+        for f in self.msg_handlers:
+            f(message)
+        if self.latency_stats is not None:
+            self.push_message_with_timing(message)
+            return
         new_model, new_cmds = self.state.update(message, self.model)
         self.model = new_model
         for f in self.cmd_handlers:
             f(new_cmds)
 
+    def push_message_with_timing(self, message):
+        """Same as push_message but records latency of each phase
+
+        Note that `handlers` includes messages pushed by instant commands.
+        """
+        t0 = time.perf_counter()
+        new_model, new_cmds = self.state.update(message, self.model)
+        t1 = time.perf_counter()
+        self.state.model = new_model
+        views = self.state.view(new_model)
+        t2 = time.perf_counter()
+        for f in self.view_handlers:
+            f(views)
+        self.exec_subs(new_model)
+        for f in self.cmd_handlers:
+            f(new_cmds)
+        t3 = time.perf_counter()
+        self.latency_stats.record(
+            message, update=t1-t0, view=t2-t1, handlers=t3-t2
+        )
+
+
+class MessageRecorder(object):
+
+    def __init__(
+            self, file_path, skip_messages=tuple(), record_images=False,
+            logger=None):
+        """Record every pushed message with its elapsed time
+
+        The log is a gzip compressed stream of pickled
+        (elapsed_sec, message_name, values) tuples, see `encode_values`.
+        Messages are pickled and written on a writer thread.
+
+        :param str file_path:
+        :param skip_messages: message classes which are not recorded
+        :param bool record_images: images in messages, e.g. results of
+            reading tiles, are recorded as `ImageStandIn` unless True
+        """
+        self.logger = logger or getLogger("pfcore.Backend")
+        self.file_path = file_path
+        self.skip_messages = skip_messages
+        self.record_images = record_images
+        self.file = gzip.open(file_path, "wb", compresslevel=1)
+        self.start_time = time.time()
+        self.records = queue.Queue()
+        self.writer = threading.Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def record(self, message):
+        """This func is passed to proxy.msg_handlers.register"""
+        if self.file is None or message in self.skip_messages:
+            return
+        elapsed = time.time() - self.start_time
+        name, values = serialize_message(message)
+        if name is not None:
+            values = encode_values(values, self.record_images)
+        self.records.put((elapsed, name, values))
+
+    def write_records(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                break
+            try:
+                data = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                self.logger.warning(
+                    "Failed to record {}, {}".format(record[1], e)
+                )
+                continue
+            self.file.write(data)
+
+    def close(self):
+        if self.file is not None:
+            self.records.put(None)
+            self.writer.join()
+            self.file.close()
+            self.file = None
+
+
+class RecordedMessage(object):
+    __slots__ = ("name", "values")
+
+    def __init__(self, name, values):
+        """Message held by a recorded message, e.g. by a batch message"""
+        self.name, self.values = name, values
+
+
+class ImageStandIn(object):
+    __slots__ = ("mode", "size")
+
+    def __init__(self, mode, size):
+        """Recorded in place of a PIL image, only its mode and size"""
+        self.mode, self.size = mode, tuple(size)
+
+    @classmethod
+    def of(cls, image):
+        return cls(image.mode, image.size)
+
+    def to_image(self):
+        """Blank image which costs the same to show as the original"""
+        return Image.new(self.mode, self.size)
+
+
+def encode_values(values, record_images=False):
+    """Make values of a message picklable for `MessageRecorder`
+
+    Messages in values are replaced by `RecordedMessage`, and images by
+    `ImageStandIn` unless record_images. Only the first item of lists is
+    checked, so long lists of numbers are not scanned.
+    """
+    result = list()
+    for v in values:
+        if isinstance(v, (list, tuple)) and v \
+                and isinstance(v[0], (MessageBase, Image.Image)):
+            v = type(v)(encode_values(v, record_images))
+        elif isinstance(v, MessageBase):
+            name, msg_values = serialize_message(v)
+            v = RecordedMessage(name, encode_values(msg_values, record_images))
+        elif isinstance(v, Image.Image) and not record_images:
+            v = ImageStandIn.of(v)
+        result.append(v)
+    return tuple(result)
+
+
+def decode_values(values, blank_images=False):
+    """Inverse of `encode_values`, stand-ins are kept unless blank_images"""
+    result = list()
+    for v in values:
+        if isinstance(v, (list, tuple)) and v \
+                and isinstance(v[0], (RecordedMessage, ImageStandIn)):
+            v = type(v)(decode_values(v, blank_images))
+        elif isinstance(v, RecordedMessage):
+            v = deserialize_message(
+                v.name, decode_values(v.values, blank_images)
+            )
+        elif isinstance(v, ImageStandIn) and blank_images:
+            v = v.to_image()
+        result.append(v)
+    return tuple(result)
+
+
+def read_message_log(file_path, blank_images=False):
+    """Yield (elapsed_sec, message) recorded by `MessageRecorder`
+
+    :param bool blank_images: `ImageStandIn` are replaced by blank images
+        of the recorded size, so messages can be fed to update and view
+    """
+    with gzip.open(file_path, "rb") as f:
+        while True:
+            try:
+                elapsed, name, values = pickle.load(f)
+            except EOFError:
+                break
+            if name is not None:
+                values = decode_values(values, blank_images)
+            yield elapsed, deserialize_message(name, values)
+
 
 def has_retina_display():
     plt_name = platform.system()
@@ -184,11 +360,20 @@ def beginner_program(model, view, update, logger_config=None):
     pyglet.app.run()
 
 
+EFFECT_RUNTIMES = {
+    "thread": effect.Executor,
+    "asyncio": effect.AsyncioExecutor
+}
+
+
 class Backend(object):
 
     def __init__(
             self, init, view, update, subscriptions, logger=None,
-            initial_window_size=(640, 480)
+            initial_window_size=(640, 480), record_path=None,
+            profile_latency=False, effect_time_budget=0.008,
+            worker_pool_sizes=None, effect_runtime="thread",
+            worker_queue_limits=None, max_worker_processes=None
     ):
         self.logger = logger or getLogger("pfcore.Backend")
         self.model, init_cmds = init()
@@ -196,30 +381,79 @@ class Backend(object):
         self.update = update
         self.subscriptions = subscriptions
         proxy = self.get_proxy()
+        self.proxy = proxy
+        self.recorder = None
+        if record_path:
+            self.logger.info("Record messages to {}".format(record_path))
+            self.recorder = MessageRecorder(record_path, logger=self.logger)
+            proxy.msg_handlers.register(self.recorder.record)
         self.logger.info("Retina mode: {}".format(has_retina_display()))
         self.window_provider = window.Provider(
             proxy=proxy, initial_window_size=initial_window_size,
             retina_display=has_retina_display()
         )
-        self.effect_executor = effect.Executor(proxy=proxy)
+        effect.WORKER_POOLS.configure(**(worker_pool_sizes or dict()))
+        effect.WORKER_POOLS.configure_queues(**(worker_queue_limits or dict()))
+        if max_worker_processes is not None:
+            effect.WORKER_POOLS.configure_processes(max_worker_processes)
+        atexit.register(effect.WORKER_POOLS.shutdown)
+        executor_cls = EFFECT_RUNTIMES[effect_runtime]
+        self.effect_executor = executor_cls(
+            proxy=proxy, time_budget=effect_time_budget
+        )
+        atexit.register(self.effect_executor.shutdown)
+        if profile_latency:
+            proxy.latency_stats = MessageLatencyStats()
+            atexit.register(self.dump_latency_stats)
+            self.window_provider.window_obj.push_handlers(
+                on_key_release=self.on_latency_dump_key
+            )
         proxy.initial_reaction(init_cmds)
 
     def set_global_line_width(self, width=3):
         pyglet.gl.glLineWidth(width)
 
+    def dump_latency_stats(self):
+        if self.proxy.latency_stats is not None:
+            self.logger.info(self.proxy.latency_stats.dump())
+            self.logger.info(effect.WORKER_POOLS.dump_worker_stats())
+
+    def on_latency_dump_key(self, symbol, modifiers):
+        if symbol == pyglet.window.key.F12:
+            self.dump_latency_stats()
+
     def get_proxy(self):
         return StateProxy(state=self, logger=self.logger)
 
 
 def program(init, view, update, subscriptions, logger_config=None,
-            initial_window_size=(640, 480)):
+            initial_window_size=(640, 480), record_path=None,
+            profile_latency=False, effect_time_budget=0.008,
+            worker_pool_sizes=None, effect_runtime="thread",
+            worker_queue_limits=None, max_worker_processes=None):
+    """Start the application
+
+    :param dict worker_pool_sizes: number of threads of each named pool in
+        `effect.WORKER_POOLS`, e.g. dict(pathology_reader=8)
+    :param dict worker_queue_limits: (queue_size, queue_policy) of each
+        named pool, e.g. dict(pathology_reader=(256, "merge"))
+    :param int max_worker_processes: limit of the total processes of pools,
+        effect.MAX_WORKER_PROCESSES by default
+    :param str effect_runtime: "thread" or "asyncio", see EFFECT_RUNTIMES
+    """
     logger_config = logger_config or dict()
     configure_log_settings(**logger_config)
     logger = getLogger("pfcore.Backend")
     logger.info("Start program @ {}".format(datetime.datetime.now()))
     backend = Backend(
         init, view, update, subscriptions, logger=logger,
-        initial_window_size=initial_window_size
+        initial_window_size=initial_window_size, record_path=record_path,
+        profile_latency=profile_latency,
+        effect_time_budget=effect_time_budget,
+        worker_pool_sizes=worker_pool_sizes,
+        worker_queue_limits=worker_queue_limits,
+        max_worker_processes=max_worker_processes,
+        effect_runtime=effect_runtime
     )
     backend.set_global_line_width()
     pyglet.app.run()
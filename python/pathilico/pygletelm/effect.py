@@ -17,14 +17,22 @@ such as file IO"""
 import os
 import time
 import random
+import functools
 import threading
 import queue
+import heapq
+import asyncio
+import itertools
+import collections
+import concurrent.futures
+from multiprocessing import shared_memory
 from logging import getLogger
 
 import pyglet
 from PIL import Image
 
 import pathilico.pygletelm.cache as cache
+from pathilico.pygletelm.metrics import LatencyHistogram
 
 
 # User APIs
@@ -103,6 +111,30 @@ def read_image(image_path, msg, msg_kwargs=None):
     return EffectObject(effects=[cmd])
 
 
+def cancel_pooled_requests(pool_name, keys):
+    """Cancel pending requests of pooled commands which have given keys"""
+    cmd = CancelPooledRequests(pool_name, keys)
+    return EffectObject(instants=[cmd])
+
+
+def watch_pool_queue(pool_name, msg, msg_kwargs=None, sec=0.1, sub_id=0):
+    """Create subscription order, msg must take args `depth` (int) and
+    `dropped_keys` (tuple of cancel keys of dropped requests)
+
+    Depth counts each item of tuple cancel keys, see get_queue_depth.
+    """
+    sub = PoolQueueSubscription(
+        pool_name, msg, msg_kwargs=msg_kwargs, interval=sec, sub_id=sub_id
+    )
+    return EffectObject(effects=[sub])
+
+
+def set_pool_priority(pool_name, priority_func):
+    """Reorder requests of the prioritized pool by priority_func(request)"""
+    cmd = SetPoolPriority(pool_name, priority_func)
+    return EffectObject(instants=[cmd])
+
+
 # Core api
 class SubscriptionBase(cache.CachedObject):
 
@@ -121,19 +153,46 @@ class Executor(object):
     # get_messageでコマンドを消去させるようにする
     # スレッド自体はasyncのファイルのdictかなんかにプールするようにする
 
-    def __init__(self, proxy, logger=None):
+    def __init__(self, proxy, logger=None, time_budget=0.008):
         """Execute effect
 
+        Messages are collected when RESULT_NOTIFIER is notified. They are
+        collected every tick only while results are left over the time
+        budget, or commands which must be polled are running.
+
         :param pathfinder.pygletelm.backend.StateProxy proxy:
+        :param float time_budget: max seconds spent on pushing collected
+            messages per tick, remaining results wait for the next tick
         """
         self.logger = logger or getLogger("pfcore.EffectExecutor")
         self.proxy = proxy
-        pyglet.clock.schedule(self.collect_sub_msg)
-        pyglet.clock.schedule(self.collect_cmd_msg)
+        self.time_budget = time_budget
+        self.is_collecting = False  # collect_messages is on pyglet clock
         self.subscriptions = dict()
         self.commands = list()
         self.proxy.sub_handlers.register(self.handle_subs)
         self.proxy.cmd_handlers.register(self.handle_cmds)
+        RESULT_NOTIFIER.push_handlers(on_result_ready=self.on_result_ready)
+
+    def on_result_ready(self):
+        """Collect results as soon as a worker thread wakes the loop up"""
+        RESULT_NOTIFIER.acknowledge()
+        self.collect_messages(0)
+
+    def collect_messages(self, dt):
+        is_left = self.collect_sub_msg(dt)
+        is_left = self.collect_cmd_msg(dt) or is_left
+        self.set_collecting(is_left or bool(self.commands))
+
+    def set_collecting(self, flag):
+        """Schedule collect_messages every tick while flag is True"""
+        if flag == self.is_collecting:
+            return
+        self.is_collecting = flag
+        if flag:
+            pyglet.clock.schedule(self.collect_messages)
+        else:
+            pyglet.clock.unschedule(self.collect_messages)
 
     def handle_subs(self, new_sub):
         """This func is passed to proxy.sub_handlers.register
@@ -158,6 +217,9 @@ class Executor(object):
             flag, msg = ins.get_message()
             if flag:
                 self.proxy.push_message(msg)
+        if effects:
+            # Collected once at least, queue depths changed by the effects
+            self.set_collecting(True)
 
     def update_subscription_effects(self, effects):
         new, update, delete = cache.diff(
@@ -170,12 +232,16 @@ class Executor(object):
             self._delete_subscription(d_id)
         for u_id, u_kwargs in update.items():
             self._update_subscription(u_id, u_kwargs)
+        if new:
+            self.set_collecting(True)
 
     def add_command_effects(self, effects):
         for e in effects:
             if not e.is_done():
                 e.start()
-                self.commands.append(e)
+                # Pooled commands are queued to READY_COMMANDS when ready
+                if not isinstance(e, PooledCommandBase):
+                    self.commands.append(e)
 
     @classmethod
     def get_tags(cls, l):
@@ -197,29 +263,196 @@ class Executor(object):
         self.subscriptions[identity].update(update_kwargs)
 
     def collect_sub_msg(self, dt):
-        for e in self.subscriptions.values():
-            flag, msg = e.get_message()
-            if flag:
+        """:return bool: True if messages may be left over the budget"""
+        deadline = time.perf_counter() + self.time_budget
+        # Pushing a message may add or delete subscriptions
+        for e in list(self.subscriptions.values()):
+            while self.subscriptions.get(e.identity, None) is e:
+                flag, msg = e.get_message()
+                if not flag:
+                    break
                 self.proxy.push_message(msg)
-                return
+                if time.perf_counter() > deadline:
+                    return True
+        return False
 
     def collect_cmd_msg(self, dt):
-        for e in self.commands:
+        """:return bool: True if messages may be left over the budget"""
+        deadline = time.perf_counter() + self.time_budget
+        WORKER_POOLS.collect_responses()
+        is_over_budget = False
+        while READY_COMMANDS and not is_over_budget:
+            e = READY_COMMANDS.popleft()
             flag, msg = e.get_message()
             if flag:
+                self.proxy.push_message(msg)
+                is_over_budget = time.perf_counter() > deadline
+        # Pushing a message may add new commands
+        for e in list(self.commands):
+            while not is_over_budget:
+                flag, msg = e.get_message()
+                if not flag:
+                    break
                 self.logger.debug(
                     "New cmd result msg is collected {}".format(msg)
                 )
                 self.proxy.push_message(msg)
+                is_over_budget = time.perf_counter() > deadline
+            if is_over_budget:
                 break
-        delete_ids = list()
-        for i, e in enumerate(self.commands):
-            if e.is_done():
-                delete_ids.append(i)
-                break
-        self.commands = [
-            v for i, v in enumerate(self.commands) if i not in delete_ids
-        ]
+        self.commands = [e for e in self.commands if not e.is_done()]
+        return is_over_budget
+
+    def shutdown(self):
+        self.set_collecting(False)
+        RESULT_NOTIFIER.remove_handlers(on_result_ready=self.on_result_ready)
+
+
+# Loop passes run by AsyncioExecutor when a worker wakes it up
+RESULT_STEP_PASSES = 4
+
+
+class AsyncioExecutor(Executor):
+
+    def __init__(self, proxy, logger=None, time_budget=0.008, max_workers=None):
+        """Execute effect as asyncio tasks on a loop stepped by pyglet clock
+
+        Pooled commands run their blocking requests on a thread pool and
+        are awaited by tasks. Subscriptions and other effects are handled
+        as `Executor` does, timers are served by TIMER_SCHEDULER.
+
+        Tasks support `PooledCommandBase.timeout` and cancellation by
+        `cancel_pooled_requests`, including tuple keys which are cancelled
+        when all of their items are given. They run in FIFO order, so
+        commands of process, prioritized or bounded pools are left to
+        WORKER_POOLS, which provides priorities, queue limits and depths.
+
+        :param int max_workers: threads for blocking calls
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or CPU_COUNT
+        )
+        self.loop.set_default_executor(self.thread_pool)
+        self.cmd_tasks = dict()  # (pool_name, cancel_key): set of tasks
+        self.task_keys = dict()  # task: cancel keys not given yet
+        super().__init__(proxy, logger=logger, time_budget=time_budget)
+        pyglet.clock.schedule(self.step_loop)
+
+    def step_loop(self, dt=0, passes=1):
+        """Run callbacks which are ready, never blocks
+
+        :param int passes: callbacks scheduled by ready ones are run too,
+            up to this depth
+        """
+        for _ in range(passes):
+            self.loop.call_soon(self.loop.stop)
+            self.loop.run_forever()
+
+    def on_result_ready(self):
+        # A result resumes its task through a few callbacks (the future,
+        # wait_for and the task), so all of them are run at once
+        super().on_result_ready()
+        self.step_loop(passes=RESULT_STEP_PASSES)
+
+    def handle_cmds(self, new_cmds):
+        for ins in new_cmds.instants:
+            if isinstance(ins, CancelPooledRequests):
+                self.cancel_command_tasks(ins.pool_name, ins.keys)
+        super().handle_cmds(new_cmds)
+
+    def add_command_effects(self, effects):
+        others = list()
+        for e in effects:
+            if isinstance(e, PooledCommandBase) and not e.is_done() \
+                    and not is_left_to_pool(e):
+                self.start_command_task(e)
+            else:
+                others.append(e)
+        super().add_command_effects(others)
+
+    def start_command_task(self, cmd):
+        cancel_key = cmd.get_cancel_key()
+        items = cancel_key if isinstance(cancel_key, tuple) else (cancel_key, )
+        task = self.loop.create_task(self.run_command(cmd))
+        self.task_keys[task] = set(items)
+        for k in items:
+            self.cmd_tasks.setdefault((cmd.pool_name, k), set()).add(task)
+        task.add_done_callback(
+            functools.partial(self.forget_command_task, cmd.pool_name)
+        )
+
+    def forget_command_task(self, pool_name, task):
+        for k in self.task_keys.pop(task, set()):
+            self.cmd_tasks.get((pool_name, k), set()).discard(task)
+
+    async def run_command(self, cmd):
+        blocking = functools.partial(
+            get_response_on_thread, cmd.pool_name, cmd.get_worker_key(),
+            cmd.get_worker_factory(), cmd.get_request()
+        )
+        thread_future = self.thread_pool.submit(blocking)
+        future = asyncio.wrap_future(thread_future, loop=self.loop)
+        # Added after wrap_future, so the loop is woken once the result
+        # has been handed to the loop
+        thread_future.add_done_callback(lambda f: RESULT_NOTIFIER.notify())
+        try:
+            is_succeeded, response = await asyncio.wait_for(
+                future, cmd.timeout
+            )
+        except asyncio.TimeoutError:
+            self.logger.warning("Timeout {}".format(cmd))
+            return
+        finally:
+            cmd.done()
+        flag, msg = cmd.get_message_from_response(is_succeeded, response)
+        if flag:
+            self.proxy.push_message(msg)
+
+    def cancel_command_tasks(self, pool_name, keys):
+        for k in keys:
+            for task in self.cmd_tasks.pop((pool_name, k), set()):
+                remaining = self.task_keys.get(task, set())
+                remaining.discard(k)
+                if not remaining:
+                    task.cancel()
+
+    def shutdown(self):
+        super().shutdown()
+        pyglet.clock.unschedule(self.step_loop)
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        self.step_loop()
+        self.thread_pool.shutdown(wait=False)
+        self.loop.close()
+
+
+def is_left_to_pool(cmd):
+    """True if the command needs features of WORKER_POOLS"""
+    options = cmd.get_pool_options()
+    return options.get("processes", False) \
+        or options.get("prioritized", False) \
+        or options.get("queue_size", 0) > 0
+
+
+THREAD_LOCAL_WORKERS = threading.local()
+
+
+def get_response_on_thread(pool_name, key, worker_factory, request):
+    """Run request with the worker owned by current thread
+
+    One worker per pool name is kept, it is closed when other key comes.
+    """
+    workers = getattr(THREAD_LOCAL_WORKERS, "workers", None)
+    if workers is None:
+        workers = THREAD_LOCAL_WORKERS.workers = dict()
+    worker_key, worker = workers.get(pool_name, (None, None))
+    if worker is None or worker_key != key:
+        if worker is not None and hasattr(worker, "close"):
+            worker.close()
+        worker = worker_factory()
+        workers[pool_name] = (key, worker)
+    return worker.get_response(request)
 
 
 class CommandBase(object):
@@ -234,6 +467,112 @@ class CommandWithThreadWorkerBase(CommandBase):
     pass
 
 
+class ResultNotifier(pyglet.event.EventDispatcher):
+
+    def __init__(self):
+        """Post `on_result_ready` into the pyglet loop from worker threads
+
+        Only one event is in flight until the Executor acknowledges it,
+        so a burst of results does not flood the event queue. Callbacks
+        on the main thread, e.g. timers, are answered on the next tick.
+        """
+        self.is_pending = threading.Event()
+
+    def notify(self):
+        if self.is_pending.is_set():
+            return
+        self.is_pending.set()
+        if threading.current_thread() is threading.main_thread():
+            pyglet.clock.schedule_once(self.dispatch_result_ready, 0)
+        else:
+            pyglet.app.platform_event_loop.post_event(self, "on_result_ready")
+
+    def dispatch_result_ready(self, dt):
+        self.dispatch_event("on_result_ready")
+
+    def acknowledge(self):
+        self.is_pending.clear()
+
+
+ResultNotifier.register_event_type("on_result_ready")
+RESULT_NOTIFIER = ResultNotifier()
+STOP_THREAD_REQUEST = object()
+
+
+class TimerScheduler(object):
+
+    def __init__(self, clock=None):
+        """Serve every timer by one `schedule_once` on pyglet clock
+
+        Timers are kept in a heap ordered by deadline and the clock is
+        armed only for the earliest one, so no thread is used and the
+        loop is not woken up while nothing is due.
+
+        :param pyglet.clock.Clock clock: default clock if None
+        """
+        self.clock = clock or pyglet.clock.get_default()
+        self.deadlines = list()  # heap of (deadline, timer_id)
+        self.timers = dict()  # timer_id: (callback, interval, end)
+        self.counter = itertools.count()
+        self.armed_deadline = None
+
+    def add_timer(self, callback, delay, interval=0, until=0):
+        """Call callback(now) after delay sec
+
+        :param float interval: repeat every interval sec if positive
+        :param float until: stop repeating until sec after now if positive
+        :return: timer id to be passed to remove_timer
+        """
+        timer_id = next(self.counter)
+        now = self.clock.time()
+        end = now + until if until > 0 else 0
+        self.timers[timer_id] = (callback, interval, end)
+        heapq.heappush(self.deadlines, (now + delay, timer_id))
+        self.arm()
+        return timer_id
+
+    def remove_timer(self, timer_id):
+        # The heap entry is dropped when it comes to the top
+        self.timers.pop(timer_id, None)
+        self.arm()
+
+    def arm(self):
+        while self.deadlines and self.deadlines[0][1] not in self.timers:
+            heapq.heappop(self.deadlines)
+        deadline = self.deadlines[0][0] if self.deadlines else None
+        if deadline == self.armed_deadline:
+            return
+        self.clock.unschedule(self.on_timer)
+        self.armed_deadline = deadline
+        if deadline is not None:
+            delay = max(0, deadline - self.clock.time())
+            self.clock.schedule_once(self.on_timer, delay)
+
+    def on_timer(self, dt):
+        self.armed_deadline = None
+        now = self.clock.time()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, timer_id = heapq.heappop(self.deadlines)
+            if timer_id not in self.timers:
+                continue
+            callback, interval, end = self.timers[timer_id]
+            if 0 < end < deadline:
+                del self.timers[timer_id]
+                continue
+            next_deadline = deadline + interval
+            if next_deadline <= now:  # Skip ticks missed by a long frame
+                next_deadline = now + interval
+            if interval > 0 and (end == 0 or next_deadline <= end):
+                heapq.heappush(self.deadlines, (next_deadline, timer_id))
+            else:
+                del self.timers[timer_id]
+            callback(now)
+        self.arm()
+
+
+TIMER_SCHEDULER = TimerScheduler()
+
+
 class WorkerSideStreamingThread(object):
     thread_sleep_time = 0.01
 
@@ -253,35 +592,53 @@ class WorkerSideStreamingThread(object):
         while not self.stop.is_set():
             flag, res = self.worker.get_response(self.request)
             if flag:
-                self.responses.put(res)
-            time.sleep(self.thread_sleep_time)
+                self.put_response(res)
+            self.stop.wait(self.thread_sleep_time)
 
     def start_thread(self):
         self.thread.start()
 
+    def put_response(self, res):
+        self.responses.put(res)
+        RESULT_NOTIFIER.notify()
+
     def get_response(self):
-        if self.responses.empty():
+        try:
+            res = self.responses.get_nowait()
+        except queue.Empty:
             return False, None
-        else:
-            res = self.responses.get()
-            return True, res
+        return True, res
 
 
 class ClientSideStreamingThread(WorkerSideStreamingThread):
 
-    def __init__(self, worker, auto_start=True, daemon=True):
-        self.requests = queue.Queue()
+    def __init__(self, worker, auto_start=True, daemon=True, requests=None):
+        """
+        :param requests: queue shared with other threads, e.g.
+            PriorityRequestQueue, a new queue.Queue is used if None
+        """
+        self.requests = queue.Queue() if requests is None else requests
         super().__init__(worker, None, auto_start, daemon)
 
     def thread_worker(self):
         while True:
-            if not self.requests.empty():
-                req = self.requests.get()
-                flag, res = self.worker.get_response(req)
-                if flag:
-                    self.responses.put(res)
-                    break
-            time.sleep(self.thread_sleep_time)
+            req = self.requests.get()  # Block until a request comes
+            if req is STOP_THREAD_REQUEST:
+                self.close_worker()
+                break
+            flag, res = self.worker.get_response(req)
+            if flag:
+                self.put_response(res)
+                break
+
+    def close_worker(self):
+        close = getattr(self.worker, "close", None)
+        if close is not None:
+            close()
+
+    def done(self):
+        self.stop.set()
+        self.requests.put(STOP_THREAD_REQUEST)
 
     def add_request(self, request):
         self.requests.put(request)
@@ -291,12 +648,969 @@ class BidirectionalStreamingThread(ClientSideStreamingThread):
 
     def thread_worker(self):
         while True:
-            if not self.requests.empty():
-                req = self.requests.get()
-                flag, res = self.worker.get_response(req)
-                if flag:
-                    self.responses.put(res)
-            time.sleep(self.thread_sleep_time)
+            req = self.requests.get()  # Block until a request comes
+            if req is STOP_THREAD_REQUEST:
+                self.close_worker()
+                break
+            flag, res = self.worker.get_response(req)
+            if flag:
+                self.put_response(res)
+
+
+QUEUE_POLICIES = ("block", "drop_oldest", "merge")
+
+
+class PriorityRequestQueue(object):
+
+    def __init__(
+            self, priority_func=None, maxsize=0, policy="block",
+            merge_key_func=None):
+        """Blocking queue which gives the request of the smallest priority
+
+        Priorities are computed by priority_func(request) and recomputed
+        for all waiting requests by `set_priority_func`.
+        STOP_THREAD_REQUEST goes ahead of any request and is never bounded.
+        Requests of the same priority are given in FIFO order.
+
+        :param int maxsize: waiting requests are bounded if positive
+        :param str policy: one of QUEUE_POLICIES, what `put` does when full
+            "block": wait until a thread takes a request, or drop the
+                given request if `put` is called with block=False
+            "drop_oldest": drop the oldest waiting request
+            "merge": replace the waiting request of the same
+                merge_key_func(request) even if not full, otherwise drop
+                the oldest one
+        """
+        if policy not in QUEUE_POLICIES:
+            raise ValueError("Unknown queue policy {}".format(policy))
+        self.priority_func = priority_func or get_zero_priority
+        self.maxsize = maxsize
+        self.policy = policy
+        self.merge_key_func = merge_key_func or get_none_key
+        self.heap = list()  # [(rank, priority, count, request)]
+        self.count = 0
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _get_entry(self, request, count):
+        if request is STOP_THREAD_REQUEST:
+            return 0, 0, count, request
+        return 1, self.priority_func(request), count, request
+
+    def _remove_entry(self, entry):
+        self.heap.remove(entry)
+        heapq.heapify(self.heap)
+        return entry[-1]
+
+    def _find_entry_to_merge(self, request):
+        key = self.merge_key_func(request)
+        if key is None:
+            return None
+        for entry in self.heap:
+            if entry[0] == 1 and self.merge_key_func(entry[-1]) == key:
+                return entry
+        return None
+
+    def is_full(self):
+        return 0 < self.maxsize <= len(self.heap)
+
+    def put(self, request, block=True):
+        """
+        :param bool block: False for callers which must not wait, e.g.
+            main thread, the request is dropped instead
+        :return: (request replaced by merge or None, list of dropped requests)
+        """
+        merged, dropped = None, list()
+        with self.condition:
+            if request is not STOP_THREAD_REQUEST:
+                if self.policy == "merge":
+                    entry = self._find_entry_to_merge(request)
+                    if entry is not None:
+                        merged = self._remove_entry(entry)
+                if self.policy == "block" and not block and self.is_full():
+                    return merged, [request]
+                if self.policy == "block":
+                    while self.is_full():
+                        self.condition.wait()
+                while self.is_full():
+                    oldest = min(self.heap, key=lambda e: (e[0] == 0, e[2]))
+                    if oldest[-1] is STOP_THREAD_REQUEST:
+                        break
+                    dropped.append(self._remove_entry(oldest))
+            self.count += 1
+            heapq.heappush(self.heap, self._get_entry(request, self.count))
+            self.condition.notify_all()
+        return merged, dropped
+
+    def get(self):
+        with self.condition:
+            while not self.heap:
+                self.condition.wait()
+            request = heapq.heappop(self.heap)[-1]
+            self.condition.notify_all()
+            return request
+
+    def get_nowait(self):
+        with self.condition:
+            if not self.heap:
+                raise queue.Empty
+            request = heapq.heappop(self.heap)[-1]
+            self.condition.notify_all()
+            return request
+
+    def take_all(self):
+        """Remove every waiting request, STOP_THREAD_REQUEST is kept"""
+        with self.condition:
+            requests = [e[-1] for e in self.heap if e[0] == 1]
+            self.heap = [e for e in self.heap if e[0] != 1]
+            heapq.heapify(self.heap)
+            self.condition.notify_all()
+        return requests
+
+    def set_priority_func(self, priority_func):
+        with self.condition:
+            self.priority_func = priority_func
+            self.heap = [
+                self._get_entry(request, count)
+                for _, _, count, request in self.heap
+            ]
+            heapq.heapify(self.heap)
+
+
+def get_zero_priority(request):
+    return 0
+
+
+def get_none_key(request):
+    return None
+
+
+class RoutedWorker(object):
+
+    def __init__(self, worker, cancelled_ids):
+        """Tag responses of worker with the id of request
+
+        The response is always returned, so failed requests also reach
+        the waiting command. Requests in `cancelled_ids` are skipped.
+        Responses are (request_id, flag, response, elapsed sec), elapsed
+        is None for skipped requests.
+        """
+        self.worker = worker
+        self.cancelled_ids = cancelled_ids
+        self.running_id = None  # Read by main thread for stats
+
+    def get_response(self, request):
+        request_id, req = request
+        if request_id in self.cancelled_ids:
+            return True, (request_id, False, None, None)
+        self.running_id = request_id
+        start = time.perf_counter()
+        try:
+            flag, res = self.worker.get_response(req)
+        finally:
+            self.running_id = None
+        return True, (request_id, flag, res, time.perf_counter() - start)
+
+    def close(self):
+        close = getattr(self.worker, "close", None)
+        if close is not None:
+            close()
+
+
+class PoolBase(object):
+    """Routing of responses shared by WorkerPool and ProcessWorkerPool
+
+    Requests are tagged with ids, and the response of a request is passed
+    to the callback of the id on main thread.
+    """
+
+    def init_routing(self):
+        self.cancelled_ids = set()  # Also read by worker threads
+        self.callbacks = dict()  # request_id: callback
+        self.cancel_keys = dict()  # request_id: key given by the requester
+        self.merged_ids = dict()  # request_id: ids answered by its response
+        self.latencies = collections.defaultdict(LatencyHistogram)  # worker
+        self.dropped_keys = collections.deque(maxlen=4096)
+        self.request_count = 0
+
+    def register_request(self, callback, cancel_key=None):
+        """
+        :param callback: called as callback(flag, response) on main thread
+            by `collect_responses`
+        :param cancel_key: hashable used by `cancel_by_keys`, a tuple
+            stands for each of its items, e.g. ids of coalesced requests
+        :return: request id
+        """
+        self.request_count += 1
+        request_id = self.request_count
+        self.callbacks[request_id] = callback
+        if cancel_key is not None:
+            self.cancel_keys[request_id] = cancel_key
+        return request_id
+
+    def get_routed_request_cancel_key(self, routed_request):
+        return self.cancel_keys.get(routed_request[0], None)
+
+    def get_queue_depth(self):
+        """Number of items waiting for their responses
+
+        A request of a tuple cancel_key counts as its items, e.g. tiles
+        of a coalesced block, so the depth is in the unit of requesters.
+        """
+        depth = 0
+        for request_id in self.callbacks:
+            key = self.cancel_keys.get(request_id, None)
+            depth += len(key) if isinstance(key, tuple) else 1
+        return depth
+
+    def record_latency(self, worker, elapsed):
+        if elapsed is not None:
+            self.latencies[worker].record(elapsed)
+
+    def get_in_flight_counts(self):
+        """worker: number of its outstanding requests"""
+        return dict()
+
+    def get_worker_stats(self):
+        """Return list of (worker, in_flight, count, mean, p50, p95, max)
+
+        Latencies are service time of workers in milliseconds, in_flight
+        is None if the worker of requests is not known until served.
+        """
+        in_flight = self.get_in_flight_counts()
+        workers = sorted(set(in_flight) | set(self.latencies))
+        result = list()
+        for w in workers:
+            h = self.latencies.get(w, None) or LatencyHistogram()
+            result.append((
+                w, in_flight.get(w, None), h.total_count,
+                h.get_mean() * 1000, h.get_percentile(50) * 1000,
+                h.get_percentile(95) * 1000, h.max_sec * 1000
+            ))
+        return result
+
+    def pop_dropped_keys(self):
+        """Cancel keys of requests dropped by the bounded queue"""
+        keys = list(self.dropped_keys)
+        self.dropped_keys.clear()
+        return keys
+
+    def on_put(self, request_id, merged, dropped):
+        """Handle the result of PriorityRequestQueue.put"""
+        if merged is not None:
+            # The response of this request is also passed to merged one
+            merged_id = merged[0]
+            self.merged_ids[request_id] = [
+                merged_id, *self.merged_ids.pop(merged_id, list())
+            ]
+        for dropped_id, _ in dropped:
+            key = self.cancel_keys.get(dropped_id, None)
+            if isinstance(key, tuple):
+                self.dropped_keys.extend(key)
+            elif key is not None:
+                self.dropped_keys.append(key)
+            self.resolve_with_merged(dropped_id, False, None)
+
+    def take_waiting_requests(self):
+        """Remove (request_id, request) which are not sent to workers"""
+        return list()
+
+    def drop_waiting_requests(self):
+        """Resolve requests not sent to workers as failed, and forget them
+
+        Keys are not reported by `pop_dropped_keys`, since this is used
+        when the requester moves to other pool.
+
+        :return: number of dropped requests
+        """
+        routed_requests = self.take_waiting_requests()
+        for request_id, _ in routed_requests:
+            self.resolve_with_merged(request_id, False, None)
+        return len(routed_requests)
+
+    def cancel(self, request_id):
+        """Drop the callback, and skip the request if not yet started"""
+        if request_id in self.callbacks:
+            self.callbacks[request_id] = None
+            self.cancelled_ids.add(request_id)
+
+    def cancel_by_keys(self, keys):
+        """Cancel pending requests whose cancel_key is in keys
+
+        A request of a tuple key is cancelled once all of its items are
+        given, possibly by separate calls.
+
+        :return: number of cancelled requests
+        """
+        keys = set(keys)
+        request_ids = list()
+        for r_id, k in list(self.cancel_keys.items()):
+            if isinstance(k, tuple):
+                rest = tuple([i for i in k if i not in keys])
+                if rest:
+                    self.cancel_keys[r_id] = rest
+                    continue
+            elif k not in keys:
+                continue
+            request_ids.append(r_id)
+        for r_id in request_ids:
+            self.cancel(r_id)
+            del self.cancel_keys[r_id]
+        return len(request_ids)
+
+    def resolve_with_merged(self, request_id, is_succeeded, response):
+        merged_ids = self.merged_ids.pop(request_id, list())
+        for r_id in [request_id, *merged_ids]:
+            self.resolve(r_id, is_succeeded, response)
+
+    def resolve(self, request_id, is_succeeded, response):
+        """Forget the request and pass the response to its callback"""
+        callback = self.callbacks.pop(request_id, None)
+        self.cancel_keys.pop(request_id, None)
+        self.cancelled_ids.discard(request_id)
+        if callback is not None:
+            callback(is_succeeded, response)
+
+
+class WorkerPool(PoolBase):
+
+    def __init__(
+            self, name, worker_factory, size=1, key=None, priority_func=None,
+            queue_size=0, queue_policy="block"):
+        """Threads which serve the same kind of requests
+
+        :param str name:
+        :param worker_factory: called without args to make a worker per thread
+        :param int size: number of threads
+        :param key: pool is rebuilt when requested with other key
+        :param priority_func: if given, threads share a PriorityRequestQueue
+            and take the request of the smallest priority_func(request)
+        :param int queue_size: if positive, threads share a queue which
+            holds at most queue_size waiting requests
+        :param str queue_policy: see PriorityRequestQueue, "merge" merges
+            requests of the same cancel_key
+        """
+        self.init_routing()
+        self.name = name
+        self.key = key
+        self.shared_requests = None
+        if priority_func is not None or queue_size > 0 \
+                or queue_policy != "block":
+            self.shared_requests = PriorityRequestQueue(
+                get_routed_request_priority_func(
+                    priority_func or get_zero_priority
+                ),
+                maxsize=queue_size, policy=queue_policy,
+                merge_key_func=self.get_routed_request_cancel_key
+            )
+        self.threads = [
+            BidirectionalStreamingThread(
+                worker=RoutedWorker(worker_factory(), self.cancelled_ids),
+                auto_start=True, daemon=True, requests=self.shared_requests
+            ) for _ in range(max(1, size))
+        ]
+        self.loads = [0 for _ in self.threads]  # Outstanding requests
+        self.thread_indices = dict()  # request_id: index of the thread
+
+    def __len__(self):
+        return len(self.threads)
+
+    def get_least_loaded_index(self):
+        """Fewest outstanding requests, then the lowest mean latency"""
+        return min(
+            range(len(self.threads)),
+            key=lambda i: (self.loads[i], self.latencies[i].get_mean())
+        )
+
+    def add_request(self, request, callback, cancel_key=None):
+        """Send request to the least loaded thread
+
+        Threads of a shared queue take requests when they get idle,
+        so the queue itself balances the load. Main thread never waits
+        for them, see ProcessWorkerPool for a full queue of "block" policy.
+
+        :return: request id
+        """
+        request_id = self.register_request(callback, cancel_key)
+        if self.shared_requests is None:
+            index = self.get_least_loaded_index()
+            self.loads[index] += 1
+            self.thread_indices[request_id] = index
+            self.threads[index].add_request((request_id, request))
+            return request_id
+        merged, dropped = self.shared_requests.put(
+            (request_id, request), block=False
+        )
+        self.on_put(request_id, merged, dropped)
+        return request_id
+
+    def set_priority_func(self, priority_func):
+        """Reorder waiting requests in place, only for prioritized pool"""
+        if self.shared_requests is not None:
+            self.shared_requests.set_priority_func(
+                get_routed_request_priority_func(priority_func)
+            )
+
+    def collect_responses(self):
+        """Pass every arrived response to the callback of its request"""
+        for index, t in enumerate(self.threads):
+            while True:
+                flag, res = t.get_response()
+                if not flag:
+                    break
+                request_id, is_succeeded, response, elapsed = res
+                self.record_latency(index, elapsed)
+                self.resolve_with_merged(request_id, is_succeeded, response)
+
+    def get_in_flight_counts(self):
+        if self.shared_requests is None:
+            return dict(enumerate(self.loads))
+        return {
+            i: int(t.worker.running_id is not None)
+            for i, t in enumerate(self.threads)
+        }
+
+    def take_waiting_requests(self):
+        if self.shared_requests is not None:
+            return self.shared_requests.take_all()
+        routed_requests = list()
+        for t in self.threads:
+            is_stopped = False
+            while True:
+                try:
+                    request = t.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is STOP_THREAD_REQUEST:
+                    is_stopped = True
+                else:
+                    routed_requests.append(request)
+            if is_stopped:
+                t.requests.put(STOP_THREAD_REQUEST)
+        return routed_requests
+
+    def resolve(self, request_id, is_succeeded, response):
+        index = self.thread_indices.pop(request_id, None)
+        if index is not None:
+            self.loads[index] = max(0, self.loads[index] - 1)
+        super().resolve(request_id, is_succeeded, response)
+
+    def shutdown(self):
+        for t in self.threads:
+            t.done()
+
+    def join(self, timeout=None):
+        for t in self.threads:
+            t.thread.join(timeout)
+
+
+class SharedImageRef(object):
+    __slots__ = ("name", "mode", "size", "num_bytes")
+
+    def __init__(self, name, mode, size, num_bytes):
+        """Pointer to PIL image's bytes placed on shared memory"""
+        self.name, self.mode, self.size = name, mode, size
+        self.num_bytes = num_bytes
+
+
+def put_on_shared_memory(value):
+    """Replace PIL images in value (or tuple) by SharedImageRef
+
+    The segment is unlinked by the receiver on main thread, by
+    `take_from_shared_memory` when the response is collected, or by
+    `free_shared_memory` when it is never collected. Processes of a pool
+    share the resource tracker of the main process, so the segment is
+    also unlinked by the tracker if the main process dies before.
+    """
+    if isinstance(value, tuple):
+        return tuple(put_on_shared_memory(v) for v in value)
+    if not isinstance(value, Image.Image):
+        return value
+    data = value.tobytes()
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    shm.buf[:len(data)] = data
+    ref = SharedImageRef(shm.name, value.mode, value.size, len(data))
+    shm.close()
+    return ref
+
+
+def take_from_shared_memory(value):
+    """Restore images of `put_on_shared_memory`, shared memory is freed
+
+    Every image of a tuple is freed even if one of them fails.
+    """
+    if isinstance(value, tuple):
+        restored, error = list(), None
+        for v in value:
+            try:
+                restored.append(take_from_shared_memory(v))
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return tuple(restored)
+    if not isinstance(value, SharedImageRef):
+        return value
+    shm = shared_memory.SharedMemory(name=value.name)
+    try:
+        return Image.frombytes(
+            value.mode, value.size, bytes(shm.buf[:value.num_bytes])
+        )
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def free_shared_memory(value):
+    """Free images of `put_on_shared_memory` without reading them"""
+    if isinstance(value, tuple):
+        for v in value:
+            free_shared_memory(v)
+        return
+    if not isinstance(value, SharedImageRef):
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=value.name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def free_future_result(future):
+    """Done-callback for responses which are never collected"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    free_shared_memory(future.result()[1])
+
+
+PROCESS_WORKER = [None]  # Worker of a child process in ProcessWorkerPool
+
+
+def init_process_worker(worker_factory):
+    PROCESS_WORKER[0] = worker_factory()
+
+
+def get_response_on_process(request):
+    start = time.perf_counter()
+    flag, res = PROCESS_WORKER[0].get_response(request)
+    elapsed = time.perf_counter() - start
+    return flag, put_on_shared_memory(res), os.getpid(), elapsed
+
+
+class ProcessWorkerPool(PoolBase):
+
+    def __init__(
+            self, name, worker_factory, size=1, key=None, priority_func=None,
+            queue_size=0, queue_policy="block"):
+        """Processes which serve CPU bound requests, same API as WorkerPool
+
+        worker_factory, requests and responses must be picklable.
+        PIL images in responses are passed through shared memory.
+        Requests wait in a PriorityRequestQueue on main thread, and at
+        most `max_in_flight` of them are sent to processes at a time,
+        so waiting ones can still be reordered, merged and cancelled.
+        Main thread never waits, a request which does not fit in the
+        queue of "block" policy is dropped like by "drop_oldest".
+        Sent requests are taken by processes when they get idle, so they
+        are balanced like a shared queue of WorkerPool, and outstanding
+        counts are not kept per process.
+        See WorkerPool for the other arguments.
+        """
+        self.init_routing()
+        self.name = name
+        self.key = key
+        self.size = max(1, size)
+        self.max_in_flight = 2 * self.size  # Keep processes busy
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.size, initializer=init_process_worker,
+            initargs=(worker_factory, )
+        )
+        self.waiting_requests = PriorityRequestQueue(
+            get_routed_request_priority_func(
+                priority_func or get_zero_priority
+            ),
+            maxsize=queue_size, policy=queue_policy,
+            merge_key_func=self.get_routed_request_cancel_key
+        )
+        self.done_futures = queue.Queue()  # Put by executor's thread
+        self.futures = dict()  # request_id: future sent to processes
+
+    def __len__(self):
+        return self.size
+
+    def add_request(self, request, callback, cancel_key=None):
+        request_id = self.register_request(callback, cancel_key)
+        merged, dropped = self.waiting_requests.put(
+            (request_id, request), block=False
+        )
+        self.on_put(request_id, merged, dropped)
+        self.send_requests()
+        return request_id
+
+    def send_requests(self):
+        while len(self.futures) < self.max_in_flight:
+            try:
+                request_id, request = self.waiting_requests.get_nowait()
+            except queue.Empty:
+                return
+            if request_id in self.cancelled_ids:
+                self.resolve_with_merged(request_id, False, None)
+                continue
+            future = self.executor.submit(get_response_on_process, request)
+            self.futures[request_id] = future
+            future.add_done_callback(
+                functools.partial(self.on_future_done, request_id)
+            )
+
+    def on_future_done(self, request_id, future):
+        self.done_futures.put((request_id, future))
+        RESULT_NOTIFIER.notify()
+
+    def set_priority_func(self, priority_func):
+        self.waiting_requests.set_priority_func(
+            get_routed_request_priority_func(priority_func)
+        )
+
+    def take_waiting_requests(self):
+        return self.waiting_requests.take_all()
+
+    def collect_responses(self):
+        while True:
+            try:
+                request_id, future = self.done_futures.get_nowait()
+            except queue.Empty:
+                break
+            self.futures.pop(request_id, None)
+            try:
+                flag, res, pid, elapsed = future.result()
+                # Taken even if cancelled to free the shared memory
+                res = take_from_shared_memory(res)
+                self.record_latency(pid, elapsed)
+            except Exception as e:
+                flag, res = False, e
+            self.resolve_with_merged(request_id, flag, res)
+        self.send_requests()
+
+    def shutdown(self):
+        """Stop processes without waiting for running requests
+
+        Responses which are not collected are freed from shared memory,
+        also the ones which come after shutdown.
+        """
+        while True:
+            try:
+                request_id, future = self.done_futures.get_nowait()
+            except queue.Empty:
+                break
+            self.futures.pop(request_id, None)
+            free_future_result(future)
+        for future in self.futures.values():
+            future.cancel()
+            future.add_done_callback(free_future_result)
+        self.executor.shutdown(wait=False)
+
+    def join(self, timeout=None):
+        concurrent.futures.wait(list(self.futures.values()), timeout)
+
+
+def get_routed_request_priority_func(priority_func):
+    def func(routed_request):
+        return priority_func(routed_request[1])  # (request_id, request)
+    return func
+
+
+class WorkerPoolService(object):
+
+    def __init__(self, logger=None):
+        """Named worker pools shared by commands
+
+        Sizes given by `configure` take priority over default sizes
+        which commands pass to `get_pool`.
+        """
+        self.logger = logger or getLogger("pfcore.EffectExecutor")
+        self.pools = dict()
+        self.idle_pools = collections.OrderedDict()  # (name, key): pool
+        self.sizes = dict()
+        self.queue_limits = dict()
+        self.priority_funcs = dict()
+        self.max_processes = MAX_WORKER_PROCESSES
+
+    def configure(self, **sizes):
+        self.sizes.update(sizes)
+
+    def configure_processes(self, max_processes):
+        """Limit the total of processes of ProcessWorkerPools"""
+        self.max_processes = max(1, max_processes)
+
+    def configure_queues(self, **queue_limits):
+        """Set (queue_size, queue_policy) of each pool name"""
+        self.queue_limits.update(queue_limits)
+
+    def get_size(self, name, default_size=1):
+        return self.sizes.get(name, default_size)
+
+    def get_pool(
+            self, name, worker_factory, default_size=1, key=None,
+            prioritized=False, processes=False, queue_size=0,
+            queue_policy="block", max_keys=1):
+        """Pool of the name for the key
+
+        :param int max_keys: pools of the name are kept open for this
+            number of recently used keys, e.g. files opened by workers
+        """
+        pool = self.pools.get(name, None)
+        if pool is not None and pool.key == key:
+            return pool
+        idle_pool = self.idle_pools.pop((name, key), None)
+        if pool is not None:
+            del self.pools[name]
+            self.park_pool(name, pool, max_keys)
+        if idle_pool is not None:
+            self.logger.debug("Reuse worker pool {} of {}".format(name, key))
+            if prioritized:
+                idle_pool.set_priority_func(
+                    self.priority_funcs.get(name, get_zero_priority)
+                )
+            self.pools[name] = idle_pool
+            return idle_pool
+        size = self.get_size(name, default_size)
+        queue_size, queue_policy = self.queue_limits.get(
+            name, (queue_size, queue_policy)
+        )
+        if processes:
+            size = self.reserve_processes(name, size)
+        self.logger.debug("Start worker pool {} x {}".format(name, size))
+        priority_func = None
+        if prioritized:
+            priority_func = self.priority_funcs.get(name, get_zero_priority)
+        pool_cls = ProcessWorkerPool if processes else WorkerPool
+        pool = pool_cls(
+            name, worker_factory, size=size, key=key,
+            priority_func=priority_func, queue_size=queue_size,
+            queue_policy=queue_policy
+        )
+        self.pools[name] = pool
+        return pool
+
+    def park_pool(self, name, pool, max_keys=1):
+        """Keep the pool idle, the least recently used ones are shut down
+
+        Waiting requests are dropped, so the idle pool only finishes
+        requests which are already sent to its workers.
+        """
+        n = pool.drop_waiting_requests()
+        if n:
+            self.logger.debug("Drop {} requests of {}".format(n, name))
+        self.idle_pools[(name, pool.key)] = pool
+        keys = [k for k in self.idle_pools.keys() if k[0] == name]
+        for k in keys[:max(0, len(keys) - max_keys + 1)]:
+            self.idle_pools.pop(k).shutdown()
+
+    def get_process_count(self):
+        pools = list(self.pools.values()) + list(self.idle_pools.values())
+        return sum([
+            len(p) for p in pools if isinstance(p, ProcessWorkerPool)
+        ])
+
+    def reserve_processes(self, name, size):
+        """Make room for a process pool within max_processes
+
+        Idle process pools are shut down from the least recently used one,
+        then the pool gets the room left, at least one process.
+
+        :return int: number of processes of the new pool
+        """
+        for k, pool in list(self.idle_pools.items()):
+            if self.get_process_count() + size <= self.max_processes:
+                break
+            if isinstance(pool, ProcessWorkerPool):
+                self.idle_pools.pop(k).shutdown()
+        room = self.max_processes - self.get_process_count()
+        if room < size:
+            self.logger.debug(
+                "Start {} with {} of {} processes".format(name, room, size)
+            )
+        return max(1, min(size, room))
+
+    def get_queue_depth(self, name):
+        pool = self.pools.get(name, None)
+        if pool is None:
+            return 0
+        return pool.get_queue_depth()
+
+    def get_request_count(self, name):
+        """Number of requests added to the current pool of the name"""
+        pool = self.pools.get(name, None)
+        if pool is None:
+            return 0
+        return pool.request_count
+
+    def get_worker_stats(self, name):
+        pool = self.pools.get(name, None)
+        if pool is None:
+            return list()
+        return pool.get_worker_stats()
+
+    def dump_worker_stats(self):
+        """Formatted table of `get_worker_stats` of every pool"""
+        lines = ["{:<24} {:>8} {:>9} {:>7} {:>8} {:>8} {:>8} {:>8}".format(
+            "pool", "worker", "in_flight", "count", "mean", "p50", "p95",
+            "max"
+        )]
+        for name in sorted(self.pools.keys()):
+            for row in self.get_worker_stats(name):
+                worker, in_flight = row[:2]
+                lines.append(
+                    "{:<24} {:>8} {:>9} {:>7} {:>8.2f} {:>8.2f} {:>8.2f} "
+                    "{:>8.2f}".format(
+                        name, worker, "-" if in_flight is None else in_flight,
+                        *row[2:]
+                    )
+                )
+        return "\n".join(lines)
+
+    def pop_dropped_keys(self, name):
+        pool = self.pools.get(name, None)
+        if pool is None:
+            return list()
+        return pool.pop_dropped_keys()
+
+    def set_priority_func(self, name, priority_func):
+        """Used for waiting and later requests of the prioritized pool"""
+        self.priority_funcs[name] = priority_func
+        pool = self.pools.get(name, None)
+        if pool is not None:
+            pool.set_priority_func(priority_func)
+
+    def collect_responses(self):
+        for pool in list(self.pools.values()):
+            pool.collect_responses()
+        for pool in list(self.idle_pools.values()):
+            if pool.callbacks:  # Requests sent before the pool got idle
+                pool.collect_responses()
+
+    def cancel_by_keys(self, name, keys):
+        pool = self.pools.get(name, None)
+        if pool is None:
+            return 0
+        return pool.cancel_by_keys(keys)
+
+    def shutdown(self, timeout=0.5):
+        pools = list(self.pools.values()) + list(self.idle_pools.values())
+        self.pools.clear()
+        self.idle_pools.clear()
+        for pool in pools:
+            pool.shutdown()
+        for pool in pools:
+            pool.join(timeout)
+
+
+CPU_COUNT = os.cpu_count() or 1
+# Total processes of ProcessWorkerPools including idle ones, e.g. readers
+# of recently viewed slides, more ones only compete for cores
+MAX_WORKER_PROCESSES = 2 * CPU_COUNT
+WORKER_POOLS = WorkerPoolService()
+READY_COMMANDS = collections.deque()  # Pooled commands got response
+
+
+class PooledCommandBase(CommandWithThreadWorkerBase):
+    """Command served by a pool in WORKER_POOLS
+
+    The response is routed to the command by request id, and the command
+    is queued to READY_COMMANDS, so the Executor does not poll it.
+    """
+    pool_name = ""
+    pool = None
+    request_id = None
+    response = None
+    timeout = None  # Seconds, only used by AsyncioExecutor
+    _is_finished = False
+
+    def get_worker_factory(self):
+        """Called without args to make a worker"""
+        raise NotImplementedError
+
+    def get_worker_key(self):
+        """Workers are made again for other key, e.g. file path"""
+        return None
+
+    def get_pool_options(self):
+        """Keyword arguments of WorkerPoolService.get_pool"""
+        return dict()
+
+    def get_pool(self):
+        """:rtype: WorkerPool"""
+        return WORKER_POOLS.get_pool(
+            self.pool_name, self.get_worker_factory(),
+            key=self.get_worker_key(), **self.get_pool_options()
+        )
+
+    def get_request(self):
+        raise NotImplementedError
+
+    def get_message_from_response(self, is_succeeded, response):
+        """:return: (flag, message)"""
+        raise NotImplementedError
+
+    def get_cancel_key(self):
+        """Key to cancel the request by `cancel_pooled_requests`"""
+        return None
+
+    def start(self):
+        self.pool = self.get_pool()
+        self.request_id = self.pool.add_request(
+            self.get_request(), self.on_response,
+            cancel_key=self.get_cancel_key()
+        )
+
+    def on_response(self, is_succeeded, response):
+        self.response = (is_succeeded, response)
+        READY_COMMANDS.append(self)
+
+    def is_done(self):
+        return self._is_finished
+
+    def done(self):
+        if not self._is_finished and self.pool is not None:
+            self.pool.cancel(self.request_id)
+        self._is_finished = True
+
+    def get_message(self):
+        if self.response is None:
+            return False, None
+        self._is_finished = True
+        is_succeeded, response = self.response
+        self.response = None
+        return self.get_message_from_response(is_succeeded, response)
+
+
+class CancelPooledRequests(InstantCommandBase):
+
+    def __init__(self, pool_name, keys, logger=None):
+        self.logger = logger or getLogger("pfcore.EffectExecutor")
+        self.pool_name = pool_name
+        self.keys = keys
+        super().__init__()
+
+    def get_message(self):
+        n = WORKER_POOLS.cancel_by_keys(self.pool_name, self.keys)
+        self.logger.debug("Cancel {} requests in {}".format(n, self.pool_name))
+        return False, None
+
+
+class SetPoolPriority(InstantCommandBase):
+
+    def __init__(self, pool_name, priority_func):
+        self.pool_name = pool_name
+        self.priority_func = priority_func
+        super().__init__()
+
+    def get_message(self):
+        WORKER_POOLS.set_priority_func(self.pool_name, self.priority_func)
+        return False, None
 
 
 class RandomSample(InstantCommandBase):
@@ -326,24 +1640,28 @@ class NotifyEverySecondSubscription(SubscriptionBase):
         self.sub_id = sub_id
         self.interval = interval
         self.wait = wait
-        self.worker = NotifyEverySecWorker(until=self.until, wait=self.wait)
-        self.thread = WorkerSideStreamingThread(
-            worker=self.worker, request=interval, auto_start=False, daemon=True
-        )
+        self.fired_times = collections.deque()
+        self.timer_id = None
         super().__init__()
 
     def start(self):
-        self.thread.start_thread()
+        self.timer_id = TIMER_SCHEDULER.add_timer(
+            self.on_timer, self.wait, interval=self.interval, until=self.until
+        )
+
+    def on_timer(self, now):
+        self.fired_times.append(time.time())
+        RESULT_NOTIFIER.notify()
 
     def done(self):
-        self.thread.done()
+        if self.timer_id is not None:
+            TIMER_SCHEDULER.remove_timer(self.timer_id)
 
     def get_message(self):
-        flag, res = self.thread.get_response()
-        if flag:
-            return True, self.msg_constructor(time=res, **self.msg_kwargs)
-        else:
+        if not self.fired_times:
             return False, None
+        t = self.fired_times.popleft()
+        return True, self.msg_constructor(time=t, **self.msg_kwargs)
 
 
 class NotifyOnceSubscription(SubscriptionBase):
@@ -357,100 +1675,107 @@ class NotifyOnceSubscription(SubscriptionBase):
         self.msg_kwargs = msg_kwargs or dict()
         self.msg_kwargs_info = tuple(self.msg_kwargs.items())
         self.second = second
-        self.worker = NotifyOnceWorker()
-        self.thread = WorkerSideStreamingThread(
-            worker=self.worker, request=second, auto_start=False, daemon=True
-        )
+        self.fired_times = collections.deque()
+        self.timer_id = None
         super().__init__()
 
     def start(self):
-        self.thread.start_thread()
+        self.timer_id = TIMER_SCHEDULER.add_timer(self.on_timer, self.second)
+
+    def on_timer(self, now):
+        self.fired_times.append(time.time())
+        RESULT_NOTIFIER.notify()
 
     def done(self):
-        self.thread.done()
+        if self.timer_id is not None:
+            TIMER_SCHEDULER.remove_timer(self.timer_id)
 
     def get_message(self):
-        flag, res = self.thread.get_response()
-        if flag:
-            return True, self.msg_constructor(time=res, **self.msg_kwargs)
-        else:
+        if not self.fired_times:
             return False, None
+        t = self.fired_times.popleft()
+        return True, self.msg_constructor(time=t, **self.msg_kwargs)
 
 
-class NotifyEverySecWorker(object):
-    def __init__(self, wait=0, until=0):
-        self.last_time = time.time() - 10000
-        self.start_time = time.time()
-        self.wait = wait
-        self.until = until
+class PoolQueueSubscription(SubscriptionBase):
+    _payload_type = cache.PayloadTypes.unique_by_class_and_payload
+    _payload_attrs = (
+        "pool_name", "msg_class", "interval", "msg_kwargs_info", "sub_id"
+    )
 
-    def get_response(self, request):  # request == interval sec
-        now = time.time()
-        if now - self.start_time < self.wait:
-            return False, now
-        if now - self.start_time > self.until > 0:
-            return False, now
-        if now - self.last_time > request:
-            self.last_time = now
-            return True, now
-        else:
-            return False, now
+    def __init__(
+            self, pool_name, msg, msg_kwargs=None, interval=0.1, sub_id=0):
+        """Report queue depth of the pool when it or requests change
+
+        The pool is checked when the Executor collects messages, i.e. on
+        results and new commands, at most once per interval. A check
+        skipped by the interval is made again by a one-shot timer, so the
+        last depth is reported. Depth is also reported when requests were
+        added, since those may have been finished before the check.
+        """
+        self.pool_name = pool_name
+        self.msg_constructor = msg
+        self.msg_class = msg.__class__
+        self.msg_kwargs = msg_kwargs or dict()
+        self.msg_kwargs_info = tuple(self.msg_kwargs.items())
+        self.interval = interval
+        self.sub_id = sub_id
+        self.last_depth = 0
+        self.last_request_count = 0
+        self.last_time = 0
+        self.timer_id = None
+        super().__init__()
 
+    def on_timer(self, now):
+        self.timer_id = None
+        RESULT_NOTIFIER.notify()
 
-class NotifyOnceWorker(object):
-    def __init__(self):
-        self.last_time = time.time()
-        self.is_responsed = False
+    def done(self):
+        if self.timer_id is not None:
+            TIMER_SCHEDULER.remove_timer(self.timer_id)
+            self.timer_id = None
 
-    def get_response(self, request):  # request == interval sec
+    def get_message(self):
         now = time.time()
-        if now - self.last_time > request and self.is_responsed is False:
-            self.last_time = now
-            self.is_responsed = True
-            return True, now
-        else:
-            return False, now
-
-
-READ_IMAGE_WORKER_THREAD_POOL = list()
+        wait = self.last_time + self.interval - now
+        if wait > 0:
+            if self.timer_id is None:
+                self.timer_id = TIMER_SCHEDULER.add_timer(self.on_timer, wait)
+            return False, None
+        self.last_time = now
+        depth = WORKER_POOLS.get_queue_depth(self.pool_name)
+        request_count = WORKER_POOLS.get_request_count(self.pool_name)
+        dropped_keys = tuple(WORKER_POOLS.pop_dropped_keys(self.pool_name))
+        if depth == self.last_depth and not dropped_keys \
+                and request_count == self.last_request_count:
+            return False, None
+        self.last_depth = depth
+        self.last_request_count = request_count
+        msg = self.msg_constructor(
+            depth=depth, dropped_keys=dropped_keys, **self.msg_kwargs
+        )
+        return True, msg
 
 
-class ReadImageCommand(CommandWithThreadWorkerBase):
+class ReadImageCommand(PooledCommandBase):
+    pool_name = "read_image"
 
     def __init__(self, image_path, msg, msg_kwargs=None):
         self.msg_constructor = msg
         self.msg_kwargs = msg_kwargs or dict()
-        if len(READ_IMAGE_WORKER_THREAD_POOL) == 0:
-            worker = ReadImageWorker()
-            thread = BidirectionalStreamingThread(
-                worker=worker, auto_start=True, daemon=True
-            )
-            READ_IMAGE_WORKER_THREAD_POOL.append(thread)
-            READ_IMAGE_WORKER_THREAD_POOL[0] = thread
-        self.thread = READ_IMAGE_WORKER_THREAD_POOL[0]
         self.image_path = image_path
-        self._is_finished = False
-
-    def start(self):
-        req = self.image_path, self.msg_constructor, self.msg_kwargs
-        self.thread.add_request(req)
 
-    def is_done(self):
-        return self._is_finished
+    def get_worker_factory(self):
+        return ReadImageWorker
 
-    def done(self):
-        pass
+    def get_request(self):
+        return self.image_path, self.msg_constructor, self.msg_kwargs
 
-    def get_message(self):
-        flag, res = self.thread.get_response()
-        if flag:
-            msg, msg_kwargs, img_path, img = res
-            self._is_finished = True
-            return True, msg(
-                image=img, image_path=img_path, **msg_kwargs
-            )
-        else:
+    def get_message_from_response(self, is_succeeded, response):
+        if not is_succeeded:
             return False, None
+        msg, msg_kwargs, img_path, img = response
+        return True, msg(image=img, image_path=img_path, **msg_kwargs)
 
 
 class ReadImageWorker(object):
@@ -48,22 +48,93 @@ class MessageBase(object, metaclass=MetaEq):
         return msg
 
 
+# "module.UnionName.MessageName": message class
+MESSAGE_CLASSES = dict()
+
+
+def generate_init(slots):
+    """Generate `__init__` which sets slots without building dict
+
+    Values are taken as `MessageBase.__init__` does: by position or
+    keyword, a keyword wins over a position, surplus arguments (e.g.
+    `time` of notify_every) are ignored and a missing one is KeyError.
+    Only calls which mix positions and keywords, or give too few
+    positions, fall back to `MessageBase.__init__`.
+    """
+    by_position = "".join([
+        "        self.{} = _args[{}]\n".format(k, i)
+        for i, k in enumerate(slots)
+    ])
+    by_keyword = "".join([
+        "        self.{0} = _kwargs[{0!r}]\n".format(k) for k in slots
+    ])
+    src = (
+        "def __init__(self, *_args, **_kwargs):\n"
+        "    if not _kwargs and len(_args) >= {}:\n{}"
+        "    elif not _args:\n{}"
+        "    else:\n"
+        "        _init(self, *_args, **_kwargs)\n"
+    ).format(
+        len(slots), by_position or "        pass\n",
+        by_keyword or "        pass\n"
+    )
+    namespace = dict(_init=MessageBase.__init__)
+    exec(src, namespace)
+    return namespace["__init__"]
+
+
+def get_message_name(msg_cls):
+    """Key of MESSAGE_CLASSES, qualified by module to avoid collisions"""
+    return "{}.{}".format(msg_cls.__module__, msg_cls.__qualname__)
+
+
 class MetaMessage(type):  # Meta class
     id_count = 100
 
     def __new__(meta, name, bases, class_dict):
-        new_cls_dict = dict()
+        module = class_dict.get("__module__", __name__)
+        new_cls_dict = dict(__module__=module)
         for key, value in class_dict.items():
             if isinstance(value, Message):
-                new_cls_dict[key] = type(
+                msg_cls = type(
                     key, (MessageBase, ),
-                    {"__slots__": value.args, "identity": meta.id_count}
+                    {
+                        "__slots__": value.args,
+                        "__init__": generate_init(value.args),
+                        "__module__": module,
+                        "identity": meta.id_count
+                    }
                 )
+                msg_cls.__qualname__ = "{}.{}".format(name, key)
+                MESSAGE_CLASSES[get_message_name(msg_cls)] = msg_cls
+                new_cls_dict[key] = msg_cls
                 meta.id_count += 1
         cls = type.__new__(meta, name, bases, new_cls_dict)
         return cls
 
 
+def serialize_message(message):
+    """Convert message into picklable tuple (name, values)
+
+    The name is given by `get_message_name`. Objects which are not made
+    by `UnionMessage` are returned as is.
+    """
+    if isinstance(message, MessageBase):
+        values = tuple([getattr(message, k) for k in message.__slots__])
+        return get_message_name(message.__class__), values
+    return None, message
+
+
+def deserialize_message(name, values):
+    """Inverse of `serialize_message`, the message class must be imported"""
+    if name is None:
+        return values
+    msg_cls = MESSAGE_CLASSES.get(name, None)
+    if msg_cls is None:
+        raise KeyError("Unknown message {}".format(name))
+    return msg_cls(*values)
+
+
 class UnionMessage(object, metaclass=MetaMessage):
     Ok = Message("value")
     Err = Message("error")
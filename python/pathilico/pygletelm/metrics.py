@@ -0,0 +1,146 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""This module provides latency histograms for profiling message handling
+"""
+import time
+from collections import defaultdict
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, sub_bucket_bits=6, unit=1e-6):
+        """HDR style histogram which has log-linear buckets
+
+        Values are counted in `unit` (default: microsecond) and grouped
+        with relative error less than 2 ** (1 - sub_bucket_bits),
+        so memory usage does not depend on the number of records.
+
+        :param int sub_bucket_bits:
+        :param float unit: seconds per count unit
+        """
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.sub_bucket_bits = sub_bucket_bits
+        self.unit = unit
+        self.counts = defaultdict(int)  # bucket index: count
+        self.total_count = 0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+
+    def get_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self.half_count + (value >> shift)
+
+    def get_highest_equivalent_value(self, index):
+        if index < self.sub_bucket_count:
+            return index
+        shift = index // self.half_count - 1
+        top = index - shift * self.half_count
+        return ((top + 1) << shift) - 1
+
+    def record(self, sec):
+        value = int(sec / self.unit)
+        self.counts[self.get_index(value)] += 1
+        self.total_count += 1
+        self.total_sec += sec
+        if sec > self.max_sec:
+            self.max_sec = sec
+
+    def get_percentile(self, percentile):
+        """Return the value (sec) at given percentile (0 - 100)"""
+        if self.total_count == 0:
+            return 0.0
+        threshold = self.total_count * percentile / 100
+        count = 0
+        for index in sorted(self.counts.keys()):
+            count += self.counts[index]
+            if count >= threshold:
+                v = self.get_highest_equivalent_value(index) * self.unit
+                return min(v, self.max_sec)
+        return self.max_sec
+
+    def get_mean(self):
+        if self.total_count == 0:
+            return 0.0
+        return self.total_sec / self.total_count
+
+
+class MessageLatencyStats(object):
+    phases = ("update", "view", "handlers")
+    percentiles = (50, 95, 99)
+
+    def __init__(self):
+        """Latency histograms for each message class and phase"""
+        self.histograms = dict()  # (message name, phase): LatencyHistogram
+        self.start_time = time.time()
+
+    @staticmethod
+    def get_message_name(message):
+        cls = message.__class__
+        return getattr(cls, "__qualname__", cls.__name__)
+
+    def record(self, message, **phase_secs):
+        name = self.get_message_name(message)
+        for phase, sec in phase_secs.items():
+            key = (name, phase)
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            self.histograms[key].record(sec)
+
+    def clear(self):
+        self.histograms = dict()
+        self.start_time = time.time()
+
+    def get_summary(self):
+        """Return list of (name, phase, count, mean, p50, p95, p99, max)
+
+        Sorted by the total time of the message in descending order,
+        values are in milliseconds.
+        """
+        totals = defaultdict(float)
+        for (name, _), h in self.histograms.items():
+            totals[name] += h.total_sec
+        result = list()
+        for (name, phase), h in self.histograms.items():
+            row = (
+                name, phase, h.total_count, h.get_mean() * 1000,
+                *[h.get_percentile(p) * 1000 for p in self.percentiles],
+                h.max_sec * 1000
+            )
+            result.append(row)
+        order = {p: i for i, p in enumerate(self.phases)}
+        result.sort(
+            key=lambda r: (-totals[r[0]], r[0], order.get(r[1], len(order)))
+        )
+        return result
+
+    def dump(self):
+        """Formatted table of `get_summary`"""
+        header = "{:<40} {:<8} {:>7} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            "message", "phase", "count", "mean", "p50", "p95", "p99", "max"
+        )
+        lines = [
+            "Latency (ms) for {:.1f} sec".format(
+                time.time() - self.start_time),
+            header
+        ]
+        for row in self.get_summary():
+            lines.append(
+                "{:<40} {:<8} {:>7} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} "
+                "{:>8.2f}".format(*row)
+            )
+        return "\n".join(lines)
@@ -1439,12 +1439,19 @@ class Provider(object):
         self.event_manager = EventManager(self.window_api_handler, self.proxy)
         self.proxy.view_handlers.register(self.handle_view)
         self.window_obj.push_handlers(self.window_api_handler)
+        self.last_view_result = None
 
     def handle_view(self, view_result):
         """Handling the return value of view
 
+        Diffing is skipped when `view` returns the same object as the last
+        call (e.g. memoized by version counters of the model).
+
         :param View view_result:
         """
+        if view_result is self.last_view_result:
+            return
+        self.last_view_result = view_result
         drawings = view_result.drawings
         self.graphic_manager.update_drawings(drawings)
         events = view_result.events
@@ -71,6 +71,7 @@ def main():
             exclude=["*.tests", "*.test.*", "tests.*", "tests", "legacy"]
         ),
         license='Apache License 2.0',
+        python_requires=">=3.8",
         install_requires=REQUIRED_PACKAGES,
         include_package_data=True,
     )
@@ -0,0 +1,34 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import sys
+import time
+
+from pathilico.misc.behavior_tools import *
+
+
+def replay(log_path):
+    load_dependencies()
+    behavior = ScheduledBehavior.from_message_log(log_path)
+    start = time.time()
+    behavior.replay(init=init_model, update=update, view=view)
+    elapsed = time.time() - start
+    print("Replayed {} messages in {:.3f} sec".format(
+        len(behavior.schedules), elapsed
+    ))
+
+
+if __name__ == "__main__":
+    # Record a session with `pathilico.app.main.main(record_path=...)`
+    replay(sys.argv[1])
@@ -0,0 +1,88 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Compare per-tile and coalesced read_region on a slide
+
+Usage: python speed_test_read_region.py SLIDE_PATH [LEVEL] [REPEAT]
+"""
+import sys
+import time
+
+import openslide
+
+import pathilico.app.port as port
+import pathilico.app.ports.region_block as region_block
+
+
+TILE_SIZE = (1024, 1024)
+NUM_TILES = (4, 4)
+
+
+def get_regions(level, origin, downsamples):
+    scale = downsamples[level]
+    step_x, step_y = TILE_SIZE[0] * scale, TILE_SIZE[1] * scale
+    return [
+        ((origin[0] + c * step_x, origin[1] + r * step_y), level, TILE_SIZE)
+        for r in range(NUM_TILES[1]) for c in range(NUM_TILES[0])
+    ]
+
+
+def read_per_tile(file_path, regions):
+    worker = port.OpenSlideWorker(file_path)
+    start = time.perf_counter()
+    for r in regions:
+        worker.get_response(r)
+    elapsed = time.perf_counter() - start
+    worker.close()
+    return elapsed
+
+
+def read_coalesced(file_path, regions, downsamples, max_size):
+    worker = port.OpenSlideWorker(file_path)
+    blocks = region_block.coalesce_regions(regions, downsamples, max_size)
+    start = time.perf_counter()
+    for loc, lev, size, tiles in blocks:
+        worker.get_response((
+            loc, lev, size, TILE_SIZE,
+            tuple([(regions[i][0], offset) for i, offset in tiles])
+        ))
+    elapsed = time.perf_counter() - start
+    worker.close()
+    return elapsed
+
+
+def main():
+    file_path = sys.argv[1]
+    level = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    slide = openslide.OpenSlide(file_path)
+    downsamples = [int(d) for d in slide.level_downsamples]
+    w, h = slide.level_dimensions[0]
+    slide.close()
+    for i in range(repeat):
+        # Other regions each time, each reader has its own OpenSlide
+        # handle, but the second one may hit the page cache of OS
+        origin = (w // 8 + i * w // 16, h // 8 + i * h // 16)
+        regions = get_regions(level, origin, downsamples)
+        per_tile = read_per_tile(file_path, regions)
+        results = [
+            read_coalesced(file_path, regions, downsamples, max_size)
+            for max_size in [(2048, 2048), (4096, 4096)]
+        ]
+        print("per tile {:.3f} sec, coalesced 2048: {:.3f} sec, "
+              "4096: {:.3f} sec".format(per_tile, *results))
+
+
+if __name__ == "__main__":
+    main()
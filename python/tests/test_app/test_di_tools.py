@@ -0,0 +1,65 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+
+def load_app_modules():
+    import pathilico.app.header as _
+    import pathilico.app.pathology as _
+    import pathilico.app.position as _
+    import pathilico.app.zone as _
+    import pathilico.app.resource as _
+    import pathilico.app.ux as _
+    import pathilico.app.user as _
+    import pathilico.app.annotation as _
+    import pathilico.app.data as _
+    import pathilico.app.menu as _
+    import pathilico.app.version as _
+
+
+class TestFreeze(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        from pathilico.app.di_tools import InterfaceBase
+
+        class MockApi(InterfaceBase):
+            pass
+        return MockApi
+
+    def testBindInjectedFunctions(self):
+        from pathilico.app.di_tools import INJECTED_METHODS
+        load_app_modules()
+        api = self._getTargetCls()
+        api.freeze()
+        self.assertIs(
+            INJECTED_METHODS["get_window_width_and_height"],
+            api.get_window_width_and_height
+        )
+
+    def testRaiseIfNotInjected(self):
+        from pathilico.app.di_tools import declare_method, \
+            DECLARED_METHODS, NotInjectedError
+        load_app_modules()
+
+        @declare_method
+        def mock_not_injected_method():
+            pass
+        try:
+            api = self._getTargetCls()
+            with self.assertRaises(NotInjectedError):
+                api.freeze()
+        finally:
+            DECLARED_METHODS.discard("mock_not_injected_method")
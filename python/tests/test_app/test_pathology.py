@@ -0,0 +1,72 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+
+class TestSelectPlaceholderTiles(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.pathology import select_placeholder_tiles as f
+        return f
+
+    def testFinerTilesAreUsedFirst(self):
+        func = self.getTargetFunc()
+        missing = [(0, 0), (100, 0), (200, 0)]
+        coarser = [
+            (0, 0, "level1_a", 2), (400, 0, "level1_b", 2),
+            (0, 0, "level2", 4)
+        ]
+        result = func(missing, coarser, (100, 100))
+        self.assertEqual(
+            [(0, 0, "level2", 4), (0, 0, "level1_a", 2)], result
+        )
+
+    def testNothingCoversMissingTiles(self):
+        func = self.getTargetFunc()
+        result = func([(0, 0)], [(200, 0, "level1", 2)], (100, 100))
+        self.assertEqual(list(), result)
+
+
+class TestGetTileIndicesInBound(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.pathology import get_tile_indices_in_bound as f
+        return f
+
+    def testOverlappingTilesInRowMajorOrder(self):
+        func = self.getTargetFunc()
+        result = func((150, 50, 300, 150, 0), (100, 100), (1000, 1000))
+        self.assertEqual([(1, 0), (2, 0), (1, 1), (2, 1)], result)
+
+    def testBoundIsClippedByTheGrid(self):
+        func = self.getTargetFunc()
+        # 250 x 120 level has 3 x 2 tiles including partial ones
+        result = func((-500, -500, 5000, 5000, 0), (100, 100), (250, 120))
+        self.assertEqual(6, len(result))
+        self.assertEqual((2, 1), result[-1])
+        self.assertEqual(
+            list(), func((100, 0, 100, 50, 0), (100, 100), (250, 120))
+        )
+
+
+class TestPackTileKey(unittest.TestCase):
+    def getTargetFuncs(self):
+        from pathilico.app.pathology import pack_tile_key, unpack_tile_key
+        return pack_tile_key, unpack_tile_key
+
+    def testRoundTrip(self):
+        pack, unpack = self.getTargetFuncs()
+        key = pack(3, "grouped_annotation", 2, 97, 12345)
+        self.assertEqual((2, 97, 12345, 3), unpack(key))
+        self.assertNotEqual(key, pack(3, "pathology", 2, 97, 12345))
+        self.assertNotEqual(key, pack(4, "grouped_annotation", 2, 97, 12345))
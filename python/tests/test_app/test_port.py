@@ -0,0 +1,109 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import time
+import tempfile
+import unittest
+
+try:
+    import openslide
+except (ImportError, OSError):  # libopenslide is not installed
+    openslide = None
+
+
+@unittest.skipIf(openslide is None, "port needs OpenSlide")
+class TestConfigureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+    def tearDown(self):
+        import pathilico.app.port as port
+        port.configure_cache(None, port.tile_cache.TILE_CACHE_MAX_BYTES)
+        self.tmp_dir.cleanup()
+
+    def getTargetFunc(self):
+        from pathilico.app.port import configure_cache as f
+        return f
+
+    def getCachePath(self):
+        import pathilico.app.port as port
+        cmd = port.ReadRegionFromPathologySlide(
+            "a.svs", (0, 0), 0, (8, 8), dict
+        )
+        return cmd.get_worker_factory().keywords["cache_path"]
+
+    def getIndexPath(self):
+        import pathilico.app.port as port
+        cmd = port.GetSlideInfo("a.svs", dict)
+        return cmd.get_worker_factory().keywords["index_path"]
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.getCachePath())
+        self.assertIsNone(self.getIndexPath())
+
+    def test_slide_index_shares_directory(self):
+        self.getTargetFunc()(self.cache_dir)
+        self.assertEqual(self.cache_dir, os.path.dirname(self.getIndexPath()))
+        self.assertNotEqual(self.getCachePath(), self.getIndexPath())
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_directory_is_made_by_worker(self):
+        import pathilico.app.port as port
+        self.getTargetFunc()(self.cache_dir, tile_cache_max_bytes=1024)
+        path = self.getCachePath()
+        self.assertEqual(self.cache_dir, os.path.dirname(path))
+        self.assertEqual(1024, port.PATHOLOGY_TILE_CACHE_MAX_BYTES)
+        self.assertFalse(os.path.exists(self.cache_dir))
+        port.tile_cache.TileCache(path).close()
+        self.assertTrue(os.path.isfile(path))
+
+
+class MockSlowReader(object):
+
+    def get_response(self, request):
+        time.sleep(request)
+        return True, request
+
+
+@unittest.skipIf(openslide is None, "port needs OpenSlide")
+class TestReaderPoolBalance(unittest.TestCase):
+
+    def getPool(self, service):
+        import pathilico.app.port as port
+        cmd = port.ReadRegionFromPathologySlide(
+            "a.svs", (0, 0), 0, (8, 8), dict, num_workers=2
+        )
+        return service.get_pool(
+            port.PATHOLOGY_READER_POOL_NAME, MockSlowReader,
+            key=cmd.get_worker_key(), **cmd.get_pool_options()
+        )
+
+    def test_idle_reader_takes_requests_behind_slow_one(self):
+        from pathilico.pygletelm.effect import WorkerPoolService
+        service = WorkerPoolService()
+        pool = self.getPool(service)
+        results = list()
+        for sec in [0.5] + [0.02] * 6:
+            pool.add_request(sec, lambda f, r: results.append(r))
+        limit = time.time() + 10
+        while len(results) < 7 and time.time() < limit:
+            pool.collect_responses()
+            time.sleep(0.01)
+        stats = pool.get_worker_stats()
+        service.shutdown()
+        self.assertEqual([0.02] * 6 + [0.5], results)
+        self.assertEqual([1, 6], sorted([row[2] for row in stats]))
@@ -101,3 +101,40 @@ class TestEnlarge(unittest.TestCase):
         self.assertEqual(16, actual.x)
         self.assertEqual(16, actual.y)
         self.assertEqual(0, actual.level)
+
+
+class TestGetPrefetchBoundsAround(unittest.TestCase):
+
+    def getTargetFunction(self):
+        from pathilico.app.position import get_prefetch_bounds_around as f
+        return f
+
+    def getPositionModel(self):
+        from pathilico.app.position import PositionModel as cls
+        return cls
+
+    def testReadAheadToPanDirection(self):
+        from pathilico.app.position import move
+        func = self.getTargetFunction()
+        model = self.getPositionModel()()
+        model.level = 1
+        model.prefetch_margin = 10
+        model.prefetch_lookahead = 4
+        model = move(model, -20, 0)  # Dragged to the left, view goes right
+        ds = [1, 4, 16]
+        lead, ring, upper, lower = func(model, 100, 50, ds)
+        self.assertEqual((60, 0, 160, 50, 1), lead)
+        self.assertEqual((10, -10, 130, 60, 1), ring)
+        self.assertEqual(0, upper[-1])
+        self.assertEqual(2, lower[-1])
+
+    def testZoomDirectionAndFocusComeFirst(self):
+        from pathilico.app.position import shrink
+        func = self.getTargetFunction()
+        model = self.getPositionModel()()
+        ds = [1, 4, 16]
+        model = shrink(model, 40, 20, ds)
+        _, _, next_zoom, back_zoom = func(model, 100, 50, ds)
+        # Shrink again at (40, 20), or enlarge back to the previous view
+        self.assertEqual((-38, -19, 62, 31, 2), next_zoom)
+        self.assertEqual((0, 0, 100, 50, 0), back_zoom)
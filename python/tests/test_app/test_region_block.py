@@ -0,0 +1,71 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+
+class TestCoalesceRegions(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.ports.region_block import coalesce_regions as f
+        return f
+
+    def testAdjacentTilesAreReadAsBlocks(self):
+        func = self.getTargetFunc()
+        # 3 x 2 tiles on level 1 (downsample 4), y has an offset
+        regions = [
+            ((x * 400, 100 + y * 400), 1, (100, 100))
+            for y in range(2) for x in range(3)
+        ]
+        regions.append(((0, 0), 0, (100, 100)))
+        blocks = func(regions, [1, 4], max_size=(200, 200))
+        self.assertEqual(
+            [
+                ((0, 100), 1, (200, 200),
+                 ((0, (0, 0)), (1, (100, 0)), (3, (0, 100)), (4, (100, 100)))),
+                ((800, 100), 1, (100, 200), ((2, (0, 0)), (5, (0, 100)))),
+                ((0, 0), 0, (100, 100), ((6, (0, 0)), ))
+            ],
+            blocks
+        )
+
+    def testEveryRegionIsReadOnce(self):
+        func = self.getTargetFunc()
+        regions = [
+            ((0, 0), 0, (100, 100)), ((200, 0), 0, (100, 100)),
+            ((0, 0), 0, (100, 100)), ((100, 100), 0, (100, 100))
+        ]
+        blocks = func(regions, [1], max_size=(1000, 1000))
+        self.assertEqual(4, len(blocks))
+        indices = sorted([i for b in blocks for i, _ in b[3]])
+        self.assertEqual([0, 1, 2, 3], indices)
+
+
+class TestSplitBlockImage(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.ports.region_block import split_block_image as f
+        return f
+
+    def testSplitByOffsets(self):
+        from PIL import Image
+        func = self.getTargetFunc()
+        block = Image.new("RGBA", (4, 2), (0, 0, 0, 255))
+        block.putpixel((2, 1), (9, 9, 9, 255))
+        tiles = func(block, [(0, 0), (2, 0)], (2, 2))
+        self.assertEqual([(2, 2), (2, 2)], [t.size for t in tiles])
+        self.assertEqual((0, 0, 0, 255), tiles[0].getpixel((0, 1)))
+        self.assertEqual((9, 9, 9, 255), tiles[1].getpixel((0, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
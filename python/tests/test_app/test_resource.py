@@ -117,13 +117,101 @@ class TestCombinedResourceOperations(unittest.TestCase):
         self.assertTrue(mock_id in model.images)
 
 
+class TestCancelRequests(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.resource import cancel_requests as f
+        return f
 
+    def getRequestQueries(self):
+        from pathilico.app.resource import request_queries as f
+        return f
 
+    def createResourceModel(self):
+        from pathilico.app.resource import ResourceModel
+        m = ResourceModel()
+        return m
 
+    def testCancelledQueryIsRequestedAgain(self):
+        model = self.createResourceModel()
+        func = self.getTargetFunc()
+        get_request = self.getRequestQueries()
+        model.queries = {1: "read 1", 2: "read 2"}
+        model, _, _ = get_request(model, [1, 2])
+        model = func(model, [2])
+        self.assertEqual({1}, model.requesting)
+        model, r_ids, r_queries = get_request(model, [1, 2])
+        self.assertEqual([2], r_ids)
+        self.assertEqual(["read 2"], r_queries)
+
+
+class TestRequestQueriesWithLimit(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.resource import request_queries as f
+        return f
+
+    def getCapacityFunc(self):
+        from pathilico.app.resource import get_request_capacity as f
+        return f
+
+    def createResourceModel(self):
+        from pathilico.app.resource import ResourceModel
+        m = ResourceModel()
+        return m
 
+    def testQueriesOverCapacityAreHeldBack(self):
+        model = self.createResourceModel()
+        func = self.getTargetFunc()
+        get_capacity = self.getCapacityFunc()
+        model.max_queue_depth = 5
+        model.queue_depths["pathology"] = 3
+        model.queries = {i: "read {}".format(i) for i in range(4)}
+        capacity = get_capacity(model, "pathology")
+        self.assertEqual(2, capacity)
+        model, r_ids, _ = func(model, range(4), limit=capacity)
+        self.assertEqual([0, 1], r_ids)
+        model, r_ids, _ = func(model, range(4))
+        self.assertEqual([2, 3], r_ids)
+        self.assertEqual(5, get_capacity(model, "grouped_annotation"))
+
+
+class TestGetPrefetchCapacity(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.resource import get_prefetch_capacity as f
+        return f
 
+    def createResourceModel(self):
+        from pathilico.app.resource import ResourceModel
+        m = ResourceModel()
+        return m
 
+    def testShownImagesAreNotEvicted(self):
+        model = self.createResourceModel()
+        func = self.getTargetFunc()
+        model.num_max_images = 40
+        model.max_prefetch_images = 16
+        self.assertEqual(16, func(model, 10))
+        self.assertEqual(5, func(model, 35))
+        self.assertEqual(0, func(model, 50))
 
 
+class TestDeleteExcept(unittest.TestCase):
+    def getTargetFunc(self):
+        from pathilico.app.resource import delete_except as f
+        return f
 
+    def createResourceModel(self):
+        from pathilico.app.resource import ResourceModel
+        m = ResourceModel()
+        return m
 
+    def testOnlyKeptIdsRemain(self):
+        model = self.createResourceModel()
+        func = self.getTargetFunc()
+        model.queries = {i: "read {}".format(i) for i in range(6)}
+        model.requesting = {1, 4}
+        for i in (0, 3):
+            model.images[i] = "image {}".format(i)
+        model = func(model, lambda i: i >= 3)
+        self.assertEqual([3, 4, 5], sorted(model.queries.keys()))
+        self.assertEqual({4}, model.requesting)
+        self.assertEqual([3], list(model.images.keys()))
@@ -0,0 +1,67 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import tempfile
+import unittest
+
+
+class TestSlideIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp_dir.name, "slides.sqlite3")
+        self.slide_path = os.path.join(self.tmp_dir.name, "a.svs")
+        with open(self.slide_path, "wb") as f:
+            f.write(b"abc")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def createSlideIndex(self):
+        from pathilico.app.ports.slide_index import SlideIndex
+        return SlideIndex(self.index_path)
+
+    def getStampFunc(self):
+        from pathilico.app.ports.slide_index import get_file_stamp as f
+        return f
+
+    def testRoundTripAcrossConnections(self):
+        get_stamp = self.getStampFunc()
+        info = dict(
+            level_count=2, level_dimensions=((400, 200), (100, 50)),
+            level_downsamples=(1.0, 4.0)
+        )
+        index = self.createSlideIndex()
+        stamp = get_stamp(self.slide_path)
+        self.assertIsNone(index.get(self.slide_path, stamp))
+        index.put(self.slide_path, stamp, info)
+        index.close()
+        index = self.createSlideIndex()
+        self.assertEqual(info, index.get(self.slide_path, stamp))
+        index.close()
+
+    def testChangedFileIsNotFound(self):
+        get_stamp = self.getStampFunc()
+        index = self.createSlideIndex()
+        index.put(self.slide_path, get_stamp(self.slide_path), dict())
+        with open(self.slide_path, "ab") as f:
+            f.write(b"d")
+        stamp = get_stamp(self.slide_path)
+        self.assertIsNone(index.get(self.slide_path, stamp))
+        index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
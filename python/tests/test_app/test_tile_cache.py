@@ -0,0 +1,96 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import time
+import tempfile
+import unittest
+
+from PIL import Image
+
+
+class TestTileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "tiles.sqlite3")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def createTileCache(self, max_bytes=1024 ** 2):
+        from pathilico.app.ports.tile_cache import TileCache
+        return TileCache(self.cache_path, max_bytes)
+
+    def testRoundTripAcrossConnections(self):
+        cache = self.createTileCache()
+        img = Image.new("RGBA", (16, 8), (1, 2, 3, 4))
+        self.assertIsNone(cache.get("fp", 0, (32, 64), (16, 8)))
+        cache.put("fp", 0, (32, 64), img)
+        cache.close()
+        cache = self.createTileCache()
+        actual = cache.get("fp", 0, (32, 64), (16, 8))
+        self.assertEqual(img.tobytes(), actual.tobytes())
+        self.assertIsNone(cache.get("fp", 1, (32, 64), (16, 8)))
+        self.assertIsNone(cache.get("other", 0, (32, 64), (16, 8)))
+        self.assertIsNone(cache.get("fp", 0, (32, 64), (8, 8)))
+        cache.close()
+
+    def testEvictLeastRecentlyUsed(self):
+        import random
+        rand = random.Random(0)
+        tiles = [
+            Image.frombytes(
+                "L", (32, 32), bytes(rand.getrandbits(8) for _ in range(1024))
+            ) for _ in range(3)
+        ]
+        cache = self.createTileCache()
+        for i, img in enumerate(tiles):
+            cache.put("fp", 0, (i, 0), img)
+            time.sleep(0.01)
+        cache.max_bytes = cache.get_total_bytes() - 1
+        cache.get("fp", 0, (0, 0), (32, 32))  # Used recently
+        cache.put("fp", 0, (0, 0), tiles[0])
+        self.assertIsNotNone(cache.get("fp", 0, (0, 0), (32, 32)))
+        self.assertIsNone(cache.get("fp", 0, (1, 0), (32, 32)))
+        self.assertIsNotNone(cache.get("fp", 0, (2, 0), (32, 32)))
+        self.assertLessEqual(cache.get_total_bytes(), cache.max_bytes)
+        cache.close()
+
+    def testTotalBytesFollowReplacedTiles(self):
+        cache = self.createTileCache()
+        cache.put("fp", 0, (0, 0), Image.new("L", (32, 32), 1))
+        cache.put("fp", 0, (1, 0), Image.new("L", (32, 32), 2))
+        cache.put("fp", 0, (0, 0), Image.new("L", (64, 64), 3))
+        expected = cache.connection.execute(
+            "SELECT SUM(num_bytes) FROM tiles"
+        ).fetchone()[0]
+        self.assertEqual(expected, cache.get_total_bytes())
+        cache.close()
+        self.assertEqual(expected, self.createTileCache().get_total_bytes())
+
+    def testFingerprintChangesWithFile(self):
+        from pathilico.app.ports.tile_cache import get_slide_fingerprint
+        slide_path = os.path.join(self.tmp_dir.name, "a.svs")
+        with open(slide_path, "wb") as f:
+            f.write(b"abc")
+        before = get_slide_fingerprint(slide_path)
+        self.assertEqual(before, get_slide_fingerprint(slide_path))
+        with open(slide_path, "ab") as f:
+            f.write(b"d")
+        self.assertNotEqual(before, get_slide_fingerprint(slide_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+try:
+    import openslide
+except (ImportError, OSError):  # libopenslide is not installed
+    openslide = None
+
+
+def create_model():
+    # Same as pathilico.app.main.load_dependencies, without views
+    import pathilico.app.pathology as _
+    import pathilico.app.position as _
+    import pathilico.app.zone as _
+    import pathilico.app.resource as _
+    import pathilico.app.ux as _
+    import pathilico.app.user as _
+    import pathilico.app.annotation as _
+    import pathilico.app.data as _
+    import pathilico.app.menu as _
+    import pathilico.app.version as _
+    from pathilico.app.model import Model
+    return Model()
+
+
+@unittest.skipIf(openslide is None, "port needs OpenSlide")
+class TestUpdate(unittest.TestCase):
+    """Smoke test of the app wiring, from opening a slide to moving"""
+
+    def getTargetFunc(self):
+        from pathilico.app.update import update as f
+        return f
+
+    def testOpenSlideAndMove(self):
+        from pathilico.app.message import Msg
+        from pathilico.app.header import Api
+        update = self.getTargetFunc()
+        model = create_model()
+        model, cmds = update(Msg.FileSelected(path="a.svs"), model)
+        self.assertEqual(1, len(cmds.effects))
+        model, cmds = update(Msg.SlideInfoAcquired(
+            level_count=2, level_dimensions=((4096, 4096), (1024, 1024)),
+            file_path="a.svs", file_name="a.svs",
+            level_downsamples=(1.0, 4.0), mtime=123
+        ), model)
+        self.assertEqual("a.svs", Api.get_file_path(model))
+        self.assertEqual(123, Api.get_file_mtime(model))
+        self.assertGreater(len(cmds.effects), 0)
+        model, cmds = update(Msg.Move(dx=100, dy=50), model)
+        model, cmds = update(Msg.ImageQueueChanged(
+            data_type="pathology", depth=0, dropped_keys=tuple()
+        ), model)
+        model, cmds = update(Msg.PathologyRegionsAcquired(messages=[]), model)
+        self.assertEqual(0, len(cmds.effects))
+
+    def testQueueChangeIssuesQueriesOnlyWhenCapacityFrees(self):
+        from pathilico.app.message import Msg
+        update = self.getTargetFunc()
+        model = create_model()
+        model.resource.max_queue_depth = 2
+        model, _ = update(Msg.SlideInfoAcquired(
+            level_count=1, level_dimensions=((4096, 4096), ),
+            file_path="a.svs", file_name="a.svs", level_downsamples=(1.0, ),
+            mtime=123
+        ), model)
+        versions = dict(model.versions)
+        changed = Msg.ImageQueueChanged
+        model, cmds = update(changed("pathology", 2, tuple()), model)
+        self.assertEqual(0, len(cmds.effects))
+        self.assertEqual(versions, model.versions)
+        model, cmds = update(Msg.Move(dx=-2000, dy=-2000), model)
+        self.assertEqual(0, len(cmds.effects))  # Held back
+        model, cmds = update(changed("pathology", 1, tuple()), model)
+        self.assertGreater(len(cmds.effects), 0)
+
+
+    def testQueriesOfPreviousSlideAreDeleted(self):
+        from pathilico.app.message import Msg
+        from pathilico.app.header import Api
+        update = self.getTargetFunc()
+        model = create_model()
+        for name in ("a.svs", "b.svs"):
+            model, _ = update(Msg.SlideInfoAcquired(
+                level_count=1, level_dimensions=((4096, 4096), ),
+                file_path=name, file_name=name, level_downsamples=(1.0, ),
+                mtime=123
+            ), model)
+        slide_index = Api.get_slide_index(model)
+        self.assertGreater(len(model.resource.queries), 0)
+        for object_id in model.resource.queries:
+            self.assertEqual(
+                slide_index, Api.unpack_tile_key(object_id)[3]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
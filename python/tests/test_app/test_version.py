@@ -0,0 +1,88 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+
+def create_model():
+    import pathilico.app.pathology as _
+    import pathilico.app.position as _
+    import pathilico.app.zone as _
+    import pathilico.app.resource as _
+    import pathilico.app.ux as _
+    import pathilico.app.user as _
+    import pathilico.app.annotation as _
+    import pathilico.app.data as _
+    import pathilico.app.menu as _
+    import pathilico.app.version as _
+    from pathilico.app.model import Model
+    return Model()
+
+
+class TestModelVersions(unittest.TestCase):
+
+    def createModel(self):
+        return create_model()
+
+    def getTargetFunc(self):
+        from pathilico.app.version import get_submodel_versions as f
+        return f
+
+    def testAssignmentBumpsVersion(self):
+        model = self.createModel()
+        func = self.getTargetFunc()
+        before = func(model, ("position", "ux"))
+        model.position = model.position
+        after = func(model, ("position", "ux"))
+        self.assertEqual(before[0] + 1, after[0])
+        self.assertEqual(before[1], after[1])
+
+    def testApiMutationBumpsVersion(self):
+        from pathilico.app.header import Api
+        model = self.createModel()
+        func = self.getTargetFunc()
+        before = func(model, ("ux", "user"))
+        model = Api.start_delete_drag(model, 10, 20)
+        model = Api.update_annotation_mode(model, "point")
+        after = func(model, ("ux", "user"))
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+
+
+class TestMemoizeByVersions(unittest.TestCase):
+
+    def createModel(self):
+        return create_model()
+
+    def getTargetDecorator(self):
+        from pathilico.app.version import memoize_by_versions as f
+        return f
+
+    def testReuseResultUntilSubmodelChanges(self):
+        memoize_by_versions = self.getTargetDecorator()
+        model = self.createModel()
+        calls = list()
+
+        @memoize_by_versions("position")
+        def mock_view(m):
+            calls.append(m.position.x)
+            return m.position.x
+
+        self.assertEqual(0, mock_view(model))
+        model.ux = model.ux
+        self.assertEqual(0, mock_view(model))
+        self.assertEqual(1, len(calls))
+        model.position = model.position
+        mock_view(model)
+        self.assertEqual(2, len(calls))
@@ -69,6 +69,89 @@ class TestProxyBeginnerBackend(unittest.TestCase):
 
 
 
+class TestMessageRecorder(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        from pathilico.pygletelm.backend import MessageRecorder as cls
+        return cls
+
+    @staticmethod
+    def _getReadFunc():
+        from pathilico.pygletelm.backend import read_message_log as f
+        return f
+
+    def test_record_and_read(self):
+        import os
+        import tempfile
+        from pathilico.pygletelm.message import UnionMessage, Message
+
+        class RecordMsg(UnionMessage):
+            Hoge = Message("foo")
+            Fuga = Message("foo", "bar")
+
+        log_path = os.path.join(tempfile.mkdtemp(), "messages.log.gz")
+        recorder = self._getTargetCls()(
+            log_path, skip_messages=(RecordMsg.Fuga, )
+        )
+        recorder.record(RecordMsg.Hoge(1))
+        recorder.record(RecordMsg.Fuga(2, 3))
+        recorder.record(RecordMsg.Hoge(4))
+        recorder.close()
+        result = list(self._getReadFunc()(log_path))
+        self.assertEqual(2, len(result))
+        self.assertTrue(all([m == RecordMsg.Hoge for _, m in result]))
+        self.assertEqual([1, 4], [m.foo for _, m in result])
+        self.assertLessEqual(result[0][0], result[1][0])
+
+    def test_images_are_recorded_as_stand_ins(self):
+        import os
+        import tempfile
+        from PIL import Image
+        from pathilico.pygletelm.backend import ImageStandIn
+        from pathilico.pygletelm.message import UnionMessage, Message
+
+        class ImageMsg(UnionMessage):
+            Image = Message("image")
+            Batch = Message("messages")
+            Points = Message("points")
+
+        img = Image.new("RGBA", (4, 3))
+        log_path = os.path.join(tempfile.mkdtemp(), "messages.log.gz")
+        recorder = self._getTargetCls()(log_path)
+        recorder.record(ImageMsg.Image(img))
+        recorder.record(ImageMsg.Batch([ImageMsg.Image(img)]))
+        recorder.record(ImageMsg.Points([1, 2, 3]))
+        recorder.close()
+        result = [m for _, m in self._getReadFunc()(log_path)]
+        self.assertEqual(3, len(result))
+        self.assertIsInstance(result[0].image, ImageStandIn)
+        self.assertEqual(ImageMsg.Image, result[1].messages[0])
+        stand_in = result[1].messages[0].image
+        self.assertEqual(("RGBA", (4, 3)), (stand_in.mode, stand_in.size))
+        self.assertEqual([1, 2, 3], result[2].points)
+
+    def test_stand_ins_are_read_as_blank_images(self):
+        import os
+        import tempfile
+        from PIL import Image
+        from pathilico.pygletelm.message import UnionMessage, Message
+
+        class ImageMsg(UnionMessage):
+            Image = Message("image")
+            Batch = Message("messages")
+
+        img = Image.new("RGB", (5, 2), color=(255, 0, 0))
+        log_path = os.path.join(tempfile.mkdtemp(), "messages.log.gz")
+        recorder = self._getTargetCls()(log_path)
+        recorder.record(ImageMsg.Batch([ImageMsg.Image(img)]))
+        recorder.close()
+        result = list(self._getReadFunc()(log_path, blank_images=True))
+        msg = result[0][1].messages[0]
+        self.assertEqual(ImageMsg.Image, msg)
+        self.assertIsInstance(msg.image, Image.Image)
+        self.assertEqual(("RGB", (5, 2)), (msg.image.mode, msg.image.size))
+        self.assertEqual((0, 0, 0), msg.image.getpixel((0, 0)))
 
 if __name__ == "__main__":
     unittest.main()
@@ -13,6 +13,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 import time
+import threading
+import unittest
+from unittest import mock
+
+import pyglet
 
 import pathilico.pygletelm.backend as backend
 import pathilico.pygletelm.effect as effect
@@ -73,17 +78,800 @@ def functional_test_notify_every_sec():
     handler = b_end.effect_executor
     for i in range(50):
         time.sleep(0.1)
-        handler.collect_sub_msg(0.5)
+        pyglet.clock.tick()
     print("=================================")
     flag[0] = 1
     for i in range(60):
         time.sleep(0.1)
-        handler.collect_sub_msg(0.5)
+        pyglet.clock.tick()
     print("=================================")
     flag[0] = 2
     for i in range(50):
         time.sleep(0.1)
-        handler.collect_sub_msg(0.5)
+        pyglet.clock.tick()
+
+
+class MockProxy(object):
+
+    def __init__(self):
+        self.sub_handlers = backend.FunctionRegistry()
+        self.cmd_handlers = backend.FunctionRegistry()
+        self.messages = list()
+
+    def push_message(self, msg):
+        self.messages.append(msg)
+
+
+class MockCommand(effect.CommandBase):
+
+    def __init__(self, results):
+        self.results = list(results)
+
+    def start(self):
+        pass
+
+    def is_done(self):
+        return len(self.results) == 0
+
+    def get_message(self):
+        if self.results:
+            return True, self.results.pop(0)
+        return False, None
+
+
+class TestExecutorCollectCmdMsg(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        return effect.Executor
+
+    def testDrainAllReadyResultsInOneTick(self):
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, time_budget=10)
+        cmds = [MockCommand([i, i + 10]) for i in range(30)]
+        executor.add_command_effects(cmds[:-1] + [MockCommand([])])
+        executor.collect_cmd_msg(0)
+        self.assertEqual(58, len(proxy.messages))
+        self.assertEqual(list(), executor.commands)
+
+    def testPooledCommandIsRemovedOnResponse(self):
+        class MockPooledCommand(effect.PooledCommandBase):
+            def __init__(self, value):
+                self.value = value
+
+            def get_pool(self):
+                return effect.WORKER_POOLS.get_pool(
+                    "mock_double", MockDoubleWorker
+                )
+
+            def get_request(self):
+                return self.value
+
+            def get_message_from_response(self, is_succeeded, response):
+                return is_succeeded, response
+
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, time_budget=10)
+        cmds = [MockPooledCommand(v) for v in range(5)]
+        executor.add_command_effects(cmds)
+        self.assertEqual(list(), executor.commands)
+        limit = time.time() + 1.0
+        while len(proxy.messages) < 5 and time.time() < limit:
+            executor.collect_cmd_msg(0)
+        self.assertEqual([0, 2, 4, 6, 8], sorted(proxy.messages))
+        self.assertTrue(all([c.is_done() for c in cmds]))
+
+    def testStopWhenTimeBudgetIsUsed(self):
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, time_budget=-1)
+        executor.add_command_effects([MockCommand([1, 2]), MockCommand([3])])
+        executor.collect_cmd_msg(0)
+        self.assertEqual([1], proxy.messages)
+        self.assertEqual(2, len(executor.commands))
+
+    def testCollectOnlyWhileResultsAreLeft(self):
+        def is_scheduled():
+            return any(
+                i.func == executor.collect_messages
+                for i in pyglet.clock._default._schedule_items
+            )
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, time_budget=-1)
+        self.assertFalse(is_scheduled())
+        executor.handle_cmds(effect.Commands(
+            effect.EffectObject(effects=[MockCommand([1, 2])])
+        ))
+        self.assertTrue(is_scheduled())
+        for _ in range(3):
+            pyglet.clock.tick()
+        self.assertEqual([1, 2], proxy.messages)
+        self.assertFalse(is_scheduled())
+        executor.shutdown()
+
+
+class MockDoubleWorker(object):
+
+    def __init__(self):
+        self.is_closed = False
+
+    def get_response(self, request):
+        return True, request * 2
+
+    def close(self):
+        self.is_closed = True
+
+
+def wait_responses(pool, timeout=1.0):
+    limit = time.time() + timeout
+    while pool.callbacks and time.time() < limit:
+        pool.collect_responses()
+        time.sleep(0.001)
+
+
+class MockPooledDoubleCommand(effect.PooledCommandBase):
+    pool_name = "mock_double"
+
+    def __init__(self, value, timeout=None):
+        self.value = value
+        self.timeout = timeout
+
+    def get_worker_factory(self):
+        return MockDoubleWorker
+
+    def get_request(self):
+        return self.value
+
+    def get_cancel_key(self):
+        return self.value
+
+    def get_message_from_response(self, is_succeeded, response):
+        return is_succeeded, response
+
+
+class MockSlowWorker(object):
+
+    def get_response(self, request):
+        time.sleep(request)
+        return True, request
+
+
+class MockPooledSlowCommand(MockPooledDoubleCommand):
+
+    def get_worker_factory(self):
+        return MockSlowWorker
+
+
+class TestAsyncioExecutor(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        return effect.AsyncioExecutor
+
+    def runLoop(self, executor, sec):
+        limit = time.time() + sec
+        while time.time() < limit:
+            pyglet.clock.tick()
+            time.sleep(0.005)
+
+    def testRunPooledCommandsInThreads(self):
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, max_workers=2)
+        cmds = [MockPooledDoubleCommand(v) for v in range(5)]
+        executor.add_command_effects(cmds)
+        self.runLoop(executor, 0.2)
+        self.assertEqual([0, 2, 4, 6, 8], sorted(proxy.messages))
+        self.assertTrue(all([c.is_done() for c in cmds]))
+        executor.shutdown()
+
+    def testTimeoutAndCancel(self):
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, max_workers=2)
+        executor.add_command_effects([
+            MockPooledSlowCommand(0.3, timeout=0.05),
+            MockPooledSlowCommand(0.2), MockPooledSlowCommand(0.01)
+        ])
+        executor.handle_cmds(
+            effect.Commands(effect.cancel_pooled_requests("mock_double", [0.2]))
+        )
+        self.runLoop(executor, 0.5)
+        self.assertEqual([0.01], proxy.messages)
+        executor.shutdown()
+
+    def testTupleKeyIsCancelledByAllItems(self):
+        class MockBlockCommand(MockPooledSlowCommand):
+            def get_cancel_key(self):
+                return "a", "b"
+
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, max_workers=2)
+        executor.add_command_effects([MockBlockCommand(0.1)])
+        executor.handle_cmds(
+            effect.Commands(effect.cancel_pooled_requests("mock_double", ["a"]))
+        )
+        executor.add_command_effects([MockBlockCommand(0.05)])
+        executor.handle_cmds(
+            effect.Commands(effect.cancel_pooled_requests("mock_double", ["b"]))
+        )
+        self.runLoop(executor, 0.3)
+        self.assertEqual([0.05], proxy.messages)
+        executor.shutdown()
+
+    def testPrioritizedCommandIsLeftToPool(self):
+        class MockPrioritizedCommand(MockPooledDoubleCommand):
+            pool_name = "mock_prioritized"
+
+            def get_pool_options(self):
+                return dict(prioritized=True)
+
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy, max_workers=2)
+        executor.add_command_effects([MockPrioritizedCommand(3)])
+        self.assertEqual(dict(), executor.task_keys)
+        self.assertIn("mock_prioritized", effect.WORKER_POOLS.pools)
+        limit = time.time() + 1.0
+        while not proxy.messages and time.time() < limit:
+            executor.collect_cmd_msg(0)
+        self.assertEqual([6], proxy.messages)
+        executor.shutdown()
+
+    def testResultIsPushedOnceLoopIsWoken(self):
+        class MockClockWorker(object):
+            def get_response(self, request):
+                time.sleep(request)
+                return True, time.time()
+
+        class MockClockCommand(MockPooledSlowCommand):
+            pool_name = "mock_clock"
+
+            def get_worker_factory(self):
+                return MockClockWorker
+
+        class MockTimedProxy(MockProxy):
+            def push_message(self, msg):
+                self.messages.append(time.time() - msg)
+
+        posted = threading.Event()
+        post_event = mock.patch.object(
+            pyglet.app.platform_event_loop, "post_event",
+            lambda dispatcher, event_type: posted.set()
+        )
+        proxy = MockTimedProxy()
+        executor = self._getTargetCls()(proxy, max_workers=1)
+        with post_event:
+            effect.RESULT_NOTIFIER.acknowledge()
+            executor.add_command_effects([MockClockCommand(0.05, timeout=1)])
+            executor.step_loop()  # The task starts the request
+            self.assertTrue(posted.wait(1.0))
+            executor.on_result_ready()  # Run by the posted event
+        self.assertEqual(1, len(proxy.messages))
+        self.assertLess(proxy.messages[0], 0.05)
+        executor.shutdown()
+
+    def testTimerSubscription(self):
+        proxy = MockProxy()
+        executor = self._getTargetCls()(proxy)
+        sub = effect.Subscriptions(
+            effect.notify_once(MockMsg, dict(text="once"), sec=0.05)
+        )
+        effect.RESULT_NOTIFIER.acknowledge()  # Left by other tests
+        executor.handle_subs(sub)
+        self.runLoop(executor, 0.2)
+        self.assertEqual(["once"], [m.text for m in proxy.messages])
+        executor.shutdown()
+
+
+class MockClock(pyglet.clock.Clock):
+
+    def __init__(self):
+        self.now = 0.
+        super().__init__(time_function=lambda: self.now)
+
+    def advance(self, sec):
+        self.now += sec
+        self.tick()
+
+
+class TestTimerScheduler(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        return effect.TimerScheduler
+
+    def testTimersShareOneScheduledItem(self):
+        clock = MockClock()
+        scheduler = self._getTargetCls()(clock)
+        fired = list()
+        scheduler.add_timer(lambda t: fired.append(("every", t)), 0, 1)
+        scheduler.add_timer(lambda t: fired.append(("once", t)), 1.5)
+        self.assertEqual(1, len(clock._schedule_interval_items))
+        for _ in range(4):
+            clock.advance(1)
+        self.assertEqual(
+            [("every", 1), ("once", 2), ("every", 2), ("every", 3),
+             ("every", 4)],
+            fired
+        )
+        self.assertEqual(1, len(clock._schedule_interval_items))
+
+    def testWaitUntilAndRemove(self):
+        clock = MockClock()
+        scheduler = self._getTargetCls()(clock)
+        fired = list()
+        scheduler.add_timer(fired.append, 2, interval=1, until=4)
+        removed = scheduler.add_timer(lambda t: fired.append(-t), 1)
+        scheduler.remove_timer(removed)
+        for _ in range(8):
+            clock.advance(1)
+        self.assertEqual([2, 3, 4], fired)
+        self.assertEqual(dict(), scheduler.timers)
+        self.assertEqual(0, len(clock._schedule_interval_items))
+
+
+class MockImageWorker(object):
+
+    def get_response(self, request):
+        from PIL import Image
+        if request is None:
+            return False, "No size"
+        return True, ("image", Image.new("RGBA", request, (1, 2, 3, 4)))
+
+
+class MockSlowImageWorker(MockImageWorker):
+
+    def get_response(self, request):
+        time.sleep(0.1)
+        return super().get_response(request)
+
+
+class TestProcessWorkerPool(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        return effect.ProcessWorkerPool
+
+    def testSharedMemoryRoundTrip(self):
+        from PIL import Image
+        img = Image.new("RGBA", (32, 16), (10, 20, 30, 40))
+        ref = effect.put_on_shared_memory(("a", img))
+        self.assertIsInstance(ref[1], effect.SharedImageRef)
+        _, restored = effect.take_from_shared_memory(ref)
+        self.assertEqual(img.tobytes(), restored.tobytes())
+
+    def testImageIsReturnedThroughSharedMemory(self):
+        pool = self._getTargetCls()("mock", MockImageWorker, size=2)
+        results = dict()
+        for k, size in enumerate([(1024, 1024), (8, 8), None]):
+            pool.add_request(
+                size, lambda f, r, k=k: results.__setitem__(k, (f, r))
+            )
+        limit = time.time() + 10
+        while len(results) < 3 and time.time() < limit:
+            pool.collect_responses()
+            time.sleep(0.01)
+        pool.shutdown()
+        self.assertEqual((1024, 1024), results[0][1][1].size)
+        self.assertEqual((1, 2, 3, 4), results[1][1][1].getpixel((0, 0)))
+        self.assertEqual((False, "No size"), results[2])
+
+    def testWaitingRequestsArePrioritized(self):
+        pool = self._getTargetCls()(
+            "mock", MockImageWorker, size=1, priority_func=lambda r: -r[0]
+        )
+        results = list()
+        for w in range(1, 6):
+            pool.add_request(
+                (w, 1), lambda f, r: results.append(r[1].size[0])
+            )
+        # Two requests are sent to the process, others wait
+        self.assertEqual(3, len(pool.waiting_requests))
+        cancelled = pool.add_request((6, 1), lambda f, r: results.append(6))
+        pool.cancel(cancelled)
+        limit = time.time() + 10
+        while len(results) < 5 and time.time() < limit:
+            pool.collect_responses()
+            time.sleep(0.01)
+        pool.shutdown()
+        self.assertEqual([1, 2, 5, 4, 3], results)
+        self.assertEqual(0, pool.get_queue_depth())
+
+    def testFullBlockingQueueDropsWithoutWaiting(self):
+        pool = self._getTargetCls()(
+            "mock", MockSlowImageWorker, size=1, queue_size=1,
+            queue_policy="block"
+        )
+        results = list()
+        start = time.time()
+        for k in range(4):  # Two are sent, one waits
+            pool.add_request(
+                (8, 8), lambda f, r, k=k: results.append((k, f)), k
+            )
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual([(3, False)], results)
+        self.assertEqual([3], pool.pop_dropped_keys())
+        pool.shutdown()
+
+    def testShutdownFreesUncollectedResponses(self):
+        import os
+        if not os.path.isdir("/dev/shm"):
+            self.skipTest("Shared memory is not listed")
+        before = set(os.listdir("/dev/shm"))
+        pool = self._getTargetCls()("mock", MockSlowImageWorker, size=2)
+        for _ in range(8):
+            pool.add_request((64, 64), lambda f, r: None)
+        time.sleep(0.3)
+        start = time.time()
+        pool.shutdown()
+        self.assertLess(time.time() - start, 0.1)
+        pool.join(5.0)
+        time.sleep(0.05)  # Callbacks run after waiters are notified
+        self.assertEqual(set(), set(os.listdir("/dev/shm")) - before)
+
+    def testEveryImageOfTupleIsFreed(self):
+        from PIL import Image
+        img = Image.new("RGBA", (4, 4))
+        refs = effect.put_on_shared_memory((img, img))
+        effect.free_shared_memory(refs[1])
+        with self.assertRaises(FileNotFoundError):
+            effect.take_from_shared_memory(refs)
+        with self.assertRaises(FileNotFoundError):
+            effect.take_from_shared_memory(refs[:1])
+
+
+class TestStreamingThreads(unittest.TestCase):
+
+    def setUp(self):
+        self.posted = threading.Event()
+        self.notifier = effect.RESULT_NOTIFIER
+        self.notifier.acknowledge()
+
+        def mock_post_event(dispatcher, event_type):
+            self.assertIs(self.notifier, dispatcher)
+            self.assertEqual("on_result_ready", event_type)
+            self.posted.set()
+        self.patcher = mock.patch.object(
+            pyglet.app.platform_event_loop, "post_event", mock_post_event
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.notifier.acknowledge()
+
+    def testResultWakesLoopWithoutPolling(self):
+        thread = effect.BidirectionalStreamingThread(MockDoubleWorker())
+        self.assertEqual((False, None), thread.get_response())
+        thread.add_request(21)
+        self.assertTrue(self.posted.wait(1.0))
+        self.assertEqual((True, 42), thread.get_response())
+        thread.done()
+        thread.thread.join(1.0)
+
+    def testDoneUnblocksWaitingThreads(self):
+        client = effect.ClientSideStreamingThread(MockDoubleWorker())
+        bidirectional = effect.BidirectionalStreamingThread(
+            MockDoubleWorker()
+        )
+        time.sleep(0.05)  # Both are waiting on requests.get()
+        for t in (client, bidirectional):
+            self.assertTrue(t.thread.is_alive())
+            t.done()
+            t.thread.join(1.0)
+            self.assertFalse(t.thread.is_alive())
+            self.assertTrue(t.worker.is_closed)
+        self.assertFalse(self.posted.is_set())
+
+
+class TestPriorityRequestQueue(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        return effect.PriorityRequestQueue
+
+    def testGetSmallestPriorityFirst(self):
+        q = self._getTargetCls()(priority_func=lambda r: abs(r - 5))
+        for r in [0, 9, 4, 7, 5]:
+            q.put(r)
+        self.assertEqual([5, 4, 7, 9, 0], [q.get() for _ in range(5)])
+
+    def testUpdatePriorityInPlace(self):
+        q = self._getTargetCls()(priority_func=lambda r: r)
+        for r in [3, 1, 2]:
+            q.put(r)
+        q.set_priority_func(lambda r: -r)
+        q.put(effect.STOP_THREAD_REQUEST)
+        self.assertIs(effect.STOP_THREAD_REQUEST, q.get())
+        self.assertEqual([3, 2, 1], [q.get() for _ in range(3)])
+
+    def testDropOldestWhenFull(self):
+        q = self._getTargetCls()(
+            priority_func=lambda r: -r, maxsize=2, policy="drop_oldest"
+        )
+        self.assertEqual((None, []), q.put(1))
+        q.put(3)
+        self.assertEqual((None, [1]), q.put(2))
+        self.assertEqual((None, []), q.put(effect.STOP_THREAD_REQUEST))
+        self.assertEqual(3, len(q))
+        self.assertIs(effect.STOP_THREAD_REQUEST, q.get())
+        self.assertEqual([3, 2], [q.get() for _ in range(2)])
+
+    def testMergeSameKey(self):
+        q = self._getTargetCls()(
+            maxsize=3, policy="merge", merge_key_func=lambda r: r[0]
+        )
+        q.put(("a", 1))
+        q.put(("b", 1))
+        self.assertEqual((("a", 1), []), q.put(("a", 2)))
+        self.assertEqual([("b", 1), ("a", 2)], [q.get() for _ in range(2)])
+
+    def testBlockUntilTaken(self):
+        import threading
+        q = self._getTargetCls()(maxsize=1, policy="block")
+        q.put(1)
+        t = threading.Thread(target=q.put, args=(2, ), daemon=True)
+        t.start()
+        t.join(0.05)
+        self.assertTrue(t.is_alive())
+        self.assertEqual(1, q.get())
+        t.join(1.0)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(2, q.get())
+
+    def testUnknownPolicy(self):
+        with self.assertRaises(ValueError):
+            self._getTargetCls()(policy="lifo")
+
+
+class TestWorkerPoolService(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        return effect.WorkerPoolService
+
+    def testConfiguredSizeOverridesDefault(self):
+        service = self._getTargetCls()()
+        service.configure(mock=3)
+        pool = service.get_pool("mock", MockDoubleWorker, default_size=1)
+        self.assertEqual(3, len(pool))
+        self.assertIs(pool, service.get_pool("mock", MockDoubleWorker))
+        service.shutdown()
+
+    def testRouteResponsesByRequestId(self):
+        service = self._getTargetCls()()
+        pool = service.get_pool("mock", MockDoubleWorker, default_size=2)
+        results = dict()
+        for v in range(10):
+            pool.add_request(
+                v, lambda flag, res, v=v: results.__setitem__(v, res)
+            )
+        self.assertEqual([5, 5], pool.loads)
+        wait_responses(pool)
+        self.assertEqual({v: 2 * v for v in range(10)}, results)
+        self.assertEqual([0, 0], pool.loads)
+        service.shutdown()
+
+    def testCancelledResponseIsDiscarded(self):
+        service = self._getTargetCls()()
+        pool = service.get_pool("mock", MockDoubleWorker)
+        results = list()
+        request_id = pool.add_request(1, lambda f, r: results.append(r))
+        pool.cancel(request_id)
+        wait_responses(pool)
+        self.assertEqual(list(), results)
+        self.assertEqual([0], pool.loads)
+        service.shutdown()
+
+    def testPrioritizedPoolSharesQueue(self):
+        service = self._getTargetCls()()
+        service.set_priority_func("mock", lambda r: -r)
+        pool = service.get_pool(
+            "mock", MockDoubleWorker, default_size=2, prioritized=True
+        )
+        self.assertIs(pool.threads[0].requests, pool.threads[1].requests)
+        results = dict()
+        for v in range(6):
+            pool.add_request(
+                v, lambda flag, res, v=v: results.__setitem__(v, res)
+            )
+        wait_responses(pool)
+        self.assertEqual({v: 2 * v for v in range(6)}, results)
+        service.shutdown()
+        self.assertFalse(any([t.thread.is_alive() for t in pool.threads]))
+
+    def testSlowRequestsAreSpreadOverThreads(self):
+        service = self._getTargetCls()()
+        for prioritized in (False, True):
+            pool = service.get_pool(
+                "mock", MockSlowWorker, default_size=4, key=prioritized,
+                prioritized=prioritized
+            )
+            for _ in range(8):
+                pool.add_request(0.02, lambda flag, res: None)
+            wait_responses(pool)
+            stats = service.get_worker_stats("mock")
+            self.assertEqual([0, 1, 2, 3], [row[0] for row in stats])
+            self.assertEqual([0] * 4, [row[1] for row in stats])
+            self.assertEqual(8, sum([row[2] for row in stats]))
+            self.assertTrue(all([row[2] > 0 for row in stats]))
+            self.assertTrue(all([row[3] >= 19 for row in stats]))
+        service.shutdown()
+
+    def testCancelByKeys(self):
+        service = self._getTargetCls()()
+        pool = service.get_pool("mock", MockDoubleWorker)
+        results = list()
+        for v in range(4):
+            pool.add_request(
+                v, lambda f, r: results.append(r), cancel_key="id{}".format(v)
+            )
+        self.assertEqual(2, service.cancel_by_keys("mock", ["id1", "id3"]))
+        self.assertEqual(0, service.cancel_by_keys("other", ["id1"]))
+        wait_responses(pool)
+        self.assertEqual([0, 4], results)
+        self.assertEqual(set(), pool.cancelled_ids)
+        service.shutdown()
+
+    def testTupleKeyIsCancelledByAllItems(self):
+        service = self._getTargetCls()()
+        pool = service.get_pool("mock", MockDoubleWorker)
+        results = list()
+        pool.add_request(1, lambda f, r: results.append(r), ("a", "b"))
+        pool.add_request(2, lambda f, r: results.append(r), ("b", "c"))
+        self.assertEqual(0, service.cancel_by_keys("mock", ["a"]))
+        self.assertEqual(1, service.cancel_by_keys("mock", ["b"]))
+        self.assertEqual({2: ("c", )}, pool.cancel_keys)
+        wait_responses(pool)
+        self.assertEqual([4], results)
+        service.shutdown()
+
+    def testDepthCountsItemsOfCoalescedRequests(self):
+        service = self._getTargetCls()()
+        pool = service.get_pool("mock", MockSlowWorker)
+        pool.add_request(0.1, lambda f, r: None, ("a", "b", "c"))
+        pool.add_request(0.01, lambda f, r: None, "d")
+        pool.add_request(0.01, lambda f, r: None)
+        self.assertEqual(5, service.get_queue_depth("mock"))
+        service.cancel_by_keys("mock", ["a"])
+        self.assertEqual(4, service.get_queue_depth("mock"))
+        wait_responses(pool)
+        self.assertEqual(0, service.get_queue_depth("mock"))
+        service.shutdown()
+
+    def testBoundedQueueDropsAndMerges(self):
+        service = self._getTargetCls()()
+        service.configure_queues(mock=(2, "merge"))
+        pool = service.get_pool("mock", MockSlowWorker)
+        results = list()
+        pool.add_request(0.2, lambda f, r: results.append((f, r)))
+        time.sleep(0.05)  # The thread is busy with the first request
+        for v, key in [(0.01, "a"), (0.02, "b"), (0.03, "b"), (0.04, "c")]:
+            pool.add_request(
+                v, lambda f, r: results.append((f, r)), cancel_key=key
+            )
+        self.assertEqual(["a"], pool.pop_dropped_keys())
+        self.assertEqual(4, service.get_queue_depth("mock"))
+        self.assertEqual(5, service.get_request_count("mock"))
+        wait_responses(pool)
+        self.assertEqual(
+            [(False, None), (True, 0.2), (True, 0.03), (True, 0.03),
+             (True, 0.04)],
+            results
+        )
+        self.assertEqual(0, service.get_queue_depth("mock"))
+        service.shutdown()
+
+    def testFullBlockingQueueDropsWithoutWaiting(self):
+        service = self._getTargetCls()()
+        service.configure_queues(mock=(1, "block"))
+        pool = service.get_pool("mock", MockSlowWorker)
+        results = list()
+        start = time.time()
+        for v, key in [(0.2, "a"), (0.01, "b"), (0.02, "c")]:
+            pool.add_request(v, lambda f, r: results.append((f, r)), key)
+            time.sleep(0.02)  # The thread takes the first request
+        self.assertLess(time.time() - start, 0.15)
+        self.assertEqual([(False, None)], results)
+        self.assertEqual(["c"], pool.pop_dropped_keys())
+        wait_responses(pool)
+        self.assertEqual([(True, 0.2), (True, 0.01)], results[1:])
+        service.shutdown()
+
+    def testTotalProcessesAreLimited(self):
+        service = self._getTargetCls()()
+        service.configure_processes(3)
+        old = service.get_pool(
+            "mock", MockDoubleWorker, default_size=2, key="a",
+            processes=True, max_keys=2
+        )
+        other = service.get_pool(
+            "other", MockDoubleWorker, default_size=2, processes=True
+        )
+        self.assertEqual(1, len(other))
+        # The idle pool of "a" is shut down to make room
+        new = service.get_pool(
+            "mock", MockDoubleWorker, default_size=2, key="b",
+            processes=True, max_keys=2
+        )
+        self.assertEqual(2, len(new))
+        self.assertEqual(dict(), dict(service.idle_pools))
+        self.assertEqual(3, service.get_process_count())
+        old.join(1.0)
+        service.shutdown()
+
+    def testRebuildPoolForOtherKeyAndShutdown(self):
+        service = self._getTargetCls()()
+        old = service.get_pool("mock", MockDoubleWorker, key="a.svs")
+        new = service.get_pool("mock", MockDoubleWorker, key="b.svs")
+        self.assertIsNot(old, new)
+        old.join(1.0)
+        self.assertTrue(old.threads[0].worker.worker.is_closed)
+        service.shutdown()
+        self.assertFalse(new.threads[0].thread.is_alive())
+        self.assertEqual(dict(), service.pools)
+
+    def testWaitingRequestsAreDroppedWhenParked(self):
+        service = self._getTargetCls()()
+        results = list()
+        for prioritized in (False, True):
+            pool = service.get_pool(
+                "mock_slow", MockSlowWorker, key="a", max_keys=2,
+                prioritized=prioritized
+            )
+            for i in range(4):
+                pool.add_request(0.05, lambda f, r: results.append(f))
+            time.sleep(0.02)  # The first one is taken by the thread
+            service.get_pool(
+                "mock_slow", MockSlowWorker, key="b", max_keys=2
+            )
+            self.assertEqual([False, False, False], results)
+            wait_responses(pool)
+            self.assertEqual([False, False, False, True], results)
+            self.assertEqual(0, pool.get_queue_depth())
+            results.clear()
+            service.shutdown()
+
+    def testDroppedRequestsAreNotAnsweredAfterSlideSwitch(self):
+        service = self._getTargetCls()()
+        for prioritized in (False, True):
+            answers = dict()
+            pool = service.get_pool(
+                "mock_slow", MockSlowWorker, key="a", max_keys=2,
+                prioritized=prioritized
+            )
+            for i in range(4):
+                pool.add_request(
+                    0.05, lambda f, r, i=i: answers.setdefault(i, []).append(f)
+                )
+            time.sleep(0.02)  # The first one is taken by the thread
+            service.get_pool(
+                "mock_slow", MockSlowWorker, key="b", max_keys=2
+            )
+            time.sleep(0.2)  # Long enough to run the dropped ones
+            reused = service.get_pool(
+                "mock_slow", MockSlowWorker, key="a", max_keys=2,
+                prioritized=prioritized
+            )
+            self.assertIs(pool, reused)
+            wait_responses(reused)
+            self.assertEqual(
+                {0: [True], 1: [False], 2: [False], 3: [False]}, answers
+            )
+            service.shutdown()
+
+    def testReuseRecentlyUsedPoolsUpToMaxKeys(self):
+        service = self._getTargetCls()()
+        a = service.get_pool("mock", MockDoubleWorker, key="a", max_keys=2)
+        b = service.get_pool("mock", MockDoubleWorker, key="b", max_keys=2)
+        self.assertIs(a, service.get_pool(
+            "mock", MockDoubleWorker, key="a", max_keys=2
+        ))
+        c = service.get_pool("mock", MockDoubleWorker, key="c", max_keys=2)
+        self.assertIsNot(b, c)
+        b.join(1.0)
+        self.assertTrue(b.threads[0].worker.worker.is_closed)
+        self.assertFalse(a.threads[0].worker.worker.is_closed)
+        service.shutdown()
+        self.assertFalse(a.threads[0].thread.is_alive())
+        self.assertEqual(0, len(service.idle_pools))
 
 
 if __name__ == "__main__":
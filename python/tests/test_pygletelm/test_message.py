@@ -57,6 +57,86 @@ class TestUnionMessage(unittest.TestCase):
         self.assertEqual(piyo_ins.foo, 123)
         self.assertEqual(piyo_ins.bar, 234)
 
+    def test_keyword_and_surplus_args(self):
+        MsgCls = self._getMessageCls()
+
+        class MockMsg(self._getTargetCls()):
+            Piyo = MsgCls("foo", "bar")
+
+        piyo_ins = MockMsg.Piyo(123, bar=234, time=0.1)
+        self.assertEqual(piyo_ins.foo, 123)
+        self.assertEqual(piyo_ins.bar, 234)
+        piyo_ins = MockMsg.Piyo(123, 234, 345)
+        self.assertEqual(piyo_ins.bar, 234)
+
+    def test_keyword_wins_over_position(self):
+        MsgCls = self._getMessageCls()
+
+        class MockMsg(self._getTargetCls()):
+            Piyo = MsgCls("foo", "bar")
+
+        piyo_ins = MockMsg.Piyo(123, 234, foo=345)
+        self.assertEqual(piyo_ins.foo, 345)
+        self.assertEqual(piyo_ins.bar, 234)
+
+    def test_missing_value(self):
+        MsgCls = self._getMessageCls()
+
+        class MockMsg(self._getTargetCls()):
+            Piyo = MsgCls("foo", "bar")
+
+        with self.assertRaises(KeyError):
+            MockMsg.Piyo(foo=123)
+        with self.assertRaises(KeyError):
+            MockMsg.Piyo(123)
+        with self.assertRaises(KeyError):
+            MockMsg.Piyo(123, time=0.1)
+
+
+class TestSerializeMessage(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetFuncs():
+        from pathilico.pygletelm.message \
+            import serialize_message, deserialize_message
+        return serialize_message, deserialize_message
+
+    def test_round_trip(self):
+        from pathilico.pygletelm.message import UnionMessage, Message
+        serialize, deserialize = self._getTargetFuncs()
+
+        class SerializeMsg(UnionMessage):
+            Piyo = Message("foo", "bar")
+
+        name, values = serialize(SerializeMsg.Piyo(123, "abc"))
+        self.assertEqual("{}.SerializeMsg.Piyo".format(__name__), name)
+        self.assertEqual((123, "abc"), values)
+        msg = deserialize(name, values)
+        self.assertTrue(msg == SerializeMsg.Piyo)
+        self.assertEqual(msg.foo, 123)
+        self.assertEqual(msg.bar, "abc")
+
+    def test_same_name_in_other_modules(self):
+        from pathilico.pygletelm.message import UnionMessage, Message
+        serialize, deserialize = self._getTargetFuncs()
+        union_messages = [
+            type(UnionMessage)(
+                "SameMsg", (UnionMessage, ),
+                dict(__module__=module, Piyo=Message(*args))
+            )
+            for module, args in (("mod_a", ("foo", )), ("mod_b", ("bar", )))
+        ]
+        for m_cls in union_messages:
+            msg = deserialize(*serialize(m_cls.Piyo(123)))
+            self.assertTrue(msg == m_cls.Piyo)
+            self.assertEqual(m_cls.Piyo.__slots__, msg.__slots__)
+
+    def test_not_message_object(self):
+        serialize, deserialize = self._getTargetFuncs()
+        name, values = serialize("Increment")
+        self.assertIsNone(name)
+        self.assertEqual("Increment", deserialize(name, values))
+
 
 def create_msg_tuple():
     Hoge = 0
@@ -0,0 +1,72 @@
+#   Copyright
+#     2019 Department of Dermatology, School of Medicine, Tohoku University
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        from pathilico.pygletelm.metrics import LatencyHistogram as cls
+        return cls
+
+    def test_index_is_monotonic_and_invertible(self):
+        h = self._getTargetCls()()
+        last_index = -1
+        for value in range(0, 100000, 7):
+            index = h.get_index(value)
+            self.assertGreaterEqual(index, last_index)
+            self.assertGreaterEqual(
+                h.get_highest_equivalent_value(index), value
+            )
+            last_index = index
+
+    def test_percentiles(self):
+        h = self._getTargetCls()()
+        for ms in range(1, 101):
+            h.record(ms / 1000)
+        self.assertAlmostEqual(0.050, h.get_percentile(50), delta=0.002)
+        self.assertAlmostEqual(0.095, h.get_percentile(95), delta=0.002)
+        self.assertAlmostEqual(0.099, h.get_percentile(99), delta=0.002)
+        self.assertAlmostEqual(0.100, h.get_percentile(100), delta=1e-9)
+        self.assertEqual(100, h.total_count)
+
+
+class TestMessageLatencyStats(unittest.TestCase):
+
+    @staticmethod
+    def _getTargetCls():
+        from pathilico.pygletelm.metrics import MessageLatencyStats as cls
+        return cls
+
+    def test_summary_by_message_class(self):
+        from pathilico.pygletelm.message import UnionMessage, Message
+
+        class LatencyMsg(UnionMessage):
+            Fast = Message()
+            Slow = Message()
+
+        stats = self._getTargetCls()()
+        for _ in range(10):
+            stats.record(LatencyMsg.Fast(), update=0.001, view=0.001)
+            stats.record(LatencyMsg.Slow(), update=0.010, view=0.020)
+        summary = stats.get_summary()
+        self.assertEqual(
+            [("LatencyMsg.Slow", "update"), ("LatencyMsg.Slow", "view"),
+             ("LatencyMsg.Fast", "update"), ("LatencyMsg.Fast", "view")],
+            [r[:2] for r in summary]
+        )
+        self.assertEqual(10, summary[0][2])
+        self.assertIn("LatencyMsg.Slow", stats.dump())